@@ -1,19 +1,24 @@
 """
-FastAPI dependencies for authentication
+FastAPI dependencies for authentication and rate limiting
 """
+import math
+from functools import lru_cache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .security import verify_token
-from ..database.db import get_db
+from ..database.db import get_async_db
 from ..database.models import User
+from ...config import settings
+from ...utils.rate_limiter import RateLimiter, MemoryBucketStore, SQLiteBucketStore
 
 security = HTTPBearer()
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user"""
     token = credentials.credentials
@@ -26,11 +31,63 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    return user
\ No newline at end of file
+    return user
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide rate limiter, creating its store on first use"""
+    if settings.rate_limit_backend == "sqlite":
+        return RateLimiter(SQLiteBucketStore(settings.rate_limit_db_path))
+    return RateLimiter(MemoryBucketStore())
+
+
+def enforce_rate_limit(user: User, route: str, limit_per_minute: int, cost: int = 1):
+    """Charge a request against the user's overall and per-route buckets
+    
+    A request rejected by one bucket is refunded to the buckets already
+    charged, so it is not counted against the user's overall limit.
+    """
+    if not settings.rate_limit_enabled:
+        return
+    
+    limiter = get_rate_limiter()
+    buckets = (
+        (f"user:{user.id}", settings.rate_limit_user_per_minute, 1),
+        (f"user:{user.id}:{route}", limit_per_minute, cost),
+    )
+    for index, (key, limit, charge) in enumerate(buckets):
+        allowed, retry_after = limiter.acquire(key, limit, charge)
+        if allowed:
+            continue
+        for charged_key, charged_limit, charged in buckets[:index]:
+            limiter.refund(charged_key, charged_limit, charged)
+        if math.isinf(retry_after):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Request cost {charge} exceeds the limit of {limit} per minute"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class RateLimit:
+    """Dependency applying a per-user, per-route rate limit"""
+    
+    def __init__(self, route: str, limit_per_minute: int):
+        self.route = route
+        self.limit_per_minute = limit_per_minute
+    
+    def __call__(self, current_user: User = Depends(get_current_user)) -> User:
+        enforce_rate_limit(current_user, self.route, self.limit_per_minute)
+        return current_user
@@ -1,30 +1,120 @@
 """
 Database session management
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
 from src.config import settings
-from .models import Base
+from .models import Base, UsageCounter
+from .usage_counters import rebuild_usage_counters
 
-# Create engine
+# Async drivers for the sync drivers a DATABASE_URL may name
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+# How long a SQLite connection waits for another writer's lock
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+def async_database_url(url: str) -> str:
+    """Database URL with the dialect's async driver
+    
+    URLs that already name a driver are kept only if it is async.
+    """
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {parsed.get_backend_name()}, set ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Let readers run alongside a writer and wait out short write locks
+    instead of failing"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _use_sqlite_pragmas(sync_engine):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _configure_sqlite)
+
+
+# Create engine (CLI, migrations, background maintenance)
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
 )
+_use_sqlite_pragmas(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers and workers, so queries do not block the event loop
+async_engine = create_async_engine(settings.async_database_url or async_database_url(settings.database_url))
+_use_sqlite_pragmas(async_engine.sync_engine)
+
+# Objects stay usable after commit; reloading an expired attribute would need an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def create_tables():
     """Create all tables in the database"""
+    had_usage_counters = inspect(engine).has_table(UsageCounter.__tablename__)
     Base.metadata.create_all(bind=engine)
+    upgrade_tables()
+    
+    if not had_usage_counters:
+        # Count conversations stored before the counters existed
+        with SessionLocal() as db:
+            rebuild_usage_counters(db)
+
+
+def upgrade_tables():
+    """Add columns and indexes introduced after a table was first created
+    
+    create_all only creates missing tables, so existing databases are
+    upgraded in place. New columns must be nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 
 def get_db():
-    """Dependency for getting database session"""
+    """Dependency for getting a sync database session
+    
+    Kept on purpose for sync handlers and scripts; the API routes use
+    get_async_db.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
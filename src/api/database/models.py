@@ -1,7 +1,7 @@
 """
 Database models using SQLAlchemy
 """
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -16,6 +16,9 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    # Scheduling class of the user's /chat/ calls; None means interactive.
+    # Accounts used by eval scripts and other bulk clients are set to batch
+    priority = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -25,16 +28,133 @@ class User(Base):
 class Conversation(Base):
     """Conversation history model"""
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Loads the latest turns of one thread without scanning the user's history
+        Index("ix_conversations_user_thread", "user_id", "thread_id", "id"),
+        # Serves /chat/history pages newest first by keyset, without OFFSET
+        Index("ix_conversations_user_created", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True)
+    thread_id = Column(String, nullable=True)
     message = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
+    # Token counts cached when the turn is stored, reused to fit later turns
+    # into the context budget
+    message_tokens = Column(Integer, nullable=True)
+    response_tokens = Column(Integer, nullable=True)
     provider = Column(String, nullable=False)
     model = Column(String, nullable=False)
     tokens_used = Column(Integer, default=0)
     cost = Column(Float, default=0.0)
+    # Prompt tokens read from / written to the provider's prompt cache
+    cache_read_tokens = Column(Integer, nullable=True)
+    cache_write_tokens = Column(Integer, nullable=True)
+    # Losing call of a hedged request, billed to its own provider/model;
+    # tokens_used and cost above are the answering call's
+    hedge_provider = Column(String, nullable=True)
+    hedge_model = Column(String, nullable=True)
+    hedge_tokens_used = Column(Integer, nullable=True)
+    hedge_cost = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f"<Conversation(id={self.id}, user_id={self.user_id})>"
\ No newline at end of file
+        return f"<Conversation(id={self.id}, user_id={self.user_id})>"
+
+
+class ThreadSummary(Base):
+    """Rolling summary of the older turns of a conversation thread"""
+    __tablename__ = "thread_summaries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "thread_id", name="uq_thread_summaries_user_thread"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    thread_id = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    summary_tokens = Column(Integer, default=0)
+    # Last Conversation.id folded into the summary; later turns are sent verbatim
+    covered_through_id = Column(Integer, nullable=False)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    tokens_used = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ThreadSummary(thread_id='{self.thread_id}', covered_through_id={self.covered_through_id})>"
+
+
+class IdempotencyRecord(Base):
+    """Outcome of a request sent with an Idempotency-Key, replayed on retries"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    key = Column(String, nullable=False)
+    # Hash of the request body; a key may not be reused for a different request
+    fingerprint = Column(String, nullable=False)
+    # Serialized response once the request has completed, None while in flight
+    response = Column(Text, nullable=True)
+    # A pending request whose lock has lapsed (its worker died) may be taken over
+    locked_until = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<IdempotencyRecord(user_id={self.user_id}, key='{self.key}')>"
+
+
+class ChatJob(Base):
+    """Chat request queued for the background worker pool"""
+    __tablename__ = "chat_jobs"
+    __table_args__ = (
+        Index("ix_chat_jobs_status_locked", "status", "locked_until"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    # queued, running, succeeded or failed
+    status = Column(String, nullable=False, default="queued")
+    request = Column(Text, nullable=False)
+    response = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Not claimable before this time: a backoff while queued, a lease while running
+    locked_until = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<ChatJob(id={self.id}, status='{self.status}')>"
+
+
+class UsageCounter(Base):
+    """Running conversation count, tokens and cost per user and provider/model
+    
+    Updated in the same transaction as each Conversation insert, so usage
+    totals are read without scanning conversations. Tokens and cost include
+    hedged calls that lost the race; conversations counts answered turns.
+    """
+    __tablename__ = "usage_counters"
+    __table_args__ = (
+        UniqueConstraint("user_id", "provider", "model", name="uq_usage_counters_user_provider_model"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    conversations = Column(Integer, nullable=False, default=0)
+    tokens_used = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<UsageCounter(user_id={self.user_id}, provider='{self.provider}', model='{self.model}')>"
@@ -0,0 +1,153 @@
+"""
+Per-user usage counters maintained alongside conversation writes
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from .models import Conversation, UsageCounter
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+CounterKey = Tuple[int, str, str]
+
+
+def _increment(connection: Connection, key: CounterKey, conversations: int, tokens: int, cost: float):
+    """Add to one (user, provider, model) counter, creating it if needed"""
+    user_id, provider, model = key
+    now = datetime.utcnow()
+    upsert_insert = UPSERT_INSERTS.get(connection.dialect.name)
+    
+    if upsert_insert is not None:
+        statement = upsert_insert(UsageCounter).values(
+            user_id=user_id, provider=provider, model=model,
+            conversations=conversations, tokens_used=tokens, cost=cost, updated_at=now
+        )
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "provider", "model"],
+            set_={
+                "conversations": UsageCounter.conversations + statement.excluded.conversations,
+                "tokens_used": UsageCounter.tokens_used + statement.excluded.tokens_used,
+                "cost": UsageCounter.cost + statement.excluded.cost,
+                "updated_at": now
+            }
+        ))
+        return
+    
+    updated = connection.execute(update(UsageCounter).where(
+        UsageCounter.user_id == user_id,
+        UsageCounter.provider == provider,
+        UsageCounter.model == model
+    ).values(
+        conversations=UsageCounter.conversations + conversations,
+        tokens_used=UsageCounter.tokens_used + tokens,
+        cost=UsageCounter.cost + cost,
+        updated_at=now
+    )).rowcount
+    if not updated:
+        connection.execute(insert(UsageCounter).values(
+            user_id=user_id, provider=provider, model=model,
+            conversations=conversations, tokens_used=tokens, cost=cost, updated_at=now
+        ))
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_conversations(session: Session, flush_context):
+    """Apply the flush's conversation inserts and deletes to the counters
+    
+    Runs inside the flush, on the same connection and transaction, so the
+    counters commit or roll back together with the conversations. Covers
+    AsyncSession too, which flushes through a sync Session. Bulk Core
+    statements bypass it; rebuild_usage_counters repairs any drift.
+    """
+    deltas: Dict[CounterKey, list] = defaultdict(lambda: [0, 0, 0.0])
+    for instances, sign in ((session.new, 1), (session.deleted, -1)):
+        for conversation in instances:
+            if not isinstance(conversation, Conversation):
+                continue
+            delta = deltas[(conversation.user_id, conversation.provider, conversation.model)]
+            delta[0] += sign
+            delta[1] += sign * (conversation.tokens_used or 0)
+            delta[2] += sign * (conversation.cost or 0.0)
+            if conversation.hedge_provider:
+                hedge = deltas[(conversation.user_id, conversation.hedge_provider, conversation.hedge_model)]
+                hedge[1] += sign * (conversation.hedge_tokens_used or 0)
+                hedge[2] += sign * (conversation.hedge_cost or 0.0)
+    
+    if not deltas:
+        return
+    connection = session.connection()
+    for key, (conversations, tokens, cost) in deltas.items():
+        _increment(connection, key, conversations, tokens, cost)
+
+
+def rebuild_usage_counters(db: Session, user_id: Optional[int] = None) -> Dict[str, int]:
+    """Recompute counters from the conversations table and commit
+    
+    Returns:
+        {"counters": rows written, "drifted": counters that were wrong or missing}
+    """
+    grouped = select(
+        Conversation.user_id,
+        Conversation.provider,
+        Conversation.model,
+        func.count().label("conversations"),
+        func.coalesce(func.sum(Conversation.tokens_used), 0).label("tokens_used"),
+        func.coalesce(func.sum(Conversation.cost), 0.0).label("cost")
+    ).group_by(Conversation.user_id, Conversation.provider, Conversation.model)
+    hedged = select(
+        Conversation.user_id,
+        Conversation.hedge_provider,
+        Conversation.hedge_model,
+        func.coalesce(func.sum(Conversation.hedge_tokens_used), 0).label("tokens_used"),
+        func.coalesce(func.sum(Conversation.hedge_cost), 0.0).label("cost")
+    ).where(Conversation.hedge_provider.isnot(None)).group_by(
+        Conversation.user_id, Conversation.hedge_provider, Conversation.hedge_model
+    )
+    existing = select(UsageCounter)
+    if user_id is not None:
+        grouped = grouped.where(Conversation.user_id == user_id)
+        hedged = hedged.where(Conversation.user_id == user_id)
+        existing = existing.where(UsageCounter.user_id == user_id)
+    
+    totals: Dict[CounterKey, list] = defaultdict(lambda: [0, 0, 0.0])
+    for row in db.execute(grouped):
+        totals[(row.user_id, row.provider, row.model)] = [row.conversations, row.tokens_used, row.cost]
+    # Losing hedged calls add spend, but no conversations, to their own provider/model
+    for row in db.execute(hedged):
+        total = totals[(row.user_id, row.hedge_provider, row.hedge_model)]
+        total[1] += row.tokens_used
+        total[2] += row.cost
+    
+    expected = {
+        key: (conversations, tokens, round(cost, 6))
+        for key, (conversations, tokens, cost) in totals.items()
+    }
+    stored = {
+        (c.user_id, c.provider, c.model): (c.conversations, c.tokens_used, round(c.cost, 6))
+        for c in db.scalars(existing)
+    }
+    drifted = sum(1 for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
+    
+    remove = delete(UsageCounter)
+    if user_id is not None:
+        remove = remove.where(UsageCounter.user_id == user_id)
+    db.execute(remove)
+    now = datetime.utcnow()
+    db.add_all(
+        UsageCounter(
+            user_id=key[0], provider=key[1], model=key[2],
+            conversations=conversations, tokens_used=tokens, cost=cost, updated_at=now
+        )
+        for key, (conversations, tokens, cost) in expected.items()
+    )
+    db.commit()
+    return {"counters": len(expected), "drifted": drifted}
@@ -2,10 +2,10 @@
 Authentication routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas.auth_schemas import UserCreate, UserLogin, UserResponse, Token
 from ..services.auth_services import AuthService
-from ..database.db import get_db
+from ..database.db import get_async_db
 from ..core.dependencies import get_current_user
 from ..database.models import User
 
@@ -13,16 +13,16 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
-    user = AuthService.register_user(db, user_data)
+    user = await AuthService.register_user(db, user_data)
     return user
 
 
 @router.post("/login", response_model=Token)
-async def login(login_data: UserLogin, db: Session = Depends(get_db)):
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login and get access token"""
-    token = AuthService.authenticate_user(db, login_data)
+    token = await AuthService.authenticate_user(db, login_data)
     return token
 
 
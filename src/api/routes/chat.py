@@ -1,100 +1,281 @@
 """
 Chat/LLM interaction routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
+import json
+import time
+import uuid
 
 from ..schemas.chat_schemas import (
     ChatRequest, 
+    ChatBatchRequest,
     ChatResponse, 
+    ChatJobResponse,
     ConversationHistory,
     ConversationListResponse
 )
-from ..database.db import get_db
-from ..database.models import User, Conversation
-from ..core.dependencies import get_current_user
-from ...llm.openai_provider import OpenAIProvider
-from ...llm.anthropic_provider import AnthropicProvider
+from ..database.db import get_async_db, AsyncSessionLocal
+from ..database.models import User, Conversation, UsageCounter
+from ..services.chat_services import ChatService, concurrency_limiters
+from ..services.compaction_services import CompactionService
+from ..services.idempotency_services import (
+    IdempotencyService,
+    IdempotencyKeyReused,
+    IdempotencyInProgress
+)
+from ..services.job_services import JobService, chat_job_workers
+from ..core.dependencies import get_current_user, RateLimit, enforce_rate_limit
+from ...llm.registry import provider_registry, ProviderNotConfiguredError, ProviderNotFoundError
+from ...llm.errors import ProviderError
+from ...llm.retry import retry_policy
+from ...llm.token_counter import TokenLimitExceeded
 from ...config import settings
 from ...utils.logger import logger
+from ...utils.adaptive_limiter import LoadShedError
+from ...utils.circuit_breaker import CircuitOpenError
+from ...utils.conversation import ConversationManager
+from ...utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-
 def get_llm_provider(provider: str, model: str = None):
-    """Get LLM provider instance"""
-    if provider == "openai":
-        if not settings.openai_api_key:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="OpenAI API key not configured"
-            )
-        return OpenAIProvider(
-            api_key=settings.openai_api_key,
-            model=model or "gpt-3.5-turbo"
-        )
+    """Get LLM provider instance from the provider registry
     
-    elif provider == "anthropic":
-        if not settings.anthropic_api_key:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Anthropic API key not configured"
-            )
-        return AnthropicProvider(
-            api_key=settings.anthropic_api_key,
-            model=model or "claude-3-haiku-20240307"
+    A provider's SDK is imported the first time it is requested.
+    """
+    try:
+        return provider_registry.create(provider, model)
+    except ProviderNotConfiguredError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
         )
-    
-    else:
+    except ProviderNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Unsupported provider: {provider}"
+            detail=str(e)
         )
 
 
+def get_hedge_provider(request: ChatRequest):
+    """Get the backup provider for hedged requests, if one is usable"""
+    if not request.hedge:
+        return None
+    try:
+        return get_llm_provider(settings.hedge_provider, settings.hedge_model)
+    except HTTPException as e:
+        logger.warning(f"Hedging disabled for request: {e.detail}")
+        return None
+
+
+async def get_thread_history(db: AsyncSession, user_id: int, request: ChatRequest) -> Optional[ConversationManager]:
+    """Earlier turns of the request's thread, if it continues one"""
+    if not request.thread_id:
+        return None
+    return await ChatService.load_history(db, user_id, request.thread_id)
+
+
+_compaction_errors = set()
+
+
+def get_compaction_provider():
+    """Get the cheap provider used to summarize long threads, if one is usable
+    
+    It is looked up on every turn of a long thread, so each reason it is
+    unusable is only logged the first time.
+    """
+    try:
+        return get_llm_provider(settings.compaction_provider, settings.compaction_model)
+    except HTTPException as e:
+        if e.detail not in _compaction_errors:
+            _compaction_errors.add(e.detail)
+            logger.warning(f"Thread compaction disabled: {e.detail}")
+        return None
+
+
+def schedule_compaction(
+    background_tasks: BackgroundTasks,
+    history: Optional[ConversationManager],
+    turn: Conversation
+):
+    """Summarize the thread's older turns after the response is sent, once
+    they pass the compaction threshold"""
+    if not CompactionService.should_compact(history, turn):
+        return
+    provider = get_compaction_provider()
+    if provider is not None:
+        background_tasks.add_task(CompactionService.compact_thread, turn.user_id, turn.thread_id, provider)
+
+
+def request_priority(user: User, request: ChatRequest) -> str:
+    """Scheduling class for a request
+    
+    Set per user on the server; a request may ask to run as batch but
+    cannot raise itself to interactive.
+    """
+    if user.priority == "batch" or request.priority == "batch":
+        return "batch"
+    return "interactive"
+
+
+def get_fallback_providers(primary) -> List:
+    """Get the configured fallback chain, excluding the primary and unconfigured providers"""
+    fallbacks = []
+    for entry in settings.fallback_chain.split(","):
+        if not entry.strip():
+            continue
+        name, _, model = entry.strip().partition(":")
+        try:
+            fallback = get_llm_provider(name, model or None)
+        except HTTPException:
+            continue
+        if (fallback.get_provider_name(), fallback.model) != (primary.get_provider_name(), primary.model):
+            fallbacks.append(fallback)
+    return fallbacks
+
+
+async def generate_chat(
+    session: AsyncSession,
+    user_id: int,
+    username: str,
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    priority: str
+) -> ChatResponse:
+    """Generate a chat response and add its turn to session without committing
+    
+    The provider call is scheduled in the given priority class.
+    """
+    # Get provider
+    provider = get_llm_provider(request.provider, request.model)
+    
+    thread_id = request.thread_id or uuid.uuid4().hex
+    history = await get_thread_history(session, user_id, request)
+    
+    # Return the pooled connection for the provider call so slow generations
+    # do not exhaust the pool; saving the turn checks out a fresh one
+    await session.commit()
+    
+    # Generate response without blocking the event loop
+    result = await ChatService.generate_response(
+        provider,
+        request,
+        hedge_provider=get_hedge_provider(request),
+        fallback_providers=get_fallback_providers(provider),
+        history=history,
+        user_id=user_id,
+        priority=priority
+    )
+    
+    # Save to database; committed by the caller
+    turn = ChatService.build_turn(user_id, thread_id, request, result)
+    schedule_compaction(background_tasks, history, turn)
+    session.add(turn)
+    
+    logger.info(
+        f"Chat completed for user {username}: {result['tokens_used']} tokens, "
+        f"${result['cost']}{' (cached)' if result['cached'] else ''}"
+    )
+    
+    return ChatResponse(
+        response=result["response"],
+        provider=result["provider"],
+        model=result["model"],
+        tokens_used=result["tokens_used"],
+        cost=result["cost"],
+        timestamp=datetime.utcnow(),
+        cached=result["cached"],
+        thread_id=thread_id,
+        context_messages=result["context_messages"],
+        cache_read_tokens=result.get("cache_read_tokens", 0),
+        cache_write_tokens=result.get("cache_write_tokens", 0)
+    )
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    current_user: User = Depends(RateLimit("chat", settings.rate_limit_chat_per_minute)),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Send message to LLM and get response"""
+    """Send message to LLM and get response
+    
+    With an Idempotency-Key header, retries of the same request within the
+    key's TTL get the original response back instead of a new generation.
+    """
+    user_id, username = current_user.id, current_user.username
+    priority = request_priority(current_user, request)
+    
+    async def generate(session: AsyncSession) -> ChatResponse:
+        return await generate_chat(session, user_id, username, request, background_tasks, priority)
+    
     try:
-        # Get provider
-        provider = get_llm_provider(request.provider, request.model)
+        if not idempotency_key:
+            chat_response = await generate(db)
+            await db.commit()
+            return chat_response
         
-        # Generate response
-        result = provider.generate_response(
-            prompt=request.message,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
+        chat_response, replayed = await IdempotencyService.run(
+            db, user_id, idempotency_key, request, generate
         )
-        
-        # Save to database
-        conversation = Conversation(
-            user_id=current_user.id,
-            message=request.message,
-            response=result["response"],
-            provider=provider.get_provider_name(),
-            model=provider.model,
-            tokens_used=result["tokens_used"],
-            cost=result["cost"]
+        if replayed:
+            logger.info(f"Replayed idempotent chat for user {username}")
+            response.headers["Idempotent-Replayed"] = "true"
+        return chat_response
+    
+    except IdempotencyKeyReused as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
         )
-        
-        db.add(conversation)
-        db.commit()
-        
-        logger.info(f"Chat completed for user {current_user.username}: {result['tokens_used']} tokens, ${result['cost']}")
-        
-        return ChatResponse(
-            response=result["response"],
-            provider=provider.get_provider_name(),
-            model=provider.model,
-            tokens_used=result["tokens_used"],
-            cost=result["cost"],
-            timestamp=datetime.utcnow()
+    
+    except IdempotencyInProgress as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    
+    except HTTPException:
+        raise
+    
+    except TokenLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    except (CircuitOpenError, LoadShedError) as e:
+        logger.error(f"Chat error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    
+    except ProviderError as e:
+        logger.error(f"Chat error: {str(e)}")
+        if not e.retryable:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error generating response: {str(e)}"
+            )
+        # Still failing after retries: tell the client when to come back
+        headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after else None
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error generating response: {str(e)}",
+            headers=headers
         )
     
     except Exception as e:
@@ -105,21 +286,350 @@ async def chat(
         )
 
 
+async def run_chat_job(
+    session: AsyncSession,
+    user_id: int,
+    request: ChatRequest,
+    background_tasks: BackgroundTasks
+) -> ChatResponse:
+    """Generate the response for a background chat job
+    
+    Jobs are bulk traffic and always run in the batch priority class.
+    """
+    user = await session.get(User, user_id)
+    username = user.username if user else str(user_id)
+    return await generate_chat(session, user_id, username, request, background_tasks, priority="batch")
+
+
+@router.post("/jobs", response_model=ChatJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_chat_job(
+    request: ChatRequest,
+    current_user: User = Depends(RateLimit("chat", settings.rate_limit_chat_per_minute)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a chat request for the background workers
+    
+    Returns at once; poll GET /chat/jobs/{id} for the result. Suited to
+    generations that outlast HTTP timeouts.
+    """
+    # Reject unconfigured providers now rather than in the worker
+    get_llm_provider(request.provider, request.model)
+    
+    job = await JobService.submit(db, current_user.id, request)
+    chat_job_workers.notify()
+    logger.info(f"Chat job {job.id} queued for user {current_user.username}")
+    return JobService.to_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the status, and once finished the result, of a chat job"""
+    job = await JobService.get(db, current_user.id, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return JobService.to_response(job)
+
+
+async def _save_conversations(conversations: List[Conversation]):
+    """Insert conversations from a streaming body in one transaction
+    
+    The request-scoped session is already closed by the time a streamed
+    body is sent, so a dedicated session is used. The insert is shielded
+    so a client disconnecting mid-save does not lose completed turns.
+    """
+    if not conversations:
+        return
+    
+    async def save():
+        async with AsyncSessionLocal() as db:
+            db.add_all(conversations)
+            await db.commit()
+    
+    await asyncio.shield(save())
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(RateLimit("chat", settings.rate_limit_chat_per_minute)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream LLM response token-by-token as Server-Sent Events"""
+    provider = get_llm_provider(request.provider, request.model)
+    user_id = current_user.id
+    username = current_user.username
+    thread_id = request.thread_id or uuid.uuid4().hex
+    
+    history = await get_thread_history(db, user_id, request)
+    
+    try:
+        conversation = ChatService.preflight(provider, request, history)
+    except TokenLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    context = conversation.messages()[:-1]
+    # The request's session stays open until the stream ends; release its
+    # connection now, the turn is saved through a dedicated session
+    await db.commit()
+    
+    async def event_stream():
+        started = time.perf_counter()
+        time_to_first_token = None
+        chunks = []
+        usage = None
+        finished = False
+        
+        try:
+            async with concurrency_limiters.get(provider.get_provider_name()).slot():
+                events = retry_policy.stream(
+                    lambda: provider.astream_response(
+                        prompt=request.message,
+                        temperature=request.temperature,
+                        max_tokens=request.max_tokens,
+                        history=context,
+                        system=ChatService.system_prompt(request)
+                    ),
+                    name=f"{provider.get_provider_name()}:{provider.model} stream"
+                )
+                async for event in events:
+                    if event["type"] == "delta":
+                        if time_to_first_token is None:
+                            time_to_first_token = time.perf_counter() - started
+                        chunks.append(event["text"])
+                        yield _sse_event("delta", {"text": event["text"]})
+                    elif event["type"] == "usage":
+                        usage = event
+            finished = True
+        
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield _sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+        
+        finally:
+            # Save the turn once the stream has finished, and the partial
+            # response after a client disconnect or a failure once output
+            # started, since those tokens were paid for too
+            if finished or chunks or usage is not None:
+                response_text = "".join(chunks)
+                usage = usage or ChatService.estimate_usage(provider, request, context, response_text)
+                turn = ChatService.build_turn(user_id, thread_id, request, {
+                    **usage,
+                    "response": response_text,
+                    "provider": provider.get_provider_name(),
+                    "model": provider.model,
+                    "message_tokens": conversation.history[-1]["tokens"]
+                })
+                schedule_compaction(background_tasks, history, turn)
+                await _save_conversations([turn])
+        
+        if not finished:
+            return
+        
+        ttft_ms = round(time_to_first_token * 1000, 1) if time_to_first_token is not None else None
+        logger.info(
+            f"Chat stream completed for user {username}: {usage['tokens_used']} tokens, "
+            f"${usage['cost']}, first token after {ttft_ms}ms"
+        )
+        
+        yield _sse_event("done", {
+            "provider": provider.get_provider_name(),
+            "model": provider.model,
+            "tokens_used": usage["tokens_used"],
+            "cost": usage["cost"],
+            "cache_read_tokens": usage.get("cache_read_tokens", 0),
+            "cache_write_tokens": usage.get("cache_write_tokens", 0),
+            "time_to_first_token_ms": ttft_ms,
+            "thread_id": thread_id,
+            "context_messages": len(context),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/batch")
+async def chat_batch(
+    batch: ChatBatchRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Run many chat requests concurrently and stream results as NDJSON
+    
+    Each line is a result for one item, in completion order and tagged with
+    its index; the final line summarises the batch. Items continuing a
+    thread see its history as of the start of the batch. Items always run
+    in the batch priority class.
+    """
+    # Each item counts against the batch budget; the limiter's store blocks,
+    # so it runs off the event loop like the RateLimit dependency
+    await run_in_threadpool(
+        enforce_rate_limit,
+        current_user, "chat_batch", settings.rate_limit_batch_items_per_minute, cost=len(batch.items)
+    )
+    user_id = current_user.id
+    username = current_user.username
+    semaphores: Dict[str, asyncio.Semaphore] = {}
+    thread_ids = [item.thread_id or uuid.uuid4().hex for item in batch.items]
+    histories = [await get_thread_history(db, user_id, item) for item in batch.items]
+    # Results are saved through a dedicated session; release this one's connection
+    await db.commit()
+    
+    async def run_item(index: int, item: ChatRequest):
+        try:
+            provider = get_llm_provider(item.provider, item.model)
+            semaphore = semaphores.setdefault(
+                provider.get_provider_name(),
+                asyncio.Semaphore(settings.batch_max_concurrency_per_provider)
+            )
+            async with semaphore:
+                result = await ChatService.generate_response(
+                    provider,
+                    item,
+                    hedge_provider=get_hedge_provider(item),
+                    fallback_providers=get_fallback_providers(provider),
+                    history=histories[index],
+                    user_id=user_id,
+                    priority="batch"
+                )
+            return index, item, result, None
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            return index, item, None, detail
+    
+    async def results_stream():
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(batch.items)]
+        conversations = []
+        failed = 0
+        total_cost = 0.0
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, item, result, error = await next_done
+                
+                if error is not None:
+                    failed += 1
+                    logger.error(f"Batch item {index} error: {error}")
+                    yield json.dumps({
+                        "index": index,
+                        "status": "error",
+                        "detail": f"Error generating response: {error}"
+                    }) + "\n"
+                    continue
+                
+                total_cost += result["cost"]
+                turn = ChatService.build_turn(user_id, thread_ids[index], item, result)
+                schedule_compaction(background_tasks, histories[index], turn)
+                conversations.append(turn)
+                response = ChatResponse(
+                    response=result["response"],
+                    provider=result["provider"],
+                    model=result["model"],
+                    tokens_used=result["tokens_used"],
+                    cost=result["cost"],
+                    timestamp=datetime.utcnow(),
+                    cached=result["cached"],
+                    thread_id=thread_ids[index],
+                    context_messages=result["context_messages"],
+                    cache_read_tokens=result.get("cache_read_tokens", 0),
+                    cache_write_tokens=result.get("cache_write_tokens", 0)
+                )
+                yield json.dumps({
+                    "index": index,
+                    "status": "ok",
+                    **response.model_dump(mode="json")
+                }) + "\n"
+        
+        finally:
+            # Stop outstanding work if the client went away, then persist
+            # everything that completed in a single bulk insert
+            for task in tasks:
+                task.cancel()
+            await _save_conversations(conversations)
+        
+        total_cost = round(total_cost, 6)
+        logger.info(
+            f"Batch completed for user {username}: {len(conversations)} succeeded, "
+            f"{failed} failed, ${total_cost}"
+        )
+        
+        yield json.dumps({
+            "status": "done",
+            "completed": len(conversations),
+            "failed": failed,
+            "total_cost": total_cost
+        }) + "\n"
+    
+    return StreamingResponse(results_stream(), media_type="application/x-ndjson")
+
+
 @router.get("/history", response_model=ConversationListResponse)
 async def get_conversation_history(
-    limit: int = 10,
-    offset: int = 0,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=200),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0, description="Deprecated, use cursor"),
+    include_total: bool = False,
+    current_user: User = Depends(RateLimit("chat_history", settings.rate_limit_history_per_minute)),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get conversation history for current user"""
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(Conversation.created_at.desc()).offset(offset).limit(limit).all()
+    """Get conversation history for current user, newest first
+    
+    Pages are read by keyset on (created_at, id): pass a page's next_cursor
+    to get the next one. The total comes from the user's usage counters
+    when include_total is set.
+    """
+    query = select(Conversation).where(Conversation.user_id == current_user.id)
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        query = query.where(or_(
+            Conversation.created_at < created_at,
+            and_(Conversation.created_at == created_at, Conversation.id < last_id)
+        ))
+    elif offset:
+        query = query.offset(offset)
     
-    total = db.query(Conversation).filter(Conversation.user_id == current_user.id).count()
+    # One extra row tells whether another page follows
+    conversations = (await db.scalars(query.order_by(
+        Conversation.created_at.desc(), Conversation.id.desc()
+    ).limit(limit + 1))).all()
+    
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        next_cursor = encode_cursor(conversations[-1].created_at, conversations[-1].id)
+    
+    total = None
+    if include_total:
+        total = await db.scalar(
+            select(func.coalesce(func.sum(UsageCounter.conversations), 0)).where(
+                UsageCounter.user_id == current_user.id
+            )
+        )
     
     return ConversationListResponse(
         conversations=conversations,
-        total=total
-    )
\ No newline at end of file
+        total=total,
+        next_cursor=next_cursor
+    )
@@ -3,6 +3,7 @@ Health check endpoint
 """
 from fastapi import APIRouter
 from datetime import datetime
+from ..services.chat_services import chat_scheduler, circuit_breakers, concurrency_limiters
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -14,4 +15,16 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "service": "AI Assistant API"
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/providers")
+async def provider_health():
+    """Circuit breaker state, adaptive concurrency limits per provider and
+    chat scheduler queues per priority class"""
+    return {
+        "circuits": circuit_breakers.snapshot(),
+        "concurrency": concurrency_limiters.snapshot(),
+        "scheduler": chat_scheduler.snapshot(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
@@ -2,17 +2,27 @@
 Pydantic schemas for chat/LLM interactions
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 
 class ChatRequest(BaseModel):
     """Schema for chat request"""
     message: str = Field(..., min_length=1, max_length=10000)
-    provider: Optional[str] = Field("openai", description="LLM provider (openai/anthropic)")
+    provider: Optional[str] = Field("openai", description="LLM provider (openai/anthropic/mock)")
     model: Optional[str] = Field(None, description="Model name")
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0)
     max_tokens: Optional[int] = Field(1000, ge=1, le=4000)
+    use_cache: Optional[bool] = Field(False, description="Allow cached responses even when temperature > 0")
+    hedge: Optional[bool] = Field(False, description="Race a backup provider when the primary is slow")
+    thread_id: Optional[str] = Field(None, max_length=64, description="Continue a conversation thread; a new one is started if omitted")
+    system_prompt: Optional[str] = Field(None, max_length=20000, description="Override the configured system prompt")
+    priority: Literal["interactive", "batch"] = Field("interactive", description="Set batch to run behind interactive traffic; a request cannot raise its user's class, and /chat/batch and /chat/jobs always run as batch")
+
+
+class ChatBatchRequest(BaseModel):
+    """Schema for a batch of chat requests"""
+    items: List[ChatRequest] = Field(..., min_length=1, max_length=1000)
 
 
 class ChatResponse(BaseModel):
@@ -23,17 +33,37 @@ class ChatResponse(BaseModel):
     tokens_used: int
     cost: float
     timestamp: datetime
+    cached: bool = False
+    thread_id: Optional[str] = None
+    context_messages: int = Field(0, description="Earlier messages of the thread sent with this request")
+    cache_read_tokens: int = Field(0, description="Prompt tokens served from the provider's prompt cache")
+    cache_write_tokens: int = Field(0, description="Prompt tokens written to the provider's prompt cache")
+
+
+class ChatJobResponse(BaseModel):
+    """Schema for a background chat job"""
+    id: int
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
 
 
 class ConversationHistory(BaseModel):
     """Schema for conversation history"""
     id: int
+    thread_id: Optional[str] = None
     message: str
     response: str
     provider: str
     model: str
     tokens_used: int
     cost: float
+    cache_read_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
     created_at: datetime
     
     class Config:
@@ -43,4 +73,5 @@ class ConversationHistory(BaseModel):
 class ConversationListResponse(BaseModel):
     """Schema for list of conversations"""
     conversations: List[ConversationHistory]
-    total: int
\ No newline at end of file
+    total: Optional[int] = Field(None, description="Conversations of the user; only counted when include_total is set")
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; None on the last page")
\ No newline at end of file
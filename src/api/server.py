@@ -4,9 +4,12 @@ FastAPI application setup
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import auth, chat, health
-from .database.db import create_tables
+from .database.db import async_engine, create_tables
 from ..config import settings
+from ..llm.client_registry import client_registry
+from ..llm.token_counter import token_counter
 from ..utils.logger import logger
+from .services.job_services import chat_job_workers
 
 # Create FastAPI app
 app = FastAPI(
@@ -37,6 +40,11 @@ async def startup_event():
     logger.info("Starting AI Assistant API...")
     create_tables()
     logger.info("Database tables created/verified")
+    token_counter.warmup([settings.default_model, "gpt-3.5-turbo", "claude-3-haiku-20240307"])
+    logger.info("Tokenizer encoders loaded")
+    if settings.job_workers > 0:
+        chat_job_workers.start(chat.run_chat_job)
+        logger.info(f"Started {settings.job_workers} chat job workers")
     logger.info(f"API running on http://{settings.api_host}:{settings.api_port}")
 
 
@@ -44,6 +52,11 @@ async def startup_event():
 async def shutdown_event():
     """Run on application shutdown"""
     logger.info("Shutting down AI Assistant API...")
+    await chat_job_workers.stop()
+    logger.info("Chat job workers stopped")
+    await async_engine.dispose()
+    await client_registry.aclose()
+    logger.info("LLM provider clients closed")
 
 
 @app.get("/")
@@ -1,7 +1,8 @@
 """
 Authentication service layer
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from ..database.models import User
 from ..core.security import verify_password, get_password_hash, create_access_token
@@ -12,17 +13,17 @@ class AuthService:
     """Service for authentication operations"""
     
     @staticmethod
-    def register_user(db: Session, user_data: UserCreate) -> User:
+    async def register_user(db: AsyncSession, user_data: UserCreate) -> User:
         """Register a new user"""
         # Check if username exists
-        if db.query(User).filter(User.username == user_data.username).first():
+        if await db.scalar(select(User.id).where(User.username == user_data.username)):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already registered"
             )
         
         # Check if email exists
-        if db.query(User).filter(User.email == user_data.email).first():
+        if await db.scalar(select(User.id).where(User.email == user_data.email)):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
@@ -37,15 +38,15 @@ class AuthService:
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         return db_user
     
     @staticmethod
-    def authenticate_user(db: Session, login_data: UserLogin) -> Token:
+    async def authenticate_user(db: AsyncSession, login_data: UserLogin) -> Token:
         """Authenticate user and return token"""
-        user = db.query(User).filter(User.username == login_data.username).first()
+        user = await db.scalar(select(User).where(User.username == login_data.username))
         
         if not user or not verify_password(login_data.password, user.hashed_password):
             raise HTTPException(
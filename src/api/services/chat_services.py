@@ -0,0 +1,553 @@
+"""
+Chat service layer
+"""
+import asyncio
+import contextlib
+import functools
+import time
+from typing import Dict, Any, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database.models import Conversation, ThreadSummary
+from .compaction_services import CompactionService
+from ..schemas.chat_schemas import ChatRequest
+from ...llm.base import BaseLLMProvider
+from ...llm.errors import ProviderRequestError
+from ...llm.retry import retry_policy
+from ...llm.token_counter import token_counter, TOKENS_PER_MESSAGE, TOKENS_PER_REPLY
+from ...config import settings
+from ...utils.adaptive_limiter import ConcurrencyLimiterRegistry, LoadShedError
+from ...utils.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from ...utils.conversation import ConversationManager
+from ...utils.latency import LatencyTracker
+from ...utils.logger import logger
+from ...utils.response_cache import ResponseCache
+from ...utils.scheduler import FairScheduler
+from ...utils.semantic_cache import SemanticCache
+from ...utils.singleflight import SingleFlight
+
+# Exact-match cache shared by all requests in this process
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl_seconds=settings.response_cache_ttl
+)
+
+# Near-duplicate prompt cache, consulted after an exact-match miss
+semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    max_entries_per_model=settings.semantic_cache_max_entries,
+    ttl_seconds=settings.response_cache_ttl
+)
+
+# Identical requests currently waiting on a provider
+inflight_requests = SingleFlight()
+
+# Observed provider latencies, used to pick the hedging delay
+latency_tracker = LatencyTracker()
+
+# One circuit per provider/model so a degraded provider is skipped instantly
+circuit_breakers = CircuitBreakerRegistry(
+    failure_rate_threshold=settings.circuit_failure_rate_threshold,
+    slow_call_threshold=settings.circuit_slow_call_threshold,
+    window_size=settings.circuit_window_size,
+    min_calls=settings.circuit_min_calls,
+    open_seconds=settings.circuit_open_seconds
+)
+
+# Adaptive in-flight limit per provider; excess calls queue briefly or are shed
+concurrency_limiters = ConcurrencyLimiterRegistry(
+    initial_limit=settings.concurrency_initial_limit,
+    min_limit=settings.concurrency_min_limit,
+    max_limit=settings.concurrency_max_limit,
+    max_queue=settings.concurrency_max_queue,
+    queue_timeout=settings.concurrency_queue_timeout,
+    latency_tolerance=settings.concurrency_latency_tolerance
+)
+
+# Slots for /chat/ generations, shared fairly between priority classes and users.
+# By default there are as many as the adaptive limiters currently allow, so
+# the scheduler orders calls without capping them below the providers' limits
+chat_scheduler = FairScheduler(
+    max_concurrency=settings.scheduler_max_concurrency or concurrency_limiters.total_limit,
+    weights={
+        "interactive": settings.scheduler_interactive_weight,
+        "batch": settings.scheduler_batch_weight
+    },
+    max_queue=settings.scheduler_max_queue,
+    queue_timeout=settings.scheduler_queue_timeout
+)
+
+
+def _latency_key(provider: BaseLLMProvider) -> str:
+    return f"{provider.get_provider_name()}:{provider.model}"
+
+
+def _scheduled(user_id: Optional[int], priority: str):
+    """Hold a generation slot under the fair scheduler, if enabled"""
+    if user_id is None or not settings.scheduler_enabled:
+        return contextlib.nullcontext()
+    return chat_scheduler.slot(str(user_id), priority)
+
+
+def _without_usage(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a result for a request that did not pay for it"""
+    return {
+        **result,
+        "tokens_used": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cost": 0.0,
+        "cache_read_tokens": 0,
+        "cache_write_tokens": 0,
+        "hedge_provider": None,
+        "hedge_model": None,
+        "hedge_tokens_used": None,
+        "hedge_cost": None
+    }
+
+
+class _SharedResult:
+    """Provider result shared by coalesced requests, billed once
+    
+    The first request to receive it carries its cost; a request that
+    started the call but was cancelled before it finished never does.
+    """
+    
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+        self.billed = False
+    
+    def take(self) -> Dict[str, Any]:
+        if self.billed:
+            return _without_usage(self.result)
+        self.billed = True
+        return self.result
+
+
+@functools.lru_cache(maxsize=64)
+def _system_prompt_tokens(system: str, model: str) -> int:
+    """Tokens of a system prompt, counted once per prompt and model"""
+    return token_counter.count(system, model) + TOKENS_PER_MESSAGE
+
+
+class ChatService:
+    """Service for LLM generation"""
+    
+    @staticmethod
+    def is_cacheable(request: ChatRequest) -> bool:
+        """Only deterministic requests are cached unless the caller opts in"""
+        return settings.response_cache_enabled and (
+            request.temperature == 0 or bool(request.use_cache)
+        )
+    
+    @staticmethod
+    def system_prompt(request: ChatRequest) -> Optional[str]:
+        """System prompt for a request: its own, else the configured one"""
+        return request.system_prompt or settings.system_prompt
+    
+    @staticmethod
+    def hedge_delay(provider: BaseLLMProvider) -> float:
+        """Time to wait for the primary before firing the backup
+        
+        Tracks the primary's observed tail latency so only the slowest
+        requests are duplicated.
+        """
+        observed = latency_tracker.percentile(_latency_key(provider), settings.hedge_percentile)
+        if observed is None:
+            return settings.hedge_default_delay
+        return min(max(observed, settings.hedge_min_delay), settings.hedge_max_delay)
+    
+    @staticmethod
+    async def load_history(db: AsyncSession, user_id: int, thread_id: str) -> ConversationManager:
+        """Load a thread's summary and its latest unsummarized turns with
+        their cached token counts
+        
+        Turns stored without counts are counted once and backfilled.
+        """
+        summary = await db.scalar(select(ThreadSummary).where(
+            ThreadSummary.user_id == user_id,
+            ThreadSummary.thread_id == thread_id
+        ))
+        
+        turns = (await db.scalars(select(Conversation).where(
+            Conversation.user_id == user_id,
+            Conversation.thread_id == thread_id,
+            Conversation.id > (summary.covered_through_id if summary else 0)
+        ).order_by(Conversation.id.desc()).limit(settings.context_max_turns))).all()
+        
+        history = ConversationManager(tokens_per_message=TOKENS_PER_MESSAGE)
+        if summary:
+            CompactionService.add_summary(history, summary)
+        
+        backfilled = False
+        for turn in reversed(turns):
+            if turn.message_tokens is None:
+                turn.message_tokens = token_counter.count(turn.message, turn.model)
+                backfilled = True
+            if turn.response_tokens is None:
+                turn.response_tokens = token_counter.count(turn.response, turn.model)
+                backfilled = True
+            history.add("user", turn.message, turn.message_tokens)
+            history.add("assistant", turn.response, turn.response_tokens)
+        
+        if backfilled:
+            await db.commit()
+        return history
+    
+    @staticmethod
+    def preflight(
+        provider: BaseLLMProvider,
+        request: ChatRequest,
+        history: Optional[ConversationManager] = None
+    ) -> ConversationManager:
+        """Count the new message, trim history to fit and reject requests
+        that cannot fit
+        
+        Only the new message is tokenized; earlier messages carry their
+        cached counts and system prompts are counted once per process.
+        History gets whatever is left of the context budget, the model's
+        context window and the prompt limit, newest turns first.
+        
+        Returns:
+            The conversation to send: the history that fits, followed by the
+            new user message
+        
+        Raises:
+            TokenLimitExceeded: if the new message alone is over the
+            configured limit or the model's context window
+        """
+        message_tokens = token_counter.count(request.message, provider.model)
+        system = ChatService.system_prompt(request)
+        system_tokens = _system_prompt_tokens(system, provider.model) if system else 0
+        reserved = system_tokens + message_tokens + TOKENS_PER_MESSAGE + TOKENS_PER_REPLY
+        
+        budget = settings.context_max_tokens
+        window = token_counter.context_window(provider.model)
+        if window is not None:
+            budget = min(budget, window - request.max_tokens - reserved)
+        if token_counter.max_prompt_tokens is not None:
+            budget = min(budget, token_counter.max_prompt_tokens - reserved)
+        
+        if history:
+            conversation = history.trim(max(budget, 0))
+        else:
+            conversation = ConversationManager(tokens_per_message=TOKENS_PER_MESSAGE)
+        conversation.add("user", request.message, message_tokens)
+        
+        token_counter.check_tokens(
+            system_tokens + conversation.tokens + TOKENS_PER_REPLY, provider.model, request.max_tokens
+        )
+        return conversation
+    
+    @staticmethod
+    def build_turn(
+        user_id: int,
+        thread_id: str,
+        request: ChatRequest,
+        result: Dict[str, Any]
+    ) -> Conversation:
+        """Conversation row for a completed turn, with token counts cached
+        for later turns of the thread
+        
+        The losing call of a hedged request is stored in the hedge columns,
+        so its spend counts against its own provider and model.
+        """
+        hedge_tokens = result.get("hedge_tokens_used") or 0
+        hedge_cost = result.get("hedge_cost") or 0.0
+        return Conversation(
+            user_id=user_id,
+            thread_id=thread_id,
+            message=request.message,
+            response=result["response"],
+            provider=result["provider"],
+            model=result["model"],
+            tokens_used=result["tokens_used"] - hedge_tokens,
+            cost=round(result["cost"] - hedge_cost, 6),
+            cache_read_tokens=result.get("cache_read_tokens", 0),
+            cache_write_tokens=result.get("cache_write_tokens", 0),
+            hedge_provider=result.get("hedge_provider"),
+            hedge_model=result.get("hedge_model"),
+            hedge_tokens_used=result.get("hedge_tokens_used"),
+            hedge_cost=result.get("hedge_cost"),
+            message_tokens=result["message_tokens"],
+            response_tokens=token_counter.count(result["response"], result["model"])
+        )
+    
+    @staticmethod
+    async def _call(
+        provider: BaseLLMProvider,
+        request: ChatRequest,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Call a provider through its circuit breaker and concurrency limiter
+        and record its latency"""
+        key = _latency_key(provider)
+        breaker = circuit_breakers.get(key)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {key}", breaker.retry_after())
+        
+        limiter = concurrency_limiters.get(provider.get_provider_name())
+        try:
+            await limiter.acquire()
+        except (LoadShedError, asyncio.CancelledError):
+            breaker.release()
+            raise
+        
+        started = time.perf_counter()
+        try:
+            result = await provider.agenerate_response(
+                prompt=request.message,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                history=history,
+                system=ChatService.system_prompt(request)
+            )
+        except asyncio.CancelledError:
+            limiter.release(None)
+            breaker.release()
+            raise
+        except ProviderRequestError:
+            # The provider answered; the request itself was bad
+            latency = time.perf_counter() - started
+            limiter.release(latency)
+            breaker.record_success(latency)
+            raise
+        except Exception:
+            limiter.release(time.perf_counter() - started, success=False)
+            breaker.record_failure()
+            raise
+        
+        latency = time.perf_counter() - started
+        limiter.release(latency)
+        breaker.record_success(latency)
+        latency_tracker.record(key, latency)
+        return {**result, "provider": provider.get_provider_name(), "model": provider.model}
+    
+    @staticmethod
+    async def _call_with_fallback(
+        chain: List[BaseLLMProvider],
+        request: ChatRequest,
+        hedge_provider: Optional[BaseLLMProvider] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Try each provider in order, retrying transient errors and skipping
+        providers whose circuit is open or that are shedding load"""
+        last_error: Optional[Exception] = None
+        unavailable: List[Exception] = []
+        
+        for candidate in chain:
+            # Racing a model against itself only doubles the bill, which
+            # happens when the chain falls back onto the hedge target
+            hedged = (
+                request.hedge and hedge_provider is not None
+                and _latency_key(hedge_provider) != _latency_key(candidate)
+            )
+            if hedged:
+                call = functools.partial(ChatService._hedged_call, candidate, hedge_provider, request, history)
+            else:
+                call = functools.partial(ChatService._call, candidate, request, history)
+            try:
+                # Transient failures are retried against the same provider
+                # before moving down the chain
+                return await retry_policy.run(call, name=_latency_key(candidate))
+            except (CircuitOpenError, LoadShedError) as e:
+                logger.warning(f"{_latency_key(candidate)} unavailable, trying next provider: {str(e)}")
+                unavailable.append(e)
+            except Exception as e:
+                logger.warning(f"{_latency_key(candidate)} failed, trying next provider: {str(e)}")
+                last_error = e
+        
+        if last_error is not None:
+            raise last_error
+        raise type(unavailable[-1])(
+            "All providers are temporarily unavailable",
+            min(e.retry_after for e in unavailable)
+        )
+    
+    @staticmethod
+    def estimate_usage(
+        provider: BaseLLMProvider,
+        request: ChatRequest,
+        history: Optional[List[Dict[str, str]]] = None,
+        response: str = ""
+    ) -> Dict[str, Any]:
+        """Usage of a call that ended without a usage report, counted
+        locally: its prompt tokens, which the provider bills once the call
+        is sent, plus any output received before it ended"""
+        messages = provider.build_messages(request.message, history, ChatService.system_prompt(request))
+        input_tokens = token_counter.count_messages(messages, provider.model)
+        output_tokens = token_counter.count(response, provider.model) if response else 0
+        return {
+            "tokens_used": input_tokens + output_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": provider.calculate_cost(input_tokens + output_tokens, input_tokens, output_tokens)
+        }
+    
+    @staticmethod
+    async def _hedged_call(
+        primary: BaseLLMProvider,
+        backup: BaseLLMProvider,
+        request: ChatRequest,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Race a backup provider against a slow primary
+        
+        The first successful answer wins and the other call is cancelled.
+        Tokens and cost of both calls are attributed to the request: a call
+        that completed reports its usage, and a cancelled call is charged
+        its prompt tokens. The losing call's share is also returned as
+        hedge_provider, hedge_model, hedge_tokens_used and hedge_cost.
+        """
+        delay = ChatService.hedge_delay(primary)
+        primary_task = asyncio.ensure_future(ChatService._call(primary, request, history))
+        tasks = [primary_task]
+        providers = {primary_task: primary}
+        cancelled = set()
+        
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary_task.result()
+            
+            logger.info(f"Hedging {_latency_key(primary)} with {_latency_key(backup)} after {delay:.2f}s")
+            backup_task = asyncio.ensure_future(ChatService._call(backup, request, history))
+            tasks.append(backup_task)
+            providers[backup_task] = backup
+            
+            pending = set(tasks)
+            winner = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary when both finish in the same tick
+                for task in tasks:
+                    if task in done and task.exception() is None:
+                        winner = task
+                        break
+            
+            if winner is None:
+                raise primary_task.exception()
+        
+        finally:
+            for task in tasks:
+                if not task.done():
+                    cancelled.add(task)
+                    task.cancel()
+        
+        result = winner.result()
+        loser = next(task for task in tasks if task is not winner)
+        if loser in cancelled:
+            loser_usage = ChatService.estimate_usage(providers[loser], request, history)
+        elif loser.exception() is None:
+            loser_usage = loser.result()
+        else:
+            # A failed call answered nothing and is not billed
+            return result
+        
+        return {
+            **result,
+            "tokens_used": result["tokens_used"] + loser_usage["tokens_used"],
+            "input_tokens": result.get("input_tokens", 0) + loser_usage.get("input_tokens", 0),
+            "output_tokens": result.get("output_tokens", 0) + loser_usage.get("output_tokens", 0),
+            "cost": round(result["cost"] + loser_usage["cost"], 6),
+            "cache_read_tokens": result.get("cache_read_tokens", 0) + loser_usage.get("cache_read_tokens", 0),
+            "cache_write_tokens": result.get("cache_write_tokens", 0) + loser_usage.get("cache_write_tokens", 0),
+            "hedge_provider": providers[loser].get_provider_name(),
+            "hedge_model": providers[loser].model,
+            "hedge_tokens_used": loser_usage["tokens_used"],
+            "hedge_cost": loser_usage["cost"]
+        }
+    
+    @staticmethod
+    async def generate_response(
+        provider: BaseLLMProvider,
+        request: ChatRequest,
+        hedge_provider: Optional[BaseLLMProvider] = None,
+        fallback_providers: Optional[List[BaseLLMProvider]] = None,
+        history: Optional[ConversationManager] = None,
+        user_id: Optional[int] = None,
+        priority: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate a response, serving repeated cacheable requests from cache
+        and sharing one provider call between identical concurrent requests
+        
+        Earlier turns of the thread in history are sent along, trimmed to
+        the context budget. When the provider's circuit is open or the call
+        fails, the fallback providers are tried in order. With a user_id,
+        the provider call waits for a slot under the fair scheduler, in the
+        given priority class or else the request's; cache hits and joined
+        calls do not take one.
+        
+        Returns:
+            Dict with keys: response, tokens_used, input_tokens, output_tokens,
+            cost, cached, provider, model, message_tokens, context_messages
+        """
+        conversation = ChatService.preflight(provider, request, history)
+        context = conversation.messages()[:-1]
+        turn = {
+            "message_tokens": conversation.history[-1]["tokens"],
+            "context_messages": len(context)
+        }
+        
+        provider_name = provider.get_provider_name()
+        cacheable = ChatService.is_cacheable(request)
+        # Near-duplicate matching only makes sense without earlier turns or
+        # a per-request system prompt
+        use_semantic = (
+            cacheable and settings.semantic_cache_enabled
+            and not context and not request.system_prompt
+        )
+        
+        request_key = ResponseCache.make_key(
+            provider_name,
+            provider.model,
+            request.message,
+            request.temperature,
+            request.max_tokens,
+            context,
+            ChatService.system_prompt(request)
+        )
+        
+        if cacheable:
+            cached = response_cache.get(request_key)
+            if cached is None and use_semantic:
+                cached = semantic_cache.get(
+                    provider_name, provider.model, request.message, request.temperature, request.max_tokens
+                )
+            if cached is not None:
+                # Nothing was sent to the provider, so nothing was spent
+                return _without_usage({
+                    "response": cached["response"],
+                    "cached": True,
+                    "provider": cached["provider"],
+                    "model": cached["model"],
+                    **turn
+                })
+        
+        async def call_provider() -> Dict[str, Any]:
+            async with _scheduled(user_id, priority or request.priority):
+                result = await ChatService._call_with_fallback(
+                    [provider, *(fallback_providers or [])], request, hedge_provider, context
+                )
+            if cacheable:
+                response_cache.set(request_key, result)
+            if use_semantic:
+                semantic_cache.set(
+                    provider_name, provider.model, request.message, result, request.temperature, request.max_tokens
+                )
+            return result
+        
+        if not settings.request_coalescing_enabled:
+            return {**(await call_provider()), "cached": False, **turn}
+        
+        async def shared_call() -> _SharedResult:
+            return _SharedResult(await call_provider())
+        
+        # A hedged call may bill a second model, so it is only shared with
+        # requests hedged against the same target
+        flight_key = request_key
+        if request.hedge and hedge_provider is not None:
+            flight_key = f"{request_key}:hedge:{hedge_provider.get_provider_name()}:{hedge_provider.model}"
+        
+        shared, _ = await inflight_requests.do(flight_key, shared_call)
+        return {**shared.take(), "cached": False, **turn}
@@ -0,0 +1,120 @@
+"""
+Background compaction of long conversation threads
+"""
+from typing import Optional, Set, Tuple
+from sqlalchemy import select
+from ..database.db import AsyncSessionLocal
+from ..database.models import Conversation, ThreadSummary
+from ...llm.base import BaseLLMProvider
+from ...llm.retry import retry_policy
+from ...llm.token_counter import token_counter
+from ...config import settings
+from ...utils.conversation import ConversationManager
+from ...utils.logger import logger
+
+SUMMARY_PREFIX = "Summary of our conversation so far:\n"
+SUMMARY_ACK = "Understood, I'll keep that in mind."
+
+SUMMARIZE_INSTRUCTIONS = (
+    "Summarize the conversation below so the summary can replace it as context for "
+    "continuing the conversation. Keep facts, decisions, names, numbers, code "
+    "identifiers and open questions; drop pleasantries. Write compact notes.\n\n"
+)
+
+# Threads with a compaction in progress in this process
+_compacting: Set[Tuple[int, str]] = set()
+
+
+class CompactionService:
+    """Fold the older turns of long threads into a rolling summary"""
+    
+    @staticmethod
+    def add_summary(history: ConversationManager, summary: ThreadSummary):
+        """Pin a thread's summary at the head of its history"""
+        history.add("user", SUMMARY_PREFIX + summary.summary, summary.summary_tokens, pinned=True)
+        history.add("assistant", SUMMARY_ACK, token_counter.count(SUMMARY_ACK, summary.model), pinned=True)
+    
+    @staticmethod
+    def should_compact(history: Optional[ConversationManager], turn: Conversation) -> bool:
+        """Whether a thread's unsummarized turns have grown past the threshold
+        
+        Uses the cached token counts, so the check needs no tokenization.
+        """
+        if not settings.compaction_enabled:
+            return False
+        pending = (history.unpinned_tokens if history else 0) + turn.message_tokens + turn.response_tokens
+        return pending >= settings.compaction_threshold_tokens
+    
+    @staticmethod
+    async def compact_thread(user_id: int, thread_id: str, provider: BaseLLMProvider):
+        """Summarize all but the newest turns of a thread
+        
+        Runs after the response has been sent. On failure the thread is
+        left as it was and compaction is retried after a later turn.
+        """
+        key = (user_id, thread_id)
+        if key in _compacting:
+            return
+        _compacting.add(key)
+        
+        db = AsyncSessionLocal()
+        try:
+            summary = await db.scalar(select(ThreadSummary).where(
+                ThreadSummary.user_id == user_id,
+                ThreadSummary.thread_id == thread_id
+            ))
+            covered_through_id = summary.covered_through_id if summary else 0
+            
+            turns = (await db.scalars(select(Conversation).where(
+                Conversation.user_id == user_id,
+                Conversation.thread_id == thread_id,
+                Conversation.id > covered_through_id
+            ).order_by(Conversation.id))).all()
+            
+            pending = sum((t.message_tokens or 0) + (t.response_tokens or 0) for t in turns)
+            folded = turns[:max(len(turns) - settings.compaction_keep_turns, 0)]
+            if pending < settings.compaction_threshold_tokens or not folded:
+                return
+            
+            prompt = SUMMARIZE_INSTRUCTIONS
+            if summary:
+                prompt += f"Summary of the turns before these:\n{summary.summary}\n\n"
+            prompt += "Conversation:\n" + "\n\n".join(
+                f"User: {t.message}\nAssistant: {t.response}" for t in folded
+            )
+            
+            result = await retry_policy.run(
+                lambda: provider.agenerate_response(
+                    prompt=prompt,
+                    temperature=0.0,
+                    max_tokens=settings.compaction_max_tokens
+                ),
+                name=f"compaction of thread {thread_id}"
+            )
+            text = result["response"].strip()
+            
+            if summary is None:
+                summary = ThreadSummary(user_id=user_id, thread_id=thread_id, tokens_used=0, cost=0.0)
+                db.add(summary)
+            summary.summary = text
+            summary.summary_tokens = token_counter.count(SUMMARY_PREFIX + text, provider.model)
+            summary.covered_through_id = folded[-1].id
+            summary.provider = provider.get_provider_name()
+            summary.model = provider.model
+            # Summaries are real provider spend, accumulated per thread
+            summary.tokens_used += result["tokens_used"]
+            summary.cost = round(summary.cost + result["cost"], 6)
+            await db.commit()
+            
+            logger.info(
+                f"Compacted {len(folded)} turns of thread {thread_id} for user {user_id}: "
+                f"{pending} tokens into {summary.summary_tokens}, ${result['cost']}"
+            )
+        
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Thread compaction error for {thread_id}: {str(e)}")
+        
+        finally:
+            await db.close()
+            _compacting.discard(key)
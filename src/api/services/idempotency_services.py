@@ -0,0 +1,163 @@
+"""
+Idempotency-Key handling for chat requests
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database.db import AsyncSessionLocal
+from ..database.models import IdempotencyRecord
+from ..schemas.chat_schemas import ChatRequest, ChatResponse
+from ...config import settings
+from ...utils.singleflight import SingleFlight
+
+# Idempotent requests being generated in this process, by user and key
+inflight_idempotent = SingleFlight()
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when a key is sent again with a different request body"""
+    pass
+
+
+class IdempotencyInProgress(Exception):
+    """Raised when the original request is still running in another worker"""
+    pass
+
+
+class IdempotencyService:
+    """Run a request at most once per (user, Idempotency-Key)
+    
+    The first request stores a pending record and generates the response;
+    the response is saved to the record in the same transaction as the
+    conversation it produced. Retries within the TTL get the stored
+    response back, or join the original call if it is still running in
+    this process.
+    """
+    
+    @staticmethod
+    def fingerprint(request: ChatRequest) -> str:
+        """Hash of the request body"""
+        return hashlib.sha256(request.model_dump_json().encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    async def _claim(
+        db: AsyncSession,
+        user_id: int,
+        key: str,
+        fingerprint: str
+    ) -> Tuple[IdempotencyRecord, bool]:
+        """Create a pending record for a new key, or return the existing one
+        
+        Returns:
+            (record, claimed), where claimed is True when this call took the
+            key's lock and must generate the response
+        """
+        now = datetime.utcnow()
+        record = await db.scalar(select(IdempotencyRecord).where(
+            IdempotencyRecord.user_id == user_id,
+            IdempotencyRecord.key == key
+        ))
+        
+        if record is not None and record.expires_at <= now:
+            await db.delete(record)
+            await db.commit()
+            record = None
+        
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+            # A lapsed lock means the worker that claimed the key died
+            if record.response is None and record.locked_until <= now:
+                record.locked_until = now + timedelta(seconds=settings.idempotency_lock_seconds)
+                await db.commit()
+                return record, True
+            return record, False
+        
+        # Expired keys of this user are cleaned up as new ones are claimed
+        await db.execute(delete(IdempotencyRecord).where(
+            IdempotencyRecord.user_id == user_id,
+            IdempotencyRecord.expires_at <= now
+        ))
+        
+        record = IdempotencyRecord(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            locked_until=now + timedelta(seconds=settings.idempotency_lock_seconds),
+            expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds)
+        )
+        db.add(record)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Claimed concurrently by another worker
+            await db.rollback()
+            raise IdempotencyInProgress("A request with this Idempotency-Key is already in progress")
+        return record, True
+    
+    @staticmethod
+    async def _release(user_id: int, key: str):
+        """Drop a pending record so the request can be retried after a failure"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyRecord).where(
+                IdempotencyRecord.user_id == user_id,
+                IdempotencyRecord.key == key,
+                IdempotencyRecord.response.is_(None)
+            ))
+            await db.commit()
+    
+    @staticmethod
+    async def run(
+        db: AsyncSession,
+        user_id: int,
+        key: str,
+        request: ChatRequest,
+        generate: Callable[[AsyncSession], Awaitable[ChatResponse]]
+    ) -> Tuple[ChatResponse, bool]:
+        """Generate the response for a keyed request, or replay it
+        
+        generate(session) must add its rows to session without committing,
+        so they are committed together with the stored response.
+        
+        Returns:
+            (response, replayed)
+        
+        Raises:
+            IdempotencyKeyReused: the key was used for a different request
+            IdempotencyInProgress: the original request is running elsewhere
+        """
+        record, claimed = await IdempotencyService._claim(
+            db, user_id, key, IdempotencyService.fingerprint(request)
+        )
+        if record.response is not None:
+            return ChatResponse.model_validate_json(record.response), True
+        
+        flight_key = f"{user_id}:{key}"
+        if not claimed and flight_key not in inflight_idempotent:
+            raise IdempotencyInProgress("A request with this Idempotency-Key is already in progress")
+        
+        # The generation runs in its own session; end the request session's
+        # transaction so it does not hold a second connection meanwhile
+        await db.commit()
+        
+        async def execute() -> ChatResponse:
+            # Runs detached from the request, so it owns its session
+            async with AsyncSessionLocal() as session:
+                try:
+                    response = await generate(session)
+                    await session.execute(update(IdempotencyRecord).where(
+                        IdempotencyRecord.user_id == user_id,
+                        IdempotencyRecord.key == key
+                    ).values(response=response.model_dump_json()))
+                    await session.commit()
+                    return response
+                except BaseException:
+                    await session.rollback()
+                    await IdempotencyService._release(user_id, key)
+                    raise
+        
+        # Callers that join a running call get its response as a replay
+        return await inflight_idempotent.do(flight_key, execute)
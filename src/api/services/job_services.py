@@ -0,0 +1,220 @@
+"""
+Background chat jobs: persistent queue and local worker pool
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+from fastapi import BackgroundTasks
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database.db import AsyncSessionLocal
+from ..database.models import ChatJob
+from ..schemas.chat_schemas import ChatJobResponse, ChatRequest, ChatResponse
+from ...config import settings
+from ...llm.errors import ProviderError
+from ...utils.adaptive_limiter import LoadShedError
+from ...utils.circuit_breaker import CircuitOpenError
+from ...utils.logger import logger
+
+# handler(session, user_id, request, background_tasks) generates the response,
+# adding its rows to session without committing
+JobHandler = Callable[[AsyncSession, int, ChatRequest, BackgroundTasks], Awaitable[ChatResponse]]
+
+
+def _retryable(error: Exception) -> bool:
+    """Whether a failed job is worth running again later"""
+    if isinstance(error, (CircuitOpenError, LoadShedError)):
+        return True
+    return isinstance(error, ProviderError) and error.retryable
+
+
+class JobService:
+    """Persistence of queued chat jobs"""
+    
+    @staticmethod
+    async def submit(db: AsyncSession, user_id: int, request: ChatRequest) -> ChatJob:
+        """Queue a chat request"""
+        job = ChatJob(
+            user_id=user_id,
+            status="queued",
+            request=request.model_dump_json(),
+            attempts=0,
+            locked_until=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+    
+    @staticmethod
+    async def get(db: AsyncSession, user_id: int, job_id: int) -> Optional[ChatJob]:
+        """Get a job owned by user_id"""
+        return await db.scalar(select(ChatJob).where(
+            ChatJob.id == job_id,
+            ChatJob.user_id == user_id
+        ))
+    
+    @staticmethod
+    async def claim(db: AsyncSession) -> Optional[ChatJob]:
+        """Lease the oldest runnable job
+        
+        Queued jobs past their retry delay are runnable, as are running jobs
+        whose lease has lapsed because their worker died. The lease is taken
+        with a compare-and-set on status and lock, so workers in other
+        processes never claim the same job.
+        """
+        now = datetime.utcnow()
+        candidates = (await db.execute(select(ChatJob.id, ChatJob.status, ChatJob.locked_until).where(
+            ChatJob.status.in_(("queued", "running")),
+            ChatJob.locked_until <= now
+        ).order_by(ChatJob.id).limit(10))).all()
+        
+        for job_id, job_status, locked_until in candidates:
+            claimed = (await db.execute(
+                update(ChatJob).where(
+                    ChatJob.id == job_id,
+                    ChatJob.status == job_status,
+                    ChatJob.locked_until == locked_until
+                ).values(
+                    status="running",
+                    attempts=ChatJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=settings.job_lease_seconds),
+                    started_at=now
+                )
+            )).rowcount
+            await db.commit()
+            if claimed:
+                return await db.get(ChatJob, job_id)
+        return None
+    
+    @staticmethod
+    def to_response(job: ChatJob) -> ChatJobResponse:
+        """API view of a job"""
+        return ChatJobResponse(
+            id=job.id,
+            status=job.status,
+            attempts=job.attempts,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            result=ChatResponse.model_validate_json(job.response) if job.response else None,
+            error=job.error
+        )
+
+
+class ChatJobWorkerPool:
+    """Asyncio workers running queued chat jobs in this process
+    
+    Jobs live in the database, so they survive a restart: on shutdown a
+    running job is handed back to the queue, and one whose process died
+    is picked up again once its lease lapses. A job's conversation turn
+    and its result are committed in one transaction.
+    """
+    
+    def __init__(self, workers: int = 4, poll_interval: float = 2.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._handler: Optional[JobHandler] = None
+    
+    def start(self, handler: JobHandler):
+        """Start the workers on the running event loop"""
+        if self._tasks:
+            return
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        """Stop the workers, requeueing the jobs they were running"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def notify(self):
+        """Wake idle workers after a job is submitted"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _work(self):
+        while True:
+            try:
+                ran = await self._run_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat job worker error: {str(e)}")
+                ran = False
+            
+            if not ran:
+                # Poll too, for jobs submitted to other processes and lapsed leases
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+    
+    async def _run_next(self) -> bool:
+        """Claim and run one job; False when none is runnable"""
+        async with AsyncSessionLocal() as db:
+            job = await JobService.claim(db)
+            if job is None:
+                return False
+            
+            if job.attempts > settings.job_max_attempts:
+                job.status = "failed"
+                job.error = job.error or "Job was interrupted too many times"
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                return True
+            
+            background_tasks = BackgroundTasks()
+            try:
+                response = await self._handler(
+                    db, job.user_id, ChatRequest.model_validate_json(job.request), background_tasks
+                )
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back for the next start
+                await db.rollback()
+                await db.refresh(job)
+                job.status = "queued"
+                job.attempts -= 1
+                job.locked_until = datetime.utcnow()
+                await db.commit()
+                raise
+            except Exception as e:
+                # Rolling back expires the job; reload it before updating
+                await db.rollback()
+                await db.refresh(job)
+                job.error = str(e)
+                if _retryable(e) and job.attempts < settings.job_max_attempts:
+                    delay = settings.job_retry_delay * 2 ** (job.attempts - 1)
+                    job.status = "queued"
+                    job.locked_until = datetime.utcnow() + timedelta(seconds=delay)
+                    logger.warning(f"Chat job {job.id} failed, retrying in {delay:.0f}s: {str(e)}")
+                else:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                    logger.error(f"Chat job {job.id} failed: {str(e)}")
+                await db.commit()
+                return True
+            
+            job.status = "succeeded"
+            job.response = response.model_dump_json()
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            logger.info(f"Chat job {job.id} succeeded after {job.attempts} attempt(s)")
+            
+            # Post-commit work such as thread compaction
+            await background_tasks()
+            return True
+
+
+# Started by the API on startup when JOB_WORKERS > 0
+chat_job_workers = ChatJobWorkerPool(
+    workers=settings.job_workers,
+    poll_interval=settings.job_poll_interval
+)
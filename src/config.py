@@ -15,6 +15,8 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = Field("sqlite:///./ai_assistant.db", env="DATABASE_URL")
+    # Derived from DATABASE_URL (aiosqlite, asyncpg, aiomysql) when unset
+    async_database_url: Optional[str] = Field(None, env="ASYNC_DATABASE_URL")
     
     # JWT Settings
     secret_key: str = Field("your-secret-key-change-in-production", env="SECRET_KEY")
@@ -34,6 +36,125 @@ class Settings(BaseSettings):
     default_model: str = Field("gpt-3.5-turbo", env="DEFAULT_MODEL")
     max_tokens: int = Field(1000, env="MAX_TOKENS")
     temperature: float = Field(0.7, env="TEMPERATURE")
+    max_prompt_tokens: Optional[int] = Field(None, env="MAX_PROMPT_TOKENS")
+    system_prompt: Optional[str] = Field(None, env="SYSTEM_PROMPT")
+    
+    # Provider prompt caching (cache breakpoints on stable prompt prefixes)
+    prompt_caching_enabled: bool = Field(True, env="PROMPT_CACHING_ENABLED")
+    
+    # Multi-turn Context
+    context_max_tokens: int = Field(4000, env="CONTEXT_MAX_TOKENS")
+    context_max_turns: int = Field(50, env="CONTEXT_MAX_TURNS")
+    
+    # Thread Compaction (rolling summaries of older turns)
+    compaction_enabled: bool = Field(True, env="COMPACTION_ENABLED")
+    compaction_threshold_tokens: int = Field(3000, env="COMPACTION_THRESHOLD_TOKENS")
+    compaction_keep_turns: int = Field(4, env="COMPACTION_KEEP_TURNS")
+    compaction_provider: str = Field("openai", env="COMPACTION_PROVIDER")
+    compaction_model: Optional[str] = Field("gpt-3.5-turbo", env="COMPACTION_MODEL")
+    compaction_max_tokens: int = Field(500, env="COMPACTION_MAX_TOKENS")
+    
+    # Mock Provider (offline load and chaos testing)
+    enable_mock_provider: bool = Field(False, env="ENABLE_MOCK_PROVIDER")
+    mock_latency_distribution: str = Field("lognormal", env="MOCK_LATENCY_DISTRIBUTION")
+    mock_latency_ms: float = Field(300.0, env="MOCK_LATENCY_MS")
+    mock_latency_jitter_ms: float = Field(100.0, env="MOCK_LATENCY_JITTER_MS")
+    mock_tokens_per_second: float = Field(50.0, env="MOCK_TOKENS_PER_SECOND")
+    mock_response_tokens: int = Field(64, env="MOCK_RESPONSE_TOKENS")
+    mock_error_rate: float = Field(0.0, env="MOCK_ERROR_RATE")
+    mock_timeout_rate: float = Field(0.0, env="MOCK_TIMEOUT_RATE")
+    mock_timeout_seconds: float = Field(30.0, env="MOCK_TIMEOUT_SECONDS")
+    mock_seed: Optional[int] = Field(None, env="MOCK_SEED")
+    
+    # LLM Client Pool
+    llm_max_connections: int = Field(100, env="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive_connections: int = Field(20, env="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    llm_keepalive_expiry: float = Field(30.0, env="LLM_KEEPALIVE_EXPIRY")
+    llm_request_timeout: float = Field(60.0, env="LLM_REQUEST_TIMEOUT")
+    
+    # Provider Retries
+    retry_max_attempts: int = Field(3, env="RETRY_MAX_ATTEMPTS")
+    retry_base_delay: float = Field(0.2, env="RETRY_BASE_DELAY")
+    retry_max_delay: float = Field(5.0, env="RETRY_MAX_DELAY")
+    retry_max_retry_after: float = Field(10.0, env="RETRY_MAX_RETRY_AFTER")
+    retry_budget_ratio: float = Field(0.1, env="RETRY_BUDGET_RATIO")
+    retry_budget_min_per_second: float = Field(1.0, env="RETRY_BUDGET_MIN_PER_SECOND")
+    retry_budget_max_balance: float = Field(10.0, env="RETRY_BUDGET_MAX_BALANCE")
+    
+    # Response Cache
+    response_cache_enabled: bool = Field(True, env="RESPONSE_CACHE_ENABLED")
+    response_cache_max_entries: int = Field(1024, env="RESPONSE_CACHE_MAX_ENTRIES")
+    response_cache_ttl: float = Field(3600.0, env="RESPONSE_CACHE_TTL")
+    
+    # Semantic Cache
+    semantic_cache_enabled: bool = Field(False, env="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float = Field(0.9, env="SEMANTIC_CACHE_THRESHOLD")
+    semantic_cache_max_entries: int = Field(512, env="SEMANTIC_CACHE_MAX_ENTRIES")
+    
+    # Coalesce identical concurrent requests into one provider call
+    request_coalescing_enabled: bool = Field(True, env="REQUEST_COALESCING_ENABLED")
+    
+    # Idempotency-Key replay for POST /chat/
+    idempotency_ttl_seconds: float = Field(86400.0, env="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_lock_seconds: float = Field(300.0, env="IDEMPOTENCY_LOCK_SECONDS")
+    
+    # Extra LLM providers, "name=package.module:factory" separated by commas
+    llm_providers: str = Field("", env="LLM_PROVIDERS")
+    
+    # Hedged Requests
+    hedge_provider: str = Field("anthropic", env="HEDGE_PROVIDER")
+    hedge_model: Optional[str] = Field(None, env="HEDGE_MODEL")
+    hedge_percentile: float = Field(95.0, env="HEDGE_PERCENTILE")
+    hedge_default_delay: float = Field(2.0, env="HEDGE_DEFAULT_DELAY")
+    hedge_min_delay: float = Field(0.2, env="HEDGE_MIN_DELAY")
+    hedge_max_delay: float = Field(10.0, env="HEDGE_MAX_DELAY")
+    
+    # Circuit Breaker & Fallback Routing
+    circuit_failure_rate_threshold: float = Field(0.5, env="CIRCUIT_FAILURE_RATE_THRESHOLD")
+    circuit_slow_call_threshold: float = Field(20.0, env="CIRCUIT_SLOW_CALL_THRESHOLD")
+    circuit_window_size: int = Field(20, env="CIRCUIT_WINDOW_SIZE")
+    circuit_min_calls: int = Field(5, env="CIRCUIT_MIN_CALLS")
+    circuit_open_seconds: float = Field(30.0, env="CIRCUIT_OPEN_SECONDS")
+    fallback_chain: str = Field(
+        "openai:gpt-3.5-turbo,anthropic:claude-3-haiku-20240307",
+        env="FALLBACK_CHAIN"
+    )
+    
+    # Adaptive Concurrency & Load Shedding (per provider)
+    concurrency_initial_limit: int = Field(20, env="CONCURRENCY_INITIAL_LIMIT")
+    concurrency_min_limit: int = Field(2, env="CONCURRENCY_MIN_LIMIT")
+    concurrency_max_limit: int = Field(200, env="CONCURRENCY_MAX_LIMIT")
+    concurrency_max_queue: int = Field(100, env="CONCURRENCY_MAX_QUEUE")
+    concurrency_queue_timeout: float = Field(30.0, env="CONCURRENCY_QUEUE_TIMEOUT")
+    concurrency_latency_tolerance: float = Field(2.0, env="CONCURRENCY_LATENCY_TOLERANCE")
+    
+    # Fair scheduling of /chat/ generations by priority class and user
+    scheduler_enabled: bool = Field(True, env="SCHEDULER_ENABLED")
+    # Unset: follow the sum of the providers' adaptive concurrency limits
+    scheduler_max_concurrency: Optional[int] = Field(None, env="SCHEDULER_MAX_CONCURRENCY")
+    scheduler_interactive_weight: float = Field(8.0, env="SCHEDULER_INTERACTIVE_WEIGHT")
+    scheduler_batch_weight: float = Field(1.0, env="SCHEDULER_BATCH_WEIGHT")
+    scheduler_max_queue: int = Field(200, env="SCHEDULER_MAX_QUEUE")
+    scheduler_queue_timeout: float = Field(60.0, env="SCHEDULER_QUEUE_TIMEOUT")
+    
+    # Background chat jobs (POST /chat/jobs)
+    job_workers: int = Field(4, env="JOB_WORKERS")
+    job_poll_interval: float = Field(2.0, env="JOB_POLL_INTERVAL")
+    job_lease_seconds: float = Field(900.0, env="JOB_LEASE_SECONDS")
+    job_max_attempts: int = Field(3, env="JOB_MAX_ATTEMPTS")
+    job_retry_delay: float = Field(10.0, env="JOB_RETRY_DELAY")
+    
+    # Batch Chat
+    batch_max_concurrency_per_provider: int = Field(8, env="BATCH_MAX_CONCURRENCY_PER_PROVIDER")
+    
+    # Rate Limiting (requests per minute per user)
+    rate_limit_enabled: bool = Field(True, env="RATE_LIMIT_ENABLED")
+    rate_limit_backend: str = Field("sqlite", env="RATE_LIMIT_BACKEND")
+    rate_limit_db_path: str = Field("./rate_limits.db", env="RATE_LIMIT_DB_PATH")
+    rate_limit_user_per_minute: int = Field(120, env="RATE_LIMIT_USER_PER_MINUTE")
+    rate_limit_chat_per_minute: int = Field(30, env="RATE_LIMIT_CHAT_PER_MINUTE")
+    rate_limit_batch_items_per_minute: int = Field(1000, env="RATE_LIMIT_BATCH_ITEMS_PER_MINUTE")
+    rate_limit_history_per_minute: int = Field(60, env="RATE_LIMIT_HISTORY_PER_MINUTE")
     
     # Cost Tracking
     enable_cost_tracking: bool = Field(True, env="ENABLE_COST_TRACKING")
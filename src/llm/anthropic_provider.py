@@ -1,14 +1,25 @@
 """
 Anthropic Claude LLM Provider implementation
 """
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional
 import anthropic
 from .base import BaseLLMProvider
+from .errors import (
+    ProviderError,
+    ProviderConnectionError,
+    ProviderTimeoutError,
+    error_for_status,
+    parse_retry_after
+)
 
 
 class AnthropicProvider(BaseLLMProvider):
     """Anthropic Claude provider implementation"""
     
+    # Prompt cache pricing relative to the input price
+    CACHE_WRITE_MULTIPLIER = 1.25
+    CACHE_READ_MULTIPLIER = 0.1
+    
     # Pricing per 1M tokens (approximate)
     PRICING = {
         "claude-3-haiku": {"input": 0.25, "output": 1.25},
@@ -16,15 +27,59 @@ class AnthropicProvider(BaseLLMProvider):
         "claude-3-opus": {"input": 15.0, "output": 75.0}
     }
     
-    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "claude-3-haiku-20240307",
+        client: Optional[anthropic.Anthropic] = None,
+        async_client: Optional[anthropic.AsyncAnthropic] = None,
+        prompt_caching: bool = True
+    ):
         super().__init__(api_key, model)
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # Retries are left to the shared retry policy and its budget
+        self.client = client or anthropic.Anthropic(api_key=api_key, max_retries=0)
+        self.async_client = async_client or anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+        self.prompt_caching = prompt_caching
+    
+    def _prompt(
+        self,
+        prompt: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """System prompt and messages with cache breakpoints on the stable prefix
+        
+        The system prompt and the last of the earlier turns are marked, so
+        the next request of the thread reads them from the prompt cache
+        instead of reprocessing them. Prefixes shorter than the model's
+        minimum cacheable length are simply not cached.
+        """
+        cache_control = {"type": "ephemeral"} if self.prompt_caching else None
+        messages = self.build_messages(prompt, history)
+        params: Dict[str, Any] = {"messages": messages}
+        
+        if system:
+            block = {"type": "text", "text": system}
+            if cache_control:
+                block["cache_control"] = cache_control
+            params["system"] = [block]
+        
+        if cache_control and history:
+            last = messages[-2]
+            messages[-2] = {
+                "role": last["role"],
+                "content": [{"type": "text", "text": last["content"], "cache_control": cache_control}]
+            }
+        
+        return params
     
     def generate_response(
         self,
         prompt: str,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """Generate response using Anthropic API"""
@@ -33,28 +88,112 @@ class AnthropicProvider(BaseLLMProvider):
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                messages=[{"role": "user", "content": prompt}]
+                **self._prompt(prompt, history, system)
             )
-            
-            content = message.content[0].text
-            tokens_used = message.usage.input_tokens + message.usage.output_tokens
-            cost = self.calculate_cost(tokens_used)
-            
-            return {
-                "response": content,
-                "tokens_used": tokens_used,
-                "cost": cost
-            }
+            return self._parse_message(message)
+        
+        except Exception as e:
+            raise self._error(e) from e
+    
+    async def agenerate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Generate response using the async Anthropic client"""
+        try:
+            message = await self.async_client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **self._prompt(prompt, history, system)
+            )
+            return self._parse_message(message)
+        
+        except Exception as e:
+            raise self._error(e) from e
+    
+    async def astream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream response deltas using the async Anthropic client"""
+        try:
+            async with self.async_client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **self._prompt(prompt, history, system)
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield {"type": "delta", "text": text}
+                
+                message = await stream.get_final_message()
         
         except Exception as e:
-            raise Exception(f"Anthropic API error: {str(e)}")
+            raise self._error(e) from e
+        
+        yield {"type": "usage", **self._usage(message)}
+    
+    @staticmethod
+    def _error(e: Exception) -> ProviderError:
+        """Translate an Anthropic client error into the provider error taxonomy"""
+        message = f"Anthropic API error: {str(e)}"
+        if isinstance(e, anthropic.APITimeoutError):
+            return ProviderTimeoutError(message)
+        if isinstance(e, anthropic.APIConnectionError):
+            return ProviderConnectionError(message)
+        if isinstance(e, anthropic.APIStatusError):
+            return error_for_status(e.status_code, message, parse_retry_after(e.response.headers))
+        return ProviderError(message)
+    
+    def _parse_message(self, message) -> Dict[str, Any]:
+        """Extract content, token usage and cost from a message"""
+        return {"response": message.content[0].text, **self._usage(message)}
+    
+    def _usage(self, message) -> Dict[str, Any]:
+        """Token usage and exact cost reported for a message"""
+        usage = message.usage
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        # input_tokens reported by the API excludes cached prompt tokens
+        input_tokens = usage.input_tokens + cache_read_tokens + cache_write_tokens
+        output_tokens = usage.output_tokens
+        tokens_used = input_tokens + output_tokens
+        
+        return {
+            "tokens_used": tokens_used,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": self.calculate_cost(
+                tokens_used, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens
+            ),
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens
+        }
     
     def get_provider_name(self) -> str:
         """Return provider name"""
         return "anthropic"
     
-    def calculate_cost(self, tokens_used: int) -> float:
-        """Calculate approximate cost"""
+    def calculate_cost(
+        self,
+        tokens_used: int,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """Calculate cost from the input/output split, or estimate it"""
         # Determine model family
         model_family = "claude-3-haiku"
         if "sonnet" in self.model:
@@ -64,10 +203,14 @@ class AnthropicProvider(BaseLLMProvider):
         
         pricing = self.PRICING.get(model_family, self.PRICING["claude-3-haiku"])
         
-        # Rough estimate: 75% input, 25% output
-        input_tokens = int(tokens_used * 0.75)
-        output_tokens = tokens_used - input_tokens
+        if input_tokens is None or output_tokens is None:
+            # Rough estimate: 75% input, 25% output
+            input_tokens = int(tokens_used * 0.75)
+            output_tokens = tokens_used - input_tokens
         
-        cost = (input_tokens / 1_000_000 * pricing["input"]) + \
+        uncached_tokens = input_tokens - cache_read_tokens - cache_write_tokens
+        cost = (uncached_tokens / 1_000_000 * pricing["input"]) + \
+               (cache_write_tokens / 1_000_000 * pricing["input"] * self.CACHE_WRITE_MULTIPLIER) + \
+               (cache_read_tokens / 1_000_000 * pricing["input"] * self.CACHE_READ_MULTIPLIER) + \
                (output_tokens / 1_000_000 * pricing["output"])
         return round(cost, 6)
\ No newline at end of file
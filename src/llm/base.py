@@ -2,7 +2,7 @@
 Base class for LLM providers
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional
 
 
 class BaseLLMProvider(ABC):
@@ -12,19 +12,80 @@ class BaseLLMProvider(ABC):
         self.api_key = api_key
         self.model = model
     
+    @staticmethod
+    def build_messages(
+        prompt: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """System prompt, earlier turns of the conversation and the new user
+        message, in chat completion format
+        
+        The order keeps the stable parts first, so providers that cache
+        prompt prefixes can reuse them across turns.
+        """
+        messages = [{"role": "system", "content": system}] if system else []
+        return [*messages, *(history or []), {"role": "user", "content": prompt}]
+    
     @abstractmethod
     def generate_response(
         self,
         prompt: str,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Generate response from LLM
         
+        history holds earlier user/assistant messages of the conversation,
+        oldest first; system is an optional system prompt.
+        
         Returns:
-            Dict with keys: response, tokens_used, cost
+            Dict with keys: response, tokens_used, input_tokens, output_tokens,
+            cost, cache_read_tokens, cache_write_tokens
+        """
+        pass
+    
+    @abstractmethod
+    async def agenerate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate response from LLM without blocking the event loop
+        
+        Returns:
+            Dict with keys: response, tokens_used, input_tokens, output_tokens,
+            cost, cache_read_tokens, cache_write_tokens
+        """
+        pass
+    
+    @abstractmethod
+    def astream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream response from LLM as it is generated
+        
+        Yields:
+            {"type": "delta", "text": ...} for each content chunk, followed by
+            a single {"type": "usage", "tokens_used": ..., "input_tokens": ...,
+            "output_tokens": ..., "cost": ..., "cache_read_tokens": ...,
+            "cache_write_tokens": ...}
         """
         pass
     
@@ -34,6 +95,19 @@ class BaseLLMProvider(ABC):
         pass
     
     @abstractmethod
-    def calculate_cost(self, tokens_used: int) -> float:
-        """Calculate cost based on tokens used"""
-        pass
\ No newline at end of file
+    def calculate_cost(
+        self,
+        tokens_used: int,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """Calculate cost based on tokens used
+        
+        Exact when the provider-reported input/output split is given,
+        otherwise estimated from the total. input_tokens includes any
+        prompt tokens read from or written to the provider's prompt cache,
+        which are priced separately.
+        """
+        pass
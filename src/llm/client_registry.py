@@ -0,0 +1,124 @@
+"""
+Process-wide registry of pooled LLM provider clients
+"""
+import inspect
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Tuple
+import httpx
+from ..config import settings
+
+# SDKs are imported when their first client is created, keeping startup fast
+if TYPE_CHECKING:
+    import aiohttp
+    import anthropic
+
+
+class ProviderClientRegistry:
+    """Keep one long-lived HTTP client per (provider, credentials)
+    
+    Provider instances are cheap and built per request; the clients they
+    wrap hold the connection pools, so sharing them lets every request reuse
+    warm keep-alive connections instead of paying a fresh TLS handshake.
+    """
+    
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, key: Tuple[str, str], factory) -> Any:
+        """Return the cached client for key, creating it on first use"""
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    self._clients[key] = client
+        return client
+    
+    def _httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+    
+    def get_anthropic_client(self, api_key: str) -> "anthropic.Anthropic":
+        """Get the shared synchronous Anthropic client"""
+        import anthropic
+        return self._get_or_create(
+            ("anthropic", api_key),
+            lambda: anthropic.Anthropic(
+                api_key=api_key,
+                # Retries are left to the shared retry policy and its budget
+                max_retries=0,
+                http_client=anthropic.DefaultHttpxClient(
+                    limits=self._httpx_limits(),
+                    timeout=httpx.Timeout(self.timeout, connect=5.0)
+                )
+            )
+        )
+    
+    def get_async_anthropic_client(self, api_key: str) -> "anthropic.AsyncAnthropic":
+        """Get the shared async Anthropic client"""
+        import anthropic
+        return self._get_or_create(
+            ("anthropic-async", api_key),
+            lambda: anthropic.AsyncAnthropic(
+                api_key=api_key,
+                # Retries are left to the shared retry policy and its budget
+                max_retries=0,
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    limits=self._httpx_limits(),
+                    timeout=httpx.Timeout(self.timeout, connect=5.0)
+                )
+            )
+        )
+    
+    def get_openai_session(self, api_key: str) -> "aiohttp.ClientSession":
+        """Get the shared aiohttp session used by async OpenAI calls
+        
+        Must be called from the event loop the session will be used on.
+        """
+        import aiohttp
+        return self._get_or_create(
+            ("openai-async", api_key),
+            lambda: aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_expiry
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        )
+    
+    async def aclose(self):
+        """Close every pooled client and forget them"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        
+        for client in clients:
+            # Synchronous clients close immediately, async ones return a coroutine
+            closed = client.close()
+            if inspect.isawaitable(closed):
+                await closed
+
+
+# Create default registry instance
+client_registry = ProviderClientRegistry(
+    max_connections=settings.llm_max_connections,
+    max_keepalive_connections=settings.llm_max_keepalive_connections,
+    keepalive_expiry=settings.llm_keepalive_expiry,
+    timeout=settings.llm_request_timeout
+)
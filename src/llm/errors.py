@@ -0,0 +1,100 @@
+"""
+Error taxonomy for LLM provider calls
+"""
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+class ProviderError(Exception):
+    """Base class for errors raised by LLM providers
+    
+    retryable marks transient failures (rate limits, overload, timeouts,
+    dropped connections) that may succeed if the same call is repeated.
+    retry_after is the delay the provider asked for, in seconds, if any.
+    """
+    
+    retryable = False
+    
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ProviderRateLimitError(ProviderError):
+    """The provider throttled the request (HTTP 429)"""
+    retryable = True
+
+
+class ProviderUnavailableError(ProviderError):
+    """The provider failed or is overloaded (HTTP 5xx, 529)"""
+    retryable = True
+
+
+class ProviderTimeoutError(ProviderError):
+    """The request timed out before the provider answered"""
+    retryable = True
+
+
+class ProviderConnectionError(ProviderError):
+    """The connection to the provider could not be made or was dropped"""
+    retryable = True
+
+
+class ProviderAuthenticationError(ProviderError):
+    """The API key was rejected (HTTP 401, 403)"""
+    pass
+
+
+class ProviderRequestError(ProviderError):
+    """The provider rejected the request itself (other HTTP 4xx)"""
+    pass
+
+
+def error_for_status(status_code: int, message: str, retry_after: Optional[float] = None) -> ProviderError:
+    """Map an HTTP status from a provider to the matching error"""
+    if status_code == 429:
+        error_class = ProviderRateLimitError
+    elif status_code == 408:
+        error_class = ProviderTimeoutError
+    elif status_code >= 500:
+        error_class = ProviderUnavailableError
+    elif status_code in (401, 403):
+        error_class = ProviderAuthenticationError
+    else:
+        error_class = ProviderRequestError
+    return error_class(message, status_code=status_code, retry_after=retry_after)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait from retry-after-ms / retry-after response headers
+    
+    retry-after may be a number of seconds or an HTTP date.
+    """
+    if not headers:
+        return None
+    
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
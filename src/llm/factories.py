@@ -0,0 +1,59 @@
+"""
+Built-in provider factories, configured from settings
+
+Each factory imports its provider module on first call, so SDKs are only
+loaded for providers that are actually used.
+"""
+import random
+from typing import Optional
+from .client_registry import client_registry
+from .registry import ProviderNotConfiguredError, ProviderNotFoundError
+from ..config import settings
+
+# Shared so latency and fault draws form one reproducible sequence per process
+mock_rng = random.Random(settings.mock_seed)
+
+
+def create_openai(model: Optional[str] = None):
+    """OpenAI provider backed by the shared client pool"""
+    if not settings.openai_api_key:
+        raise ProviderNotConfiguredError("OpenAI API key not configured")
+    from .openai_provider import OpenAIProvider
+    return OpenAIProvider(
+        api_key=settings.openai_api_key,
+        model=model or "gpt-3.5-turbo",
+        session=client_registry.get_openai_session(settings.openai_api_key)
+    )
+
+
+def create_anthropic(model: Optional[str] = None):
+    """Anthropic provider backed by the shared client pool"""
+    if not settings.anthropic_api_key:
+        raise ProviderNotConfiguredError("Anthropic API key not configured")
+    from .anthropic_provider import AnthropicProvider
+    return AnthropicProvider(
+        api_key=settings.anthropic_api_key,
+        model=model or "claude-3-haiku-20240307",
+        client=client_registry.get_anthropic_client(settings.anthropic_api_key),
+        async_client=client_registry.get_async_anthropic_client(settings.anthropic_api_key),
+        prompt_caching=settings.prompt_caching_enabled
+    )
+
+
+def create_mock(model: Optional[str] = None):
+    """Offline mock provider, when ENABLE_MOCK_PROVIDER is set"""
+    if not settings.enable_mock_provider:
+        raise ProviderNotFoundError("Unsupported provider: mock")
+    from .mock_provider import MockProvider
+    return MockProvider(
+        model=model or "mock-1",
+        latency_distribution=settings.mock_latency_distribution,
+        latency_ms=settings.mock_latency_ms,
+        latency_jitter_ms=settings.mock_latency_jitter_ms,
+        tokens_per_second=settings.mock_tokens_per_second,
+        response_tokens=settings.mock_response_tokens,
+        error_rate=settings.mock_error_rate,
+        timeout_rate=settings.mock_timeout_rate,
+        timeout_seconds=settings.mock_timeout_seconds,
+        rng=mock_rng
+    )
@@ -0,0 +1,211 @@
+"""
+Deterministic local mock LLM provider for load and chaos testing
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional
+from .base import BaseLLMProvider
+from .errors import ProviderTimeoutError, ProviderUnavailableError
+from .token_counter import token_counter
+
+VOCABULARY = [
+    "the", "model", "response", "token", "stream", "latency", "request", "system",
+    "provider", "cache", "answer", "context", "user", "message", "data", "result",
+    "quickly", "local", "mock", "test", "load", "value", "simple", "output",
+]
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+class MockProvider(BaseLLMProvider):
+    """Offline provider with configurable latency, streaming rate and faults
+    
+    Responses are a pure function of (model, prompt, temperature,
+    max_tokens), so repeated requests return identical text and usage.
+    Latency and fault injection draw from rng; pass a seeded
+    random.Random to make a whole run reproducible.
+    """
+    
+    # Pricing per 1K tokens, so cost accounting is exercised
+    PRICING = {"input": 0.0005, "output": 0.0015}
+    
+    def __init__(
+        self,
+        api_key: str = "mock",
+        model: str = "mock-1",
+        latency_distribution: str = "lognormal",
+        latency_ms: float = 300.0,
+        latency_jitter_ms: float = 100.0,
+        tokens_per_second: float = 50.0,
+        response_tokens: int = 64,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 30.0,
+        rng: Optional[random.Random] = None
+    ):
+        super().__init__(api_key, model)
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.rng = rng or random.Random()
+    
+    def sample_latency(self) -> float:
+        """Draw a time-to-first-token in seconds"""
+        mean = self.latency_ms
+        jitter = self.latency_jitter_ms
+        
+        if self.latency_distribution == "fixed":
+            value = mean
+        elif self.latency_distribution == "uniform":
+            value = self.rng.uniform(mean - jitter, mean + jitter)
+        elif self.latency_distribution == "normal":
+            value = self.rng.gauss(mean, jitter)
+        elif self.latency_distribution == "exponential":
+            value = self.rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        else:
+            # Lognormal with the given mean and standard deviation: a long tail
+            # like real provider latency
+            if mean <= 0:
+                value = 0.0
+            else:
+                sigma2 = math.log(1 + (jitter / mean) ** 2)
+                value = self.rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        
+        return max(0.0, value) / 1000
+    
+    def _fault(self) -> Optional[str]:
+        """Decide whether this call fails, times out, or succeeds"""
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.timeout_rate:
+            return "timeout"
+        return None
+    
+    def _inject_fault(self):
+        """Fail or hang, then fail, if a fault is drawn"""
+        fault = self._fault()
+        if fault == "timeout":
+            time.sleep(self.timeout_seconds)
+            raise ProviderTimeoutError("Mock API error: request timed out")
+        if fault == "error":
+            raise ProviderUnavailableError("Mock API error: injected failure", status_code=503)
+    
+    async def _ainject_fault(self):
+        """Async variant of _inject_fault"""
+        fault = self._fault()
+        if fault == "timeout":
+            await asyncio.sleep(self.timeout_seconds)
+            raise ProviderTimeoutError("Mock API error: request timed out")
+        if fault == "error":
+            raise ProviderUnavailableError("Mock API error: injected failure", status_code=503)
+    
+    def _tokens(self, prompt: str, temperature: float, max_tokens: int) -> List[str]:
+        """Deterministic response words for a request"""
+        digest = hashlib.sha256(f"{self.model}|{temperature}|{max_tokens}|{prompt}".encode("utf-8")).digest()
+        words = random.Random(digest).choices(VOCABULARY, k=min(self.response_tokens, max_tokens))
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+    
+    def _usage(self, messages: List[Dict[str, str]], output_tokens: int) -> Dict[str, Any]:
+        input_tokens = token_counter.count_messages(messages, self.model)
+        tokens_used = input_tokens + output_tokens
+        return {
+            "tokens_used": tokens_used,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": self.calculate_cost(tokens_used, input_tokens, output_tokens),
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0
+        }
+    
+    def _generation_time(self, output_tokens: int) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return output_tokens / self.tokens_per_second
+    
+    def generate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Generate a mock response, blocking for the simulated latency"""
+        self._inject_fault()
+        
+        tokens = self._tokens(prompt, temperature, max_tokens)
+        time.sleep(self.sample_latency() + self._generation_time(len(tokens)))
+        return {"response": "".join(tokens), **self._usage(self.build_messages(prompt, history, system), len(tokens))}
+    
+    async def agenerate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Generate a mock response without blocking the event loop"""
+        await self._ainject_fault()
+        
+        tokens = self._tokens(prompt, temperature, max_tokens)
+        await asyncio.sleep(self.sample_latency() + self._generation_time(len(tokens)))
+        return {"response": "".join(tokens), **self._usage(self.build_messages(prompt, history, system), len(tokens))}
+    
+    async def astream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream mock tokens at the configured rate after the first-token latency"""
+        await self._ainject_fault()
+        
+        tokens = self._tokens(prompt, temperature, max_tokens)
+        await asyncio.sleep(self.sample_latency())
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        
+        for i, token in enumerate(tokens):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield {"type": "delta", "text": token}
+        
+        yield {"type": "usage", **self._usage(self.build_messages(prompt, history, system), len(tokens))}
+    
+    def get_provider_name(self) -> str:
+        """Return provider name"""
+        return "mock"
+    
+    def calculate_cost(
+        self,
+        tokens_used: int,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """Calculate cost from the input/output split, or estimate it"""
+        if input_tokens is None or output_tokens is None:
+            # Rough estimate: 75% input, 25% output
+            input_tokens = int(tokens_used * 0.75)
+            output_tokens = tokens_used - input_tokens
+        
+        cost = (input_tokens / 1000 * self.PRICING["input"]) + \
+               (output_tokens / 1000 * self.PRICING["output"])
+        return round(cost, 6)
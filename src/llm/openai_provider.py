@@ -1,14 +1,29 @@
 """
 OpenAI LLM Provider implementation
 """
-from typing import Dict, Any
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Any, AsyncIterator, List, Optional
+import aiohttp
 import openai
 from .base import BaseLLMProvider
+from .errors import (
+    ProviderError,
+    ProviderConnectionError,
+    ProviderTimeoutError,
+    ProviderUnavailableError,
+    error_for_status,
+    parse_retry_after
+)
+from .token_counter import token_counter
 
 
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI GPT provider implementation"""
     
+    # Cached prompt tokens are billed at half the input price
+    CACHE_READ_DISCOUNT = 0.5
+    
     # Pricing per 1K tokens (approximate)
     PRICING = {
         "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
@@ -16,51 +31,185 @@ class OpenAIProvider(BaseLLMProvider):
         "gpt-4-turbo": {"input": 0.01, "output": 0.03}
     }
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-3.5-turbo",
+        session: Optional[aiohttp.ClientSession] = None
+    ):
         super().__init__(api_key, model)
-        openai.api_key = api_key
+        # The key is passed on every call rather than set on the openai
+        # module, which would be shared across threads and requests
+        self.session = session
+    
+    @contextmanager
+    def _use_session(self):
+        """Route async calls through the pooled aiohttp session, if any"""
+        if self.session is None:
+            yield
+            return
+        token = openai.aiosession.set(self.session)
+        try:
+            yield
+        finally:
+            openai.aiosession.reset(token)
     
     def generate_response(
         self,
         prompt: str,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """Generate response using OpenAI API"""
         try:
             response = openai.ChatCompletion.create(
+                api_key=self.api_key,
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=self.build_messages(prompt, history, system),
                 temperature=temperature,
                 max_tokens=max_tokens,
                 **kwargs
             )
+            return self._parse_response(response)
+        
+        except Exception as e:
+            raise self._error(e) from e
+    
+    async def agenerate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Generate response using the non-blocking OpenAI API"""
+        try:
+            with self._use_session():
+                response = await openai.ChatCompletion.acreate(
+                    api_key=self.api_key,
+                    model=self.model,
+                    messages=self.build_messages(prompt, history, system),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+            return self._parse_response(response)
+        
+        except Exception as e:
+            raise self._error(e) from e
+    
+    async def astream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        history: Optional[List[Dict[str, str]]] = None,
+        system: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream response deltas using the OpenAI API"""
+        try:
+            with self._use_session():
+                stream = await openai.ChatCompletion.acreate(
+                    api_key=self.api_key,
+                    model=self.model,
+                    messages=self.build_messages(prompt, history, system),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **kwargs
+                )
             
-            content = response.choices[0].message.content
-            tokens_used = response.usage.total_tokens
-            cost = self.calculate_cost(tokens_used)
-            
-            return {
-                "response": content,
-                "tokens_used": tokens_used,
-                "cost": cost
-            }
+            # Streamed completions carry no usage block; completion tokens
+            # are counted on the full text once it has arrived
+            texts = []
+            async for chunk in stream:
+                text = chunk.choices[0].delta.get("content")
+                if text:
+                    texts.append(text)
+                    yield {"type": "delta", "text": text}
         
         except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            raise self._error(e) from e
+        
+        input_tokens = token_counter.count_messages(self.build_messages(prompt, history, system), self.model)
+        output_tokens = token_counter.count("".join(texts), self.model)
+        yield {
+            "type": "usage",
+            "tokens_used": input_tokens + output_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": self.calculate_cost(input_tokens + output_tokens, input_tokens, output_tokens),
+            # Streamed completions do not report prefix cache hits
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0
+        }
+    
+    @staticmethod
+    def _error(e: Exception) -> ProviderError:
+        """Translate an OpenAI client error into the provider error taxonomy"""
+        message = f"OpenAI API error: {str(e)}"
+        if isinstance(e, (openai.error.Timeout, asyncio.TimeoutError)):
+            return ProviderTimeoutError(message)
+        if isinstance(e, (openai.error.APIConnectionError, aiohttp.ClientError)):
+            return ProviderConnectionError(message)
+        if isinstance(e, openai.error.OpenAIError) and e.http_status is not None:
+            return error_for_status(e.http_status, message, parse_retry_after(e.headers))
+        if isinstance(e, (openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+            return ProviderUnavailableError(message)
+        return ProviderError(message)
+    
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """Extract content, token usage and cost from a completion"""
+        content = response.choices[0].message.content
+        usage = response.usage
+        # Prompt prefixes are cached automatically; hits are reported as part
+        # of prompt_tokens and there is no separate charge for writes
+        details = getattr(usage, "prompt_tokens_details", None)
+        cache_read_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        cost = self.calculate_cost(
+            usage.total_tokens,
+            usage.prompt_tokens,
+            usage.completion_tokens,
+            cache_read_tokens=cache_read_tokens
+        )
+        
+        return {
+            "response": content,
+            "tokens_used": usage.total_tokens,
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "cost": cost,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": 0
+        }
     
     def get_provider_name(self) -> str:
         """Return provider name"""
         return "openai"
     
-    def calculate_cost(self, tokens_used: int) -> float:
-        """Calculate approximate cost"""
+    def calculate_cost(
+        self,
+        tokens_used: int,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """Calculate cost from the input/output split, or estimate it"""
         pricing = self.PRICING.get(self.model, self.PRICING["gpt-3.5-turbo"])
-        # Rough estimate: 75% input, 25% output
-        input_tokens = int(tokens_used * 0.75)
-        output_tokens = tokens_used - input_tokens
+        if input_tokens is None or output_tokens is None:
+            # Rough estimate: 75% input, 25% output
+            input_tokens = int(tokens_used * 0.75)
+            output_tokens = tokens_used - input_tokens
         
-        cost = (input_tokens / 1000 * pricing["input"]) + \
+        uncached_tokens = input_tokens - cache_read_tokens
+        cost = (uncached_tokens / 1000 * pricing["input"]) + \
+               (cache_read_tokens / 1000 * pricing["input"] * self.CACHE_READ_DISCOUNT) + \
                (output_tokens / 1000 * pricing["output"])
         return round(cost, 6)
\ No newline at end of file
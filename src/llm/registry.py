@@ -0,0 +1,118 @@
+"""
+Lazy registry of LLM provider factories
+"""
+import importlib
+import threading
+from importlib.metadata import entry_points
+from typing import Callable, Dict, List, Optional, Union
+from .base import BaseLLMProvider
+from ..config import settings
+
+# Installed packages can add providers under this entry point group
+ENTRY_POINT_GROUP = "ai_assistant.providers"
+
+# factory(model) -> provider configured from settings; model None means its default
+ProviderFactory = Callable[[Optional[str]], BaseLLMProvider]
+
+BUILTIN_PROVIDERS = {
+    "openai": f"{__package__}.factories:create_openai",
+    "anthropic": f"{__package__}.factories:create_anthropic",
+    "mock": f"{__package__}.factories:create_mock",
+}
+
+
+class ProviderNotFoundError(Exception):
+    """Raised for a provider name that nothing registered"""
+    pass
+
+
+class ProviderNotConfiguredError(Exception):
+    """Raised when a registered provider lacks credentials or is disabled"""
+    pass
+
+
+class ProviderRegistry:
+    """Map provider names to factories, importing each on first use
+    
+    Factories are registered as "module:attribute" strings, so a provider's
+    SDK is imported when a request first asks for it rather than when the
+    API starts. Entry points are only scanned for names that are not
+    otherwise registered.
+    """
+    
+    def __init__(self, specs: Optional[Dict[str, str]] = None, entry_point_group: str = ENTRY_POINT_GROUP):
+        self.entry_point_group = entry_point_group
+        self._specs: Dict[str, str] = dict(specs or {})
+        self._factories: Dict[str, ProviderFactory] = {}
+        self._entry_points_loaded = False
+        self._lock = threading.RLock()
+    
+    def register(self, name: str, factory: Union[str, ProviderFactory]):
+        """Register a factory, or a "module:attribute" path to one"""
+        with self._lock:
+            self._factories.pop(name, None)
+            self._specs.pop(name, None)
+            if isinstance(factory, str):
+                self._specs[name] = factory
+            else:
+                self._factories[name] = factory
+    
+    def register_from_config(self, config: str):
+        """Register "name=module:attribute" entries separated by commas"""
+        for entry in config.split(","):
+            if not entry.strip():
+                continue
+            name, _, spec = entry.strip().partition("=")
+            if not spec:
+                raise ValueError(f"Invalid provider entry '{entry}', expected name=module:attribute")
+            self.register(name.strip(), spec.strip())
+    
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        for entry_point in entry_points(group=self.entry_point_group):
+            self._specs.setdefault(entry_point.name, entry_point.value)
+        self._entry_points_loaded = True
+    
+    def get_factory(self, name: str) -> ProviderFactory:
+        """Import and return the factory for name"""
+        with self._lock:
+            factory = self._factories.get(name)
+            if factory is not None:
+                return factory
+            
+            if name not in self._specs:
+                self._load_entry_points()
+            spec = self._specs.get(name)
+            if spec is None:
+                raise ProviderNotFoundError(f"Unsupported provider: {name}")
+            
+            module_name, _, attribute = spec.partition(":")
+            factory = getattr(importlib.import_module(module_name), attribute)
+            self._factories[name] = factory
+            return factory
+    
+    def create(self, name: str, model: Optional[str] = None) -> BaseLLMProvider:
+        """Build a provider instance
+        
+        Raises:
+            ProviderNotFoundError: no provider is registered under name
+            ProviderNotConfiguredError: the provider is missing configuration
+        """
+        return self.get_factory(name)(model)
+    
+    def names(self) -> List[str]:
+        """All registered provider names, including entry points"""
+        with self._lock:
+            self._load_entry_points()
+            return sorted(set(self._specs) | set(self._factories))
+    
+    def loaded(self) -> List[str]:
+        """Names whose factories have been imported"""
+        with self._lock:
+            return sorted(self._factories)
+
+
+# Create default registry instance
+provider_registry = ProviderRegistry(BUILTIN_PROVIDERS)
+provider_registry.register_from_config(settings.llm_providers)
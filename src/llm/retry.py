@@ -0,0 +1,171 @@
+"""
+Retries with decorrelated jitter under a shared retry budget
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from ..config import settings
+from ..utils.logger import logger
+from .errors import ProviderError
+
+
+class RetryBudget:
+    """Cap retries at a fraction of recent calls
+    
+    Every first attempt deposits ratio tokens and every retry withdraws
+    one, so retries can add at most ratio extra load on top of normal
+    traffic. A small floor of min_per_second tokens keeps low-traffic
+    processes able to retry. During an outage the balance drains and
+    failures surface immediately instead of multiplying provider load.
+    """
+    
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_balance: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.max_balance, self._balance + (now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+    
+    def record_call(self):
+        """Deposit for a first attempt"""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+    
+    def try_spend(self) -> bool:
+        """Withdraw one retry, if the budget allows it"""
+        with self._lock:
+            self._refill()
+            if self._balance < 1.0:
+                return False
+            self._balance -= 1.0
+            return True
+    
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._balance
+    
+    def reset(self):
+        """Refill the budget"""
+        with self._lock:
+            self._balance = self.max_balance
+            self._updated_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Retry retryable ProviderErrors with decorrelated jitter backoff
+    
+    Each delay is drawn uniformly from [base_delay, 3 * previous delay] and
+    capped at max_delay, which spreads out clients that failed together.
+    A provider-supplied retry-after is honoured as a minimum; if it is
+    longer than max_retry_after the error is raised instead, so callers
+    can fall back to another provider rather than wait.
+    """
+    
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        max_retry_after: float = 10.0,
+        budget: Optional[RetryBudget] = None,
+        rng: Optional[random.Random] = None
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget = budget or RetryBudget()
+        self.rng = rng or random.Random()
+    
+    def next_delay(self, previous: float) -> float:
+        """Decorrelated jitter: uniform between base_delay and 3x the previous delay"""
+        return min(self.max_delay, self.rng.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+    
+    def _should_retry(self, error: Exception, attempt: int, name: str) -> bool:
+        if not isinstance(error, ProviderError) or not error.retryable:
+            return False
+        if attempt >= self.max_attempts:
+            return False
+        if error.retry_after is not None and error.retry_after > self.max_retry_after:
+            return False
+        if not self.budget.try_spend():
+            logger.warning(f"Retry budget exhausted, not retrying {name}: {str(error)}")
+            return False
+        return True
+    
+    def _wait_time(self, error: ProviderError, delay: float) -> float:
+        return max(delay, error.retry_after or 0.0)
+    
+    async def run(self, call: Callable[[], Awaitable[Any]], name: str = "provider call") -> Any:
+        """Await call(), retrying transient failures"""
+        self.budget.record_call()
+        delay = self.base_delay
+        attempt = 1
+        
+        while True:
+            try:
+                return await call()
+            except Exception as e:
+                if not self._should_retry(e, attempt, name):
+                    raise
+                delay = self.next_delay(delay)
+                wait = self._wait_time(e, delay)
+                logger.warning(f"Retrying {name} in {wait:.2f}s (attempt {attempt + 1}): {str(e)}")
+                await asyncio.sleep(wait)
+                attempt += 1
+    
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[Any]],
+        name: str = "provider stream"
+    ) -> AsyncIterator[Any]:
+        """Iterate open_stream(), retrying transient failures that happen
+        before the first event
+        
+        Once output has been yielded a failure is raised as-is, since the
+        caller has already forwarded part of the response.
+        """
+        self.budget.record_call()
+        delay = self.base_delay
+        attempt = 1
+        
+        while True:
+            started = False
+            try:
+                async for event in open_stream():
+                    started = True
+                    yield event
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt, name):
+                    raise
+                delay = self.next_delay(delay)
+                wait = self._wait_time(e, delay)
+                logger.warning(f"Retrying {name} in {wait:.2f}s (attempt {attempt + 1}): {str(e)}")
+                await asyncio.sleep(wait)
+                attempt += 1
+
+
+# Create default retry policy instance; the budget is shared by all providers
+retry_policy = RetryPolicy(
+    max_attempts=settings.retry_max_attempts,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+    max_retry_after=settings.retry_max_retry_after,
+    budget=RetryBudget(
+        ratio=settings.retry_budget_ratio,
+        min_per_second=settings.retry_budget_min_per_second,
+        max_balance=settings.retry_budget_max_balance
+    )
+)
@@ -0,0 +1,118 @@
+"""
+Token counting with cached tiktoken encoders
+"""
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+import tiktoken
+from ..config import settings
+from ..utils.logger import logger
+
+# Context window sizes in tokens, matched by longest model-name prefix
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "claude-3": 200000,
+}
+
+# Encoding used for models tiktoken does not know (including Claude, whose
+# tokenizer is not public; cl100k_base is a close approximation)
+DEFAULT_ENCODING = "cl100k_base"
+
+# Per-message overhead of the chat completion format
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+class TokenLimitExceeded(Exception):
+    """Raised when a request cannot fit the model's context window"""
+    pass
+
+
+class TokenCounter:
+    """Count tokens locally, loading each encoder only once per process"""
+    
+    def __init__(self, max_prompt_tokens: Optional[int] = None):
+        self.max_prompt_tokens = max_prompt_tokens
+        self._encoders: Dict[str, Optional[tiktoken.Encoding]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _encoding_name(model: str) -> str:
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            return DEFAULT_ENCODING
+    
+    def get_encoder(self, model: str) -> Optional[tiktoken.Encoding]:
+        """Return the cached encoder for model, loading it on first use
+        
+        tiktoken downloads encoding files the first time they are used; if
+        that fails (e.g. no network) the failure is remembered and counts
+        fall back to a character-based estimate instead of retrying.
+        """
+        name = self._encoding_name(model)
+        if name in self._encoders:
+            return self._encoders[name]
+        
+        with self._lock:
+            if name not in self._encoders:
+                try:
+                    self._encoders[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    logger.warning(f"Could not load tiktoken encoding {name}, estimating token counts: {str(e)}")
+                    self._encoders[name] = None
+        return self._encoders[name]
+    
+    def warmup(self, models: Iterable[str]):
+        """Load the encoders for models ahead of the first request"""
+        for model in models:
+            self.get_encoder(model)
+    
+    def count(self, text: str, model: str) -> int:
+        """Count tokens in text"""
+        encoder = self.get_encoder(model)
+        if encoder is None:
+            return math.ceil(len(text) / 4)
+        return len(encoder.encode(text, disallowed_special=()))
+    
+    def count_messages(self, messages: List[Dict[str, str]], model: str) -> int:
+        """Count prompt tokens for a list of chat messages"""
+        total = TOKENS_PER_REPLY
+        for message in messages:
+            total += TOKENS_PER_MESSAGE + self.count(message["content"], model)
+        return total
+    
+    @staticmethod
+    def context_window(model: str) -> Optional[int]:
+        """Context window for model, or None if unknown"""
+        matches = [prefix for prefix in CONTEXT_WINDOWS if model.startswith(prefix)]
+        if not matches:
+            return None
+        return CONTEXT_WINDOWS[max(matches, key=len)]
+    
+    def check_tokens(self, prompt_tokens: int, model: str, max_tokens: int) -> int:
+        """Reject an already-counted prompt that cannot fit
+        
+        Returns:
+            Number of prompt tokens
+        """
+        if self.max_prompt_tokens is not None and prompt_tokens > self.max_prompt_tokens:
+            raise TokenLimitExceeded(
+                f"Prompt is {prompt_tokens} tokens, limit is {self.max_prompt_tokens}"
+            )
+        
+        window = self.context_window(model)
+        if window is not None and prompt_tokens + max_tokens > window:
+            raise TokenLimitExceeded(
+                f"Prompt ({prompt_tokens} tokens) plus max_tokens ({max_tokens}) "
+                f"exceeds the {window}-token context window of {model}"
+            )
+        
+        return prompt_tokens
+
+
+# Create default token counter instance
+token_counter = TokenCounter(max_prompt_tokens=settings.max_prompt_tokens)
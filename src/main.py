@@ -2,11 +2,11 @@
 CLI entry point for AI Assistant
 """
 import click
+import json
 import uvicorn
 import subprocess
 from .config import settings
 from src.utils.logger import logger
-from src.api.database.db import create_tables
 
 
 @click.group()
@@ -51,5 +51,104 @@ def init_db():
     logger.info("Database initialized successfully!")
 
 
+@cli.command("repair-usage")
+@click.option('--user-id', default=None, type=int, help='Only rebuild this user\'s counters')
+def repair_usage(user_id):
+    """Rebuild per-user usage counters from the conversations table"""
+    from src.api.database.db import SessionLocal, create_tables
+    from src.api.database.usage_counters import rebuild_usage_counters
+    
+    create_tables()
+    with SessionLocal() as db:
+        result = rebuild_usage_counters(db, user_id)
+    logger.info(f"Rebuilt {result['counters']} usage counters, {result['drifted']} had drifted")
+
+
+@cli.command("set-priority")
+@click.argument('username')
+@click.argument('priority', type=click.Choice(['interactive', 'batch']))
+def set_priority(username, priority):
+    """Set the scheduling class of a user's /chat/ calls"""
+    from src.api.database.db import SessionLocal, create_tables
+    from src.api.database.models import User
+    
+    create_tables()
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise click.ClickException(f"No user named {username}")
+        user.priority = None if priority == "interactive" else priority
+        db.commit()
+    logger.info(f"User {username} now runs as {priority}")
+
+
+@cli.command()
+@click.option('--users', default=10, help='Users to register and spread requests across')
+@click.option('--concurrency', default=20, help='Concurrent clients (closed loop)')
+@click.option('--rate', default=None, type=float, help='Target requests/second (open loop, overrides --concurrency)')
+@click.option('--duration', default=10.0, help='Seconds to generate load')
+@click.option('--mix', default='login=1,chat=8,history=1', help='Route weights, e.g. login=1,chat=8,history=1')
+@click.option('--latency-ms', default=300.0, help='Fake LLM mean latency in ms')
+@click.option('--latency-jitter-ms', default=100.0, help='Fake LLM latency standard deviation in ms (0 = fixed)')
+@click.option('--tokens-per-second', default=0.0, help='Fake LLM generation rate (0 = instant)')
+@click.option('--max-tokens', default=256, help='max_tokens sent with each chat request')
+@click.option('--rate-limits', is_flag=True, help='Keep per-user rate limiting enabled')
+@click.option('--seed', default=0, help='Seed for the route mix')
+@click.option('--workers', default=1, help='API worker processes (more than 1 runs uvicorn in a subprocess)')
+@click.option('--output', type=click.Path(), default=None, help='Also write the JSON report to this file')
+def bench(users, concurrency, rate, duration, mix, latency_ms, latency_jitter_ms,
+          tokens_per_second, max_tokens, rate_limits, seed, workers, output):
+    """Run an end-to-end load benchmark against the API"""
+    from src.utils.benchmark import run_benchmark
+    
+    try:
+        report = run_benchmark(
+            users=users,
+            concurrency=concurrency,
+            rate=rate,
+            duration=duration,
+            mix=mix,
+            latency_ms=latency_ms,
+            latency_jitter_ms=latency_jitter_ms,
+            tokens_per_second=tokens_per_second,
+            max_tokens=max_tokens,
+            rate_limits=rate_limits,
+            seed=seed,
+            workers=workers
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    click.echo(text)
+
+
+@cli.command("import-bench")
+@click.option('--module', default='src.api.server', help='Module to import')
+@click.option('--runs', default=5, help='Fresh interpreters to time (median is reported)')
+@click.option('--top', default=15, help='Packages and modules to list')
+@click.option('--max-ms', default=None, type=float, help='Fail if the median import takes longer')
+@click.option('--allow-eager-sdks', is_flag=True, help='Do not fail when provider SDKs load at import')
+@click.option('--output', type=click.Path(), default=None, help='Also write the JSON report to this file')
+def import_bench(module, runs, top, max_ms, allow_eager_sdks, output):
+    """Profile cold-start import time (python -X importtime)"""
+    from src.utils.import_profile import LAZY_MODULES, check_budget, profile_imports
+    
+    report = profile_imports(module=module, runs=runs, top=top)
+    
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    click.echo(text)
+    
+    problems = check_budget(report, max_ms, () if allow_eager_sdks else LAZY_MODULES)
+    if problems:
+        raise click.ClickException("; ".join(problems))
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
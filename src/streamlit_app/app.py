@@ -338,6 +338,8 @@ if 'total_cost' not in st.session_state:
     st.session_state.total_cost = 0.0
 if 'total_tokens' not in st.session_state:
     st.session_state.total_tokens = 0
+if 'thread_id' not in st.session_state:
+    st.session_state.thread_id = None
 
 
 def login(username: str, password: str) -> bool:
@@ -383,11 +385,14 @@ def send_message(message: str, provider: str, model: str, temperature: float, ma
                 "provider": provider,
                 "model": model,
                 "temperature": temperature,
-                "max_tokens": max_tokens
+                "max_tokens": max_tokens,
+                "thread_id": st.session_state.thread_id
             }
         )
         if response.status_code == 200:
-            return response.json()
+            data = response.json()
+            st.session_state.thread_id = data.get("thread_id")
+            return data
         return None
     except Exception as e:
         st.error(f"⚠️ Error: {str(e)}")
@@ -615,6 +620,7 @@ else:
             st.session_state.token = None
             st.session_state.username = None
             st.session_state.chat_history = []
+            st.session_state.thread_id = None
             st.session_state.total_cost = 0.0
             st.session_state.total_tokens = 0
             st.rerun()
@@ -716,6 +722,7 @@ else:
         with col2:
             if st.button("🗑️ Clear", use_container_width=True):
                 st.session_state.chat_history = []
+                st.session_state.thread_id = None
                 st.session_state.total_cost = 0.0
                 st.session_state.total_tokens = 0
                 st.rerun()
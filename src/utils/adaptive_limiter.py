@@ -0,0 +1,181 @@
+"""
+Adaptive concurrency limits and load shedding for outbound LLM calls
+"""
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+
+class LoadShedError(Exception):
+    """Raised when a call is rejected because its provider is saturated"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit with a bounded wait queue
+    
+    The limit grows by roughly one slot per limit's worth of fast, successful
+    calls and is cut multiplicatively when a call fails or its latency rises
+    well above the best latency seen recently (the provider is queueing).
+    Calls over the limit wait in a FIFO queue; when the queue is full, or a
+    call has waited queue_timeout seconds, it is shed with LoadShedError.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 20,
+        min_limit: int = 2,
+        max_limit: int = 200,
+        max_queue: int = 100,
+        queue_timeout: float = 30.0,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.9
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.min_latency = None
+        self.avg_latency = None
+        self._waiters: Deque[asyncio.Future] = deque()
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+    
+    def retry_after(self) -> float:
+        """Rough time until queued work drains"""
+        return max(1.0, self.avg_latency or 1.0)
+    
+    async def acquire(self):
+        """Wait for a slot, or raise LoadShedError"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        
+        if len(self._waiters) >= self.max_queue:
+            raise LoadShedError(f"{self.name} is overloaded, request shed", self.retry_after())
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            raise LoadShedError(f"{self.name} queue wait timed out, request shed", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled; hand it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._discard(waiter)
+            raise
+    
+    def release(self, latency: Optional[float], success: bool = True):
+        """Return a slot and adapt the limit from the call's outcome
+        
+        A latency of None (the call was abandoned) leaves the limit unchanged.
+        """
+        self.in_flight -= 1
+        if latency is None:
+            self._wake()
+            return
+        
+        if success:
+            self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+            self.avg_latency = latency if self.avg_latency is None else 0.9 * self.avg_latency + 0.1 * latency
+        
+        if not success or (self.min_latency and latency > self.min_latency * self.latency_tolerance):
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            # Let the baseline drift up so one lucky fast call does not pin it
+            if self.min_latency:
+                self.min_latency *= 1.05
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        
+        self._wake()
+    
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+    
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of a call"""
+        await self.acquire()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.release(None)
+            raise
+        except Exception:
+            self.release(loop.time() - started, success=False)
+            raise
+        self.release(loop.time() - started)
+
+
+class ConcurrencyLimiterRegistry:
+    """One adaptive limiter per provider"""
+    
+    def __init__(self, **limiter_options):
+        self.limiter_options = limiter_options
+        self._limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> AdaptiveConcurrencyLimiter:
+        """Get or create the limiter for key"""
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = AdaptiveConcurrencyLimiter(key, **self.limiter_options)
+            return self._limiters[key]
+    
+    def total_limit(self) -> int:
+        """Sum of the current limits, or the initial limit before any
+        provider has been called"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        if not limiters:
+            return int(self.limiter_options.get("initial_limit", 1))
+        return sum(int(limiter.limit) for limiter in limiters)
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Current limit, in-flight count and queue depth per provider"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {
+            limiter.name: {
+                "limit": round(limiter.limit, 2),
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queue_depth
+            }
+            for limiter in limiters
+        }
+    
+    def reset(self):
+        """Forget all limiters"""
+        with self._lock:
+            self._limiters.clear()
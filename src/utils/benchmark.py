@@ -0,0 +1,320 @@
+"""
+End-to-end load benchmark for the API
+"""
+import asyncio
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+import uvicorn
+from ..config import settings
+from .logger import logger
+
+ROUTES = {
+    "login": "/auth/login",
+    "chat": "/chat/",
+    "history": "/chat/history",
+}
+
+BENCH_PASSWORD = "bench-password"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse 'login=1,chat=8,history=1' into route weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route in mix: {name} (expected one of {', '.join(ROUTES)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def configure_for_benchmark(
+    tmp_dir: str,
+    latency_ms: float,
+    latency_jitter_ms: float,
+    tokens_per_second: float,
+    rate_limits: bool
+):
+    """Point settings at a throwaway database and the mock provider
+    
+    Must run before any src.api module is imported, since the database
+    engine is created at import time.
+    """
+    if "src.api.database.db" in sys.modules:
+        raise RuntimeError("Benchmark must be configured before the API is imported")
+    
+    settings.database_url = f"sqlite:///{tmp_dir}/bench.db"
+    settings.rate_limit_db_path = f"{tmp_dir}/rate_limits.db"
+    settings.rate_limit_enabled = rate_limits
+    settings.enable_mock_provider = True
+    settings.mock_latency_distribution = "lognormal" if latency_jitter_ms else "fixed"
+    settings.mock_latency_ms = latency_ms
+    settings.mock_latency_jitter_ms = latency_jitter_ms
+    settings.mock_tokens_per_second = tokens_per_second
+
+
+def _server_env() -> Dict[str, str]:
+    """Environment that gives a worker process the benchmark settings"""
+    return {
+        **os.environ,
+        "DATABASE_URL": settings.database_url,
+        "RATE_LIMIT_DB_PATH": settings.rate_limit_db_path,
+        "RATE_LIMIT_ENABLED": str(settings.rate_limit_enabled),
+        "ENABLE_MOCK_PROVIDER": str(settings.enable_mock_provider),
+        "MOCK_LATENCY_DISTRIBUTION": settings.mock_latency_distribution,
+        "MOCK_LATENCY_MS": str(settings.mock_latency_ms),
+        "MOCK_LATENCY_JITTER_MS": str(settings.mock_latency_jitter_ms),
+        "MOCK_TOKENS_PER_SECOND": str(settings.mock_tokens_per_second),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _ServerThread:
+    """Run the API with uvicorn on a background thread"""
+    
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+    
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Benchmark server failed to start")
+            time.sleep(0.05)
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class _ServerProcess:
+    """Run the API with uvicorn in a subprocess with several workers
+    
+    Workers share the benchmark database and rate-limit store, as they
+    would in a multi-worker deployment.
+    """
+    
+    def __init__(self, port: int, workers: int):
+        self.port = port
+        self.command = [
+            sys.executable, "-m", "uvicorn", "src.api.server:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning"
+        ]
+        self.process: Optional[subprocess.Popen] = None
+    
+    def __enter__(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.process = subprocess.Popen(self.command, cwd=root, env=_server_env(), stdout=sys.stderr)
+        deadline = time.monotonic() + 60
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("Benchmark server failed to start")
+            try:
+                if httpx.get(f"http://127.0.0.1:{self.port}/health", timeout=1.0).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                self.__exit__()
+                raise RuntimeError("Benchmark server did not become ready")
+            time.sleep(0.1)
+    
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+async def _drive(
+    base_url: str,
+    users: int,
+    concurrency: int,
+    rate: Optional[float],
+    duration: float,
+    weights: Dict[str, float],
+    max_tokens: int,
+    seed: int
+) -> Dict:
+    rng = random.Random(seed)
+    names = list(weights)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    sequence = itertools.count()
+    
+    limits = httpx.Limits(max_connections=max(concurrency, 100))
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        usernames = [f"bench_{seed}_{i}" for i in range(users)]
+        
+        async def register_and_login(username: str) -> Dict[str, str]:
+            response = await client.post("/auth/register", json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": BENCH_PASSWORD
+            })
+            response.raise_for_status()
+            response = await client.post("/auth/login", json={"username": username, "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+        
+        headers = await asyncio.gather(*(register_and_login(u) for u in usernames))
+        
+        async def one_request():
+            seq = next(sequence)
+            route = rng.choices(names, [weights[n] for n in names])[0]
+            user = seq % users
+            started = time.perf_counter()
+            try:
+                if route == "login":
+                    response = await client.post(ROUTES[route], json={
+                        "username": usernames[user], "password": BENCH_PASSWORD
+                    })
+                elif route == "chat":
+                    response = await client.post(ROUTES[route], headers=headers[user], json={
+                        "message": f"Benchmark prompt {seq}",
+                        "provider": "mock",
+                        "max_tokens": max_tokens
+                    })
+                else:
+                    response = await client.get(ROUTES[route], headers=headers[user], params={"limit": 10})
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            
+            latencies[route].append(time.perf_counter() - started)
+            if failed:
+                errors[route] += 1
+        
+        started = time.perf_counter()
+        deadline = started + duration
+        
+        if rate:
+            # Open loop: issue requests on schedule regardless of completions
+            tasks = []
+            interval = 1.0 / rate
+            next_at = started
+            while next_at < deadline:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                tasks.append(asyncio.ensure_future(one_request()))
+                next_at += interval
+            await asyncio.gather(*tasks)
+        else:
+            # Closed loop: each client sends its next request when the last one returns
+            async def client_loop():
+                while time.perf_counter() < deadline:
+                    await one_request()
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        
+        elapsed = time.perf_counter() - started
+    
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "routes": {
+            ROUTES[name]: _summarize(latencies[name], errors[name], elapsed)
+            for name in names if latencies[name]
+        },
+        "total": _summarize(all_latencies, sum(errors.values()), elapsed),
+    }
+
+
+def run_benchmark(
+    users: int = 10,
+    concurrency: int = 20,
+    rate: Optional[float] = None,
+    duration: float = 10.0,
+    mix: str = "login=1,chat=8,history=1",
+    latency_ms: float = 300.0,
+    latency_jitter_ms: float = 100.0,
+    tokens_per_second: float = 0.0,
+    max_tokens: int = 256,
+    rate_limits: bool = False,
+    seed: int = 0,
+    workers: int = 1
+) -> Dict:
+    """Start the API with a fake LLM and a temp database, drive load against
+    it and return per-route throughput and latency percentiles
+    
+    With one worker the API runs in-process; with more, uvicorn runs them
+    in a subprocess.
+    """
+    weights = parse_mix(mix)
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_for_benchmark(tmp_dir, latency_ms, latency_jitter_ms, tokens_per_second, rate_limits)
+        from ..api.database.db import create_tables
+        from ..api.server import app
+        
+        # Create the schema once up front rather than racing every worker's startup
+        create_tables()
+        
+        # Keep stdout for the report and per-request logging out of the hot path
+        log_level = logger.level
+        logger.setLevel("WARNING")
+        streams = [handler.stream for handler in logger.handlers]
+        for handler in logger.handlers:
+            handler.setStream(sys.stderr)
+        try:
+            port = _free_port()
+            server = _ServerThread(app, port) if workers == 1 else _ServerProcess(port, workers)
+            with server:
+                report = asyncio.run(_drive(
+                    f"http://127.0.0.1:{port}", users, concurrency, rate, duration, weights, max_tokens, seed
+                ))
+        finally:
+            logger.setLevel(log_level)
+            for handler, stream in zip(logger.handlers, streams):
+                handler.setStream(stream)
+    
+    report["config"] = {
+        "users": users,
+        "workers": workers,
+        "concurrency": None if rate else concurrency,
+        "rate_rps": rate,
+        "duration_s": duration,
+        "mix": weights,
+        "llm_latency_ms": latency_ms,
+        "llm_latency_jitter_ms": latency_jitter_ms,
+        "llm_tokens_per_second": tokens_per_second,
+        "max_tokens": max_tokens,
+        "rate_limits": rate_limits,
+        "seed": seed,
+    }
+    return report
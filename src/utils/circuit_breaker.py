@@ -0,0 +1,154 @@
+"""
+Circuit breakers for outbound LLM provider calls
+"""
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, Optional
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when no provider with a closed circuit is available"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by error rate and latency
+    
+    The last window_size calls are tracked; a call counts as bad if it
+    failed or took longer than slow_call_threshold seconds. Once at least
+    min_calls are recorded and the bad-call rate reaches
+    failure_rate_threshold, the circuit opens for open_seconds. After that
+    a limited number of probe calls are let through (half-open): a good
+    probe closes the circuit, a bad one opens it again.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: float = 20.0,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+    
+    def retry_after(self) -> float:
+        """Seconds until an open circuit will admit a probe"""
+        with self._lock:
+            if self._current_state() != CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+    
+    def allow_request(self) -> bool:
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return True
+            if state == CircuitState.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+    
+    def release(self):
+        """Give back a probe slot for a call that was abandoned before completing"""
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+    
+    def record_success(self, latency: float):
+        """Record a completed call"""
+        self._record(bad=latency >= self.slow_call_threshold)
+    
+    def record_failure(self):
+        """Record a failed call"""
+        self._record(bad=True)
+    
+    def _record(self, bad: bool):
+        with self._lock:
+            state = self._current_state()
+            
+            if state == CircuitState.HALF_OPEN:
+                if bad:
+                    self._open()
+                else:
+                    self._state = CircuitState.CLOSED
+                    self._outcomes.clear()
+                return
+            
+            self._outcomes.append(bad)
+            if state == CircuitState.CLOSED and len(self._outcomes) >= self.min_calls:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+    
+    def _open(self):
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self._outcomes.clear()
+
+
+class CircuitBreakerRegistry:
+    """One circuit breaker per provider/model key"""
+    
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> CircuitBreaker:
+        """Get or create the breaker for key"""
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(key, **self.breaker_options)
+            return self._breakers[key]
+    
+    def snapshot(self) -> Dict[str, str]:
+        """Current state of every known circuit"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state.value for breaker in breakers}
+    
+    def reset(self, key: Optional[str] = None):
+        """Forget one breaker, or all of them"""
+        with self._lock:
+            if key is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(key, None)
@@ -1,9 +1,73 @@
+"""
+Multi-turn conversation history with per-message token counts
+"""
+from typing import Dict, List, Optional
+
+
 class ConversationManager:
-    def __init__(self):
+    """Ordered chat messages, each carrying its token count
+    
+    Counts are computed once when a message is stored and reused on every
+    later turn, so fitting history into a budget is a sum over cached
+    counts rather than re-tokenizing the thread.
+    """
+    
+    def __init__(self, tokens_per_message: int = 0):
+        self.tokens_per_message = tokens_per_message
         self.history = []
 
-    def add(self, role, content):
-        self.history.append({"role": role, "content": content})
+    def add(self, role: str, content: str, tokens: int = 0, pinned: bool = False):
+        """Append a message; pinned messages (e.g. a summary of older
+        turns) lead the history and survive trimming"""
+        self.history.append({"role": role, "content": content, "tokens": tokens, "pinned": pinned})
 
     def clear(self):
         self.history = []
+    
+    def _cost(self, message: Dict) -> int:
+        return message["tokens"] + self.tokens_per_message
+    
+    @property
+    def tokens(self) -> int:
+        """Prompt tokens of all messages, including per-message overhead"""
+        return sum(self._cost(message) for message in self.history)
+    
+    @property
+    def unpinned_tokens(self) -> int:
+        """Prompt tokens of the turns not yet folded into a pinned summary"""
+        return sum(self._cost(message) for message in self.history if not message["pinned"])
+    
+    def messages(self) -> List[Dict[str, str]]:
+        """Messages in the role/content form providers accept"""
+        return [{"role": m["role"], "content": m["content"]} for m in self.history]
+    
+    def trim(self, budget: Optional[int]) -> "ConversationManager":
+        """Pinned messages plus the newest messages that fit within budget
+        
+        Older messages are dropped first; pinned messages are dropped only
+        if they alone exceed the budget. The unpinned part always starts
+        with a user message so roles keep alternating.
+        """
+        pinned = [m for m in self.history if m["pinned"]]
+        used = sum(self._cost(m) for m in pinned)
+        if budget is not None and used > budget:
+            pinned, used = [], 0
+        
+        kept = []
+        for message in reversed([m for m in self.history if not m["pinned"]]):
+            cost = self._cost(message)
+            if budget is not None and used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        
+        kept.reverse()
+        while kept and kept[0]["role"] != "user":
+            kept.pop(0)
+        
+        trimmed = ConversationManager(self.tokens_per_message)
+        trimmed.history = pinned + kept
+        return trimmed
+    
+    def __len__(self) -> int:
+        return len(self.history)
@@ -5,18 +5,22 @@ from typing import Dict, List
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from api.database.models import Conversation
+from ..api.database.models import Conversation, UsageCounter
 
 
 class CostTracker:
-    """Track and analyze LLM usage costs"""
+    """Track and analyze LLM usage costs
+    
+    Totals are read from the per-user usage counters, which hold one row
+    per provider/model, instead of scanning conversations.
+    """
     
     @staticmethod
     def get_total_cost(db: Session, user_id: int = None) -> float:
         """Get total cost for user or all users"""
-        query = db.query(func.sum(Conversation.cost))
+        query = db.query(func.sum(UsageCounter.cost))
         if user_id:
-            query = query.filter(Conversation.user_id == user_id)
+            query = query.filter(UsageCounter.user_id == user_id)
         
         result = query.scalar()
         return round(result or 0.0, 6)
@@ -25,14 +29,14 @@ class CostTracker:
     def get_cost_by_provider(db: Session, user_id: int = None) -> Dict[str, float]:
         """Get costs grouped by provider"""
         query = db.query(
-            Conversation.provider,
-            func.sum(Conversation.cost).label('total_cost')
+            UsageCounter.provider,
+            func.sum(UsageCounter.cost).label('total_cost')
         )
         
         if user_id:
-            query = query.filter(Conversation.user_id == user_id)
+            query = query.filter(UsageCounter.user_id == user_id)
         
-        query = query.group_by(Conversation.provider)
+        query = query.group_by(UsageCounter.provider)
         
         results = query.all()
         return {row.provider: round(row.total_cost, 6) for row in results}
@@ -44,7 +48,11 @@ class CostTracker:
         end_date: datetime,
         user_id: int = None
     ) -> List[Dict]:
-        """Get costs within date range"""
+        """Get costs within date range
+        
+        A hedged request's losing call is listed separately under its own
+        provider.
+        """
         query = db.query(Conversation).filter(
             Conversation.created_at >= start_date,
             Conversation.created_at <= end_date
@@ -53,28 +61,34 @@ class CostTracker:
         if user_id:
             query = query.filter(Conversation.user_id == user_id)
         
-        conversations = query.all()
-        
-        return [
-            {
+        costs = []
+        for conv in query.all():
+            costs.append({
                 "date": conv.created_at.date(),
                 "provider": conv.provider,
                 "cost": conv.cost,
                 "tokens": conv.tokens_used
-            }
-            for conv in conversations
-        ]
+            })
+            if conv.hedge_provider:
+                costs.append({
+                    "date": conv.created_at.date(),
+                    "provider": conv.hedge_provider,
+                    "cost": conv.hedge_cost or 0.0,
+                    "tokens": conv.hedge_tokens_used or 0
+                })
+        return costs
     
     @staticmethod
     def get_usage_stats(db: Session, user_id: int = None) -> Dict:
         """Get comprehensive usage statistics"""
-        query = db.query(Conversation)
+        query = db.query(UsageCounter)
         if user_id:
-            query = query.filter(Conversation.user_id == user_id)
+            query = query.filter(UsageCounter.user_id == user_id)
         
-        conversations = query.all()
+        counters = query.all()
+        total_conversations = sum(c.conversations for c in counters)
         
-        if not conversations:
+        if not total_conversations:
             return {
                 "total_conversations": 0,
                 "total_cost": 0.0,
@@ -83,21 +97,21 @@ class CostTracker:
                 "by_provider": {}
             }
         
-        total_cost = sum(c.cost for c in conversations)
-        total_tokens = sum(c.tokens_used for c in conversations)
+        total_cost = sum(c.cost for c in counters)
+        total_tokens = sum(c.tokens_used for c in counters)
         
         by_provider = {}
-        for conv in conversations:
-            if conv.provider not in by_provider:
-                by_provider[conv.provider] = {"count": 0, "cost": 0.0, "tokens": 0}
-            by_provider[conv.provider]["count"] += 1
-            by_provider[conv.provider]["cost"] += conv.cost
-            by_provider[conv.provider]["tokens"] += conv.tokens_used
+        for counter in counters:
+            if counter.provider not in by_provider:
+                by_provider[counter.provider] = {"count": 0, "cost": 0.0, "tokens": 0}
+            by_provider[counter.provider]["count"] += counter.conversations
+            by_provider[counter.provider]["cost"] += counter.cost
+            by_provider[counter.provider]["tokens"] += counter.tokens_used
         
         return {
-            "total_conversations": len(conversations),
+            "total_conversations": total_conversations,
             "total_cost": round(total_cost, 6),
             "total_tokens": total_tokens,
-            "avg_cost_per_conversation": round(total_cost / len(conversations), 6),
+            "avg_cost_per_conversation": round(total_cost / total_conversations, 6),
             "by_provider": by_provider
         }
\ No newline at end of file
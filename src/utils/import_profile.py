@@ -0,0 +1,100 @@
+"""
+Cold-start import profiling (python -X importtime)
+"""
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Heavy SDKs that should only be imported once a provider is used
+LAZY_MODULES = ("openai", "anthropic", "aiohttp")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """Parse -X importtime lines into (module, self_us, cumulative_us)"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return rows
+
+
+def _profile_once(module: str, python: str) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    code = (
+        f"import {module}, sys; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return parse_importtime(result.stderr), loaded
+
+
+def profile_imports(
+    module: str = "src.api.server",
+    runs: int = 5,
+    top: int = 15,
+    python: Optional[str] = None
+) -> Dict:
+    """Import module in fresh interpreters and report where the time goes
+    
+    Each run starts a new process, so numbers are cold-start imports
+    (bytecode caches still apply). Times are medians across runs; self
+    time is also rolled up per top-level package.
+    """
+    python = python or sys.executable
+    totals: List[float] = []
+    self_times: Dict[str, List[int]] = defaultdict(list)
+    cumulative: Dict[str, List[int]] = defaultdict(list)
+    loaded: List[str] = []
+    
+    for _ in range(runs):
+        rows, loaded = _profile_once(module, python)
+        for name, self_us, cumulative_us in rows:
+            self_times[name].append(self_us)
+            cumulative[name].append(cumulative_us)
+        totals.append(cumulative[module][-1] if cumulative[module] else 0)
+    
+    median_self = {name: statistics.median(values) for name, values in self_times.items()}
+    packages: Dict[str, float] = defaultdict(float)
+    for name, self_us in median_self.items():
+        packages[name.split(".")[0]] += self_us
+    
+    def _ranked(values: Dict[str, float]) -> List[Dict]:
+        ranked = sorted(values.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [{"name": name, "ms": round(us / 1000, 2)} for name, us in ranked]
+    
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": round(statistics.median(totals) / 1000, 2),
+        "total_ms_min": round(min(totals) / 1000, 2),
+        "modules_imported": len(median_self),
+        "packages": _ranked(packages),
+        "modules_by_cumulative": _ranked(
+            {name: statistics.median(values) for name, values in cumulative.items() if name != module}
+        ),
+        "eager_sdks": loaded,
+    }
+
+
+def check_budget(report: Dict, max_ms: Optional[float], forbid: Sequence[str] = ()) -> List[str]:
+    """Regressions in a report: over max_ms, or SDKs that should be lazy"""
+    problems = []
+    if max_ms is not None and report["total_ms"] > max_ms:
+        problems.append(f"import of {report['module']} took {report['total_ms']} ms (budget {max_ms} ms)")
+    for name in forbid:
+        if name in report["eager_sdks"]:
+            problems.append(f"{name} is imported at startup")
+    return problems
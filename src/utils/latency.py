@@ -0,0 +1,37 @@
+"""
+Rolling latency statistics per provider/model
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+import numpy as np
+
+
+class LatencyTracker:
+    """Keep a sliding window of recent call latencies per key"""
+    
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, key: str, seconds: float):
+        """Record one observed latency"""
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.window)
+            self._samples[key].append(seconds)
+    
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """Return the q-th percentile, or None until min_samples are seen"""
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            values = np.fromiter(samples, dtype=np.float64)
+        return float(np.percentile(values, q))
+    
+    def count(self, key: str) -> int:
+        """Number of samples currently in the window"""
+        return len(self._samples.get(key, ()))
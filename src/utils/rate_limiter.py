@@ -0,0 +1,142 @@
+"""
+Token-bucket rate limiting with in-process and shared SQLite backends
+"""
+import math
+import sqlite3
+import threading
+import time
+from typing import Dict, Tuple
+
+
+def _take(
+    tokens: float,
+    updated_at: float,
+    now: float,
+    capacity: float,
+    refill_per_second: float,
+    cost: float
+) -> Tuple[bool, float, float]:
+    """Refill a bucket and try to take cost tokens from it
+    
+    Returns:
+        (allowed, remaining tokens, seconds until cost tokens are available)
+    """
+    tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    if cost > capacity:
+        return False, tokens, math.inf
+    return False, tokens, (cost - tokens) / refill_per_second
+
+
+class MemoryBucketStore:
+    """Buckets held in this process only"""
+    
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self, key: str, capacity: float, refill_per_second: float, cost: float) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, capacity, refill_per_second, cost)
+            self._buckets[key] = (tokens, now)
+        return allowed, retry_after
+    
+    def refund(self, key: str, capacity: float, cost: float):
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                tokens, updated_at = entry
+                self._buckets[key] = (min(capacity, tokens + cost), updated_at)
+
+
+class SQLiteBucketStore:
+    """Buckets stored in a SQLite file shared by every worker on the host"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def acquire(self, key: str, capacity: float, refill_per_second: float, cost: float) -> Tuple[bool, float]:
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so concurrent workers
+        # serialise their read-modify-write of the same bucket
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, capacity, refill_per_second, cost)
+            conn.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+    
+    def refund(self, key: str, capacity: float, cost: float):
+        self._connection().execute(
+            "UPDATE rate_limit_buckets SET tokens = MIN(?, tokens + ?) WHERE key = ?",
+            (capacity, cost, key)
+        )
+
+
+class RateLimiter:
+    """Per-key token buckets with a local fast path for rejected keys
+    
+    Once a key is rejected, further requests for it are rejected from
+    memory until its retry time, so a client hammering the API does not
+    also hammer the shared store.
+    """
+    
+    def __init__(self, store):
+        self.store = store
+        self._blocked_until: Dict[str, float] = {}
+    
+    def acquire(self, key: str, limit_per_minute: int, cost: float = 1) -> Tuple[bool, float]:
+        """Take cost tokens from key's bucket
+        
+        Returns:
+            (allowed, retry_after seconds)
+        """
+        now = time.time()
+        blocked_until = self._blocked_until.get(key)
+        if blocked_until is not None:
+            if blocked_until > now:
+                return False, blocked_until - now
+            del self._blocked_until[key]
+        
+        allowed, retry_after = self.store.acquire(key, limit_per_minute, limit_per_minute / 60.0, cost)
+        if not allowed and cost == 1:
+            self._blocked_until[key] = now + retry_after
+        return allowed, retry_after
+    
+    def refund(self, key: str, limit_per_minute: int, cost: float = 1):
+        """Give back cost tokens taken from key's bucket"""
+        self.store.refund(key, limit_per_minute, cost)
+    
+    def reset(self):
+        """Forget locally cached rejections"""
+        self._blocked_until.clear()
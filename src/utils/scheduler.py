@@ -0,0 +1,193 @@
+"""
+Priority-aware, per-user fair scheduling of chat generations
+"""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Union
+from .adaptive_limiter import LoadShedError
+from .latency import LatencyTracker
+
+
+class _PriorityClass:
+    """Waiters of one priority class, queued per user"""
+    
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        # Virtual finish time of the last call dispatched from this class
+        self.finish = 0.0
+        self.in_flight = 0
+        self.dispatched = 0
+        self.shed = 0
+        # Users in round-robin order, each with their own FIFO of waiters
+        self.users: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+    
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self.users.values())
+
+
+class FairScheduler:
+    """Share a fixed number of generation slots between priority classes and users
+    
+    Classes are served by weighted fair queuing: each dispatch advances a
+    class's virtual finish time by 1/weight and the backlogged class with the
+    earliest next finish goes first, so with weights 8:1 interactive calls
+    get eight slots for every batch call while both are queued, and an idle
+    class banks no credit. Within a class, users are served round-robin, so
+    a user with hundreds of queued calls waits behind their own backlog
+    instead of everyone else's. Calls over the queue bound, or that wait
+    longer than queue_timeout, are shed with LoadShedError.
+    
+    max_concurrency may be a callable, read on every dispatch, so the slot
+    count can follow limits that adapt at runtime.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: Union[int, Callable[[], int]] = 32,
+        weights: Optional[Dict[str, float]] = None,
+        max_queue: int = 200,
+        queue_timeout: float = 60.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.weights = dict(weights or {"interactive": 8.0, "batch": 1.0})
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.wait_times = LatencyTracker(window=500, min_samples=1)
+        self.reset()
+    
+    def reset(self):
+        """Forget all queued work and counters"""
+        self.in_flight = 0
+        self._vtime = 0.0
+        self._classes = {
+            name: _PriorityClass(name, weight) for name, weight in self.weights.items()
+        }
+        self.wait_times = LatencyTracker(window=self.wait_times.window, min_samples=1)
+    
+    def _class(self, priority: str) -> _PriorityClass:
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority class: {priority}")
+        return self._classes[priority]
+    
+    def capacity(self) -> int:
+        """Current number of slots"""
+        if callable(self.max_concurrency):
+            return self.max_concurrency()
+        return self.max_concurrency
+    
+    def _queued(self) -> bool:
+        return any(cls.users for cls in self._classes.values())
+    
+    def _next_finish(self, cls: _PriorityClass) -> float:
+        return max(cls.finish, self._vtime) + 1.0 / cls.weight
+    
+    def _grant(self, cls: _PriorityClass):
+        self._vtime = max(cls.finish, self._vtime)
+        cls.finish = self._vtime + 1.0 / cls.weight
+        cls.in_flight += 1
+        cls.dispatched += 1
+        self.in_flight += 1
+    
+    async def acquire(self, user: str, priority: str = "interactive"):
+        """Wait for a slot, or raise LoadShedError"""
+        cls = self._class(priority)
+        loop = asyncio.get_running_loop()
+        
+        if self.in_flight < self.capacity() and not self._queued():
+            self._grant(cls)
+            self.wait_times.record(cls.name, 0.0)
+            return
+        
+        if cls.queue_depth >= self.max_queue:
+            cls.shed += 1
+            raise LoadShedError(f"{cls.name} queue is full, request shed", self._retry_after(cls))
+        
+        waiter = loop.create_future()
+        cls.users.setdefault(user, deque()).append(waiter)
+        started = loop.time()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(cls, user, waiter)
+            cls.shed += 1
+            raise LoadShedError(f"{cls.name} queue wait timed out, request shed", self._retry_after(cls))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled; hand it on
+                self.release(priority)
+            else:
+                self._discard(cls, user, waiter)
+            raise
+        self.wait_times.record(cls.name, loop.time() - started)
+    
+    def release(self, priority: str = "interactive"):
+        """Return a slot and hand it to the next waiter"""
+        cls = self._class(priority)
+        cls.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+    
+    def _retry_after(self, cls: _PriorityClass) -> float:
+        return max(1.0, self.wait_times.percentile(cls.name, 50) or 1.0)
+    
+    def _discard(self, cls: _PriorityClass, user: str, waiter: asyncio.Future):
+        waiters = cls.users.get(user)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del cls.users[user]
+    
+    def _dispatch(self):
+        while self.in_flight < self.capacity():
+            backlogged = [cls for cls in self._classes.values() if cls.users]
+            if not backlogged:
+                return
+            cls = min(backlogged, key=self._next_finish)
+            
+            user, waiters = cls.users.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                # Back of the round-robin for this user's next call
+                cls.users[user] = waiters
+            if waiter.done():
+                continue
+            self._grant(cls)
+            waiter.set_result(None)
+    
+    @asynccontextmanager
+    async def slot(self, user: str, priority: str = "interactive"):
+        """Hold a slot for the duration of a generation"""
+        await self.acquire(user, priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Slot usage, queue depth and wait times per priority class"""
+        classes = {}
+        for cls in self._classes.values():
+            p50 = self.wait_times.percentile(cls.name, 50)
+            p95 = self.wait_times.percentile(cls.name, 95)
+            classes[cls.name] = {
+                "weight": cls.weight,
+                "in_flight": cls.in_flight,
+                "queued": cls.queue_depth,
+                "queued_users": len(cls.users),
+                "dispatched": cls.dispatched,
+                "shed": cls.shed,
+                "wait_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "wait_p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+            }
+        return {
+            "max_concurrency": self.capacity(),
+            "in_flight": self.in_flight,
+            "classes": classes
+        }
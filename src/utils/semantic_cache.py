@@ -0,0 +1,188 @@
+"""
+Semantic LLM response cache backed by a local embedding index
+"""
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class HashingEmbedder:
+    """Offline text embedder using signed feature hashing
+    
+    Character n-grams and word unigrams are hashed into a fixed number of
+    buckets, giving paraphrases with shared wording a high cosine similarity
+    without a model download or network call.
+    """
+    
+    def __init__(self, dim: int = 1024, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+    
+    def _features(self, text: str) -> List[str]:
+        text = " ".join(text.lower().split())
+        features = text.split(" ")
+        padded = f" {text} "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalized float32 vector for text"""
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode("utf-8")) for f in self._features(text)),
+            dtype=np.uint32
+        )
+        buckets = hashes % self.dim
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, buckets, signs)
+        
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Stored in place of an unset temperature or max_tokens; real values are >= 0
+_UNSET = -1
+
+
+class _Partition:
+    """Fixed-capacity vector index for a single provider/model
+    
+    Each row also records the temperature and max_tokens it was generated
+    with; rows with other parameters are masked out of a search.
+    """
+    
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.temperatures = np.full(capacity, _UNSET, dtype=np.float64)
+        self.max_tokens = np.full(capacity, _UNSET, dtype=np.int64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.values: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self.size = 0
+    
+    def search(self, query: np.ndarray, now: float, temperature: float, max_tokens: int) -> Tuple[int, float]:
+        """Return (slot, similarity) of the best live entry generated with
+        the same parameters, or (-1, 0.0)"""
+        if self.size == 0:
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ query
+        scores[
+            (self.expires_at[:self.size] <= now)
+            | (self.temperatures[:self.size] != temperature)
+            | (self.max_tokens[:self.size] != max_tokens)
+        ] = -1.0
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+    
+    def insert(
+        self,
+        vector: np.ndarray,
+        value: Dict[str, Any],
+        now: float,
+        ttl: float,
+        temperature: float,
+        max_tokens: int
+    ):
+        """Store an entry, replacing the least recently used one when full"""
+        if self.size < len(self.values):
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+        
+        self.vectors[slot] = vector
+        self.temperatures[slot] = temperature
+        self.max_tokens[slot] = max_tokens
+        self.values[slot] = value
+        self.last_used[slot] = now
+        self.expires_at[slot] = now + ttl
+
+
+def _params(temperature: Optional[float], max_tokens: Optional[int]) -> Tuple[float, int]:
+    return (
+        _UNSET if temperature is None else temperature,
+        _UNSET if max_tokens is None else max_tokens
+    )
+
+
+class SemanticCache:
+    """Nearest-neighbour response cache partitioned per provider/model
+    
+    Prompts only match within the same temperature and max_tokens, so a
+    short answer is never served to a request that asked for a long one.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries_per_model: int = 512,
+        ttl_seconds: float = 3600.0,
+        embedder: Optional[HashingEmbedder] = None
+    ):
+        self.threshold = threshold
+        self.max_entries_per_model = max_entries_per_model
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder or HashingEmbedder()
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _partition(self, provider: str, model: str) -> _Partition:
+        key = (provider, model)
+        if key not in self._partitions:
+            self._partitions[key] = _Partition(self.max_entries_per_model, self.embedder.dim)
+        return self._partitions[key]
+    
+    def get(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached value for the most similar prompt above threshold"""
+        query = self.embedder.embed(prompt)
+        now = time.monotonic()
+        
+        with self._lock:
+            # Lookups never allocate; a partition is created by the first set
+            partition = self._partitions.get((provider, model))
+            if partition is None:
+                self.misses += 1
+                return None
+            slot, similarity = partition.search(query, now, *_params(temperature, max_tokens))
+            if slot < 0 or similarity < self.threshold:
+                self.misses += 1
+                return None
+            
+            partition.last_used[slot] = now
+            self.hits += 1
+            return {**partition.values[slot], "similarity": round(similarity, 4)}
+    
+    def set(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        value: Dict[str, Any],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ):
+        """Index a prompt and its response"""
+        vector = self.embedder.embed(prompt)
+        with self._lock:
+            self._partition(provider, model).insert(
+                vector, value, time.monotonic(), self.ttl_seconds, *_params(temperature, max_tokens)
+            )
+    
+    def clear(self):
+        """Remove all partitions"""
+        with self._lock:
+            self._partitions.clear()
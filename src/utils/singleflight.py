@@ -0,0 +1,40 @@
+"""
+Single-flight coalescing of identical concurrent async calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome
+    
+    The call runs in its own task, so a waiter that is cancelled (for example
+    because its client disconnected) does not cancel the work for the others.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await fn() or join an identical call already in flight
+        
+        Returns:
+            (result, shared) where shared is True for callers that joined an
+            existing call instead of starting it
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        
+        result = await asyncio.shield(task)
+        return result, shared
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+    
+    def __len__(self) -> int:
+        return len(self._calls)
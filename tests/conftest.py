@@ -0,0 +1,106 @@
+"""
+Shared test fixtures
+"""
+import os
+import tempfile
+import uuid
+
+# Point the app at throwaway databases before any src module reads settings
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+os.environ["RATE_LIMIT_DB_PATH"] = f"{_tmp_dir}/rate_limits.db"
+
+import pytest
+from fastapi.testclient import TestClient
+from src.llm.base import BaseLLMProvider
+
+
+class FakeProvider(BaseLLMProvider):
+    """In-memory provider returning a fixed reply"""
+    
+    def __init__(self, api_key: str = "fake-key", model: str = "fake-model", reply: str = "Hello there!"):
+        super().__init__(api_key, model)
+        self.reply = reply
+        self.calls = 0
+        self.last_history = None
+    
+    def generate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        self.calls += 1
+        if "history" in kwargs:
+            # Summarization calls send no history; keep the last chat turn's
+            self.last_history = kwargs["history"]
+        return {
+            "response": self.reply,
+            "tokens_used": 10,
+            "input_tokens": 6,
+            "output_tokens": 4,
+            "cost": self.calculate_cost(10)
+        }
+    
+    async def agenerate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        return self.generate_response(prompt, temperature, max_tokens, **kwargs)
+    
+    async def astream_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        self.calls += 1
+        for word in self.reply.split(" "):
+            yield {"type": "delta", "text": word + " "}
+        yield {
+            "type": "usage",
+            "tokens_used": 10,
+            "input_tokens": 6,
+            "output_tokens": 4,
+            "cost": self.calculate_cost(10)
+        }
+    
+    def get_provider_name(self) -> str:
+        return "fake"
+    
+    def calculate_cost(self, tokens_used, input_tokens=None, output_tokens=None) -> float:
+        return round(tokens_used * 0.0001, 6)
+
+
+@pytest.fixture
+def client():
+    """Test client with startup/shutdown events"""
+    from src.api.server import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register a fresh user and return bearer auth headers"""
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "secret123"
+    })
+    response = client.post("/auth/login", json={"username": username, "password": "secret123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(autouse=True)
+def reset_chat_state():
+    """Start every test with empty caches, closed circuits and a full retry budget"""
+    from src.api.services.chat_services import (
+        response_cache, semantic_cache, circuit_breakers, concurrency_limiters, chat_scheduler
+    )
+    from src.llm.retry import retry_policy
+    response_cache.clear()
+    semantic_cache.clear()
+    circuit_breakers.reset()
+    concurrency_limiters.reset()
+    chat_scheduler.reset()
+    retry_policy.budget.reset()
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """Route chat requests to a FakeProvider"""
+    provider = FakeProvider()
+    monkeypatch.setattr(
+        "src.api.routes.chat.get_llm_provider",
+        lambda name, model=None: provider
+    )
+    return provider
@@ -0,0 +1,55 @@
+"""
+Tests for the load and import-time benchmark commands
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from src.utils.benchmark import parse_mix
+from src.utils.import_profile import check_budget, parse_importtime, profile_imports
+
+
+def test_parse_mix():
+    assert parse_mix("login=1,chat=8,history=1") == {"login": 1.0, "chat": 8.0, "history": 1.0}
+    assert parse_mix("chat") == {"chat": 1.0}
+    
+    with pytest.raises(ValueError):
+        parse_mix("chat=1,stream=2")
+
+
+def test_bench_command_reports_per_route_percentiles():
+    # Run in a subprocess: the benchmark must configure settings before the API is imported
+    result = subprocess.run(
+        [sys.executable, "-m", "src.main", "bench", "--users", "2", "--concurrency", "4",
+         "--duration", "0.5", "--latency-ms", "5", "--latency-jitter-ms", "0"],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    
+    report = json.loads(result.stdout)
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == 0
+    assert "/chat/" in report["routes"]
+    for stats in report["routes"].values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_parse_importtime():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      2000 |       5000 | src.api.server\n"
+    )
+    assert parse_importtime(output) == [("_io", 120, 120), ("src.api.server", 2000, 5000)]
+
+
+def test_api_import_leaves_provider_sdks_lazy():
+    report = profile_imports("src.api.server", runs=1, top=5)
+    
+    assert report["total_ms"] > 0
+    assert report["eager_sdks"] == []
+    assert check_budget(report, max_ms=report["total_ms"] / 2) != []
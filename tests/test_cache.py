@@ -0,0 +1,88 @@
+"""
+Tests for response caches
+"""
+from src.utils.response_cache import ResponseCache
+
+
+def test_make_key_normalizes_whitespace():
+    """Test prompts differing only in whitespace share a key"""
+    a = ResponseCache.make_key("openai", "gpt-4", "What is  FastAPI?\n", 0.0, 100)
+    b = ResponseCache.make_key("openai", "gpt-4", " What is FastAPI?", 0.0, 100)
+    c = ResponseCache.make_key("openai", "gpt-4", "What is FastAPI?", 0.0, 200)
+    
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction():
+    """Test least recently used entries are evicted first"""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", {"response": "A"})
+    cache.set("b", {"response": "B"})
+    cache.get("a")
+    cache.set("c", {"response": "C"})
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == {"response": "A"}
+    assert len(cache) == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    """Test entries expire after their TTL"""
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.response_cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=10)
+    cache.set("a", {"response": "A"})
+    
+    now[0] += 9
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+
+
+def test_semantic_cache_matches_paraphrase():
+    """Test near-duplicate prompts hit while unrelated ones miss"""
+    from src.utils.semantic_cache import SemanticCache
+    
+    cache = SemanticCache(threshold=0.8)
+    cache.set("openai", "gpt-4", "How do I reset my password?", {"response": "Use the reset link."})
+    
+    hit = cache.get("openai", "gpt-4", "how do I reset my password")
+    assert hit is not None
+    assert hit["response"] == "Use the reset link."
+    
+    assert cache.get("openai", "gpt-4", "What is the capital of France?") is None
+    assert cache.get("anthropic", "claude-3-haiku", "How do I reset my password?") is None
+
+
+def test_semantic_cache_partitions_by_generation_params():
+    """Test a paraphrase only hits an entry cached with the same temperature and max_tokens"""
+    from src.utils.semantic_cache import SemanticCache
+    
+    cache = SemanticCache(threshold=0.8)
+    for max_tokens in range(1, 50):
+        assert cache.get("openai", "gpt-4", "how do I reset my password", 0.0, max_tokens) is None
+    # Misses do not allocate partitions
+    assert len(cache._partitions) == 0
+    
+    cache.set("openai", "gpt-4", "How do I reset my password?", {"response": "Use"}, 0.0, 5)
+    cache.set("openai", "gpt-4", "How do I reset my password?", {"response": "Use the link"}, 0.0, 4000)
+    
+    assert cache.get("openai", "gpt-4", "how do I reset my password", 0.0, 4000)["response"] == "Use the link"
+    assert cache.get("openai", "gpt-4", "how do I reset my password", 0.5, 5) is None
+    assert cache.get("openai", "gpt-4", "how do I reset my password", 0.0, 5)["response"] == "Use"
+    assert len(cache._partitions) == 1
+
+
+def test_semantic_cache_lru_eviction():
+    """Test the least recently used entry is replaced when a partition is full"""
+    from src.utils.semantic_cache import SemanticCache
+    
+    cache = SemanticCache(threshold=0.99, max_entries_per_model=2)
+    cache.set("openai", "gpt-4", "first question about apples", {"response": "1"})
+    cache.set("openai", "gpt-4", "second question about rockets", {"response": "2"})
+    cache.get("openai", "gpt-4", "first question about apples")
+    cache.set("openai", "gpt-4", "third question about oceans", {"response": "3"})
+    
+    assert cache.get("openai", "gpt-4", "second question about rockets") is None
+    assert cache.get("openai", "gpt-4", "first question about apples")["response"] == "1"
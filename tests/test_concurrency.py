@@ -0,0 +1,376 @@
+"""
+Tests for request coalescing and concurrency controls
+"""
+import asyncio
+import pytest
+from src.utils.singleflight import SingleFlight
+from src.api.schemas.chat_schemas import ChatRequest
+from src.api.services.chat_services import ChatService
+from tests.conftest import FakeProvider
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_one_call():
+    """Test concurrent callers with the same key share a single call"""
+    flight = SingleFlight()
+    calls = 0
+    
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "done"
+    
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+    
+    assert calls == 1
+    assert [r for r, _ in results] == ["done"] * 5
+    assert [shared for _, shared in results].count(False) == 1
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_singleflight_propagates_errors():
+    """Test every waiter sees the failure of the shared call"""
+    flight = SingleFlight()
+    
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+    
+    results = await asyncio.gather(
+        flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+    )
+    
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_singleflight_survives_cancelled_waiter():
+    """Test cancelling the first caller does not cancel the shared call"""
+    flight = SingleFlight()
+    
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+    
+    first = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    
+    assert (await second) == ("done", True)
+
+
+@pytest.mark.asyncio
+async def test_chat_service_coalesces_identical_requests():
+    """Test identical concurrent chats hit the provider once and are billed once"""
+    class SlowProvider(FakeProvider):
+        async def agenerate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+            await asyncio.sleep(0.01)
+            return self.generate_response(prompt, temperature, max_tokens)
+    
+    provider = SlowProvider()
+    request = ChatRequest(message="coalesce me", temperature=0.7)
+    
+    results = await asyncio.gather(*(ChatService.generate_response(provider, request) for _ in range(3)))
+    
+    assert provider.calls == 1
+    assert sorted(r["cost"] for r in results) == [0.0, 0.0, provider.calculate_cost(10)]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_cost_survives_cancelled_starter():
+    """Test a joiner is billed when the request that started the call is cancelled"""
+    class SlowProvider(FakeProvider):
+        async def agenerate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+            await asyncio.sleep(0.01)
+            return self.generate_response(prompt, temperature, max_tokens)
+    
+    provider = SlowProvider()
+    request = ChatRequest(message="starter goes away", temperature=0.7)
+    
+    starter = asyncio.ensure_future(ChatService.generate_response(provider, request))
+    await asyncio.sleep(0)
+    joiners = [asyncio.ensure_future(ChatService.generate_response(provider, request)) for _ in range(2)]
+    await asyncio.sleep(0)
+    starter.cancel()
+    
+    results = await asyncio.gather(*joiners)
+    
+    assert provider.calls == 1
+    assert sorted(r["cost"] for r in results) == [0.0, provider.calculate_cost(10)]
+
+
+class DelayedProvider(FakeProvider):
+    """FakeProvider that answers after a fixed delay"""
+    
+    def __init__(self, model: str, delay: float):
+        super().__init__(model=model, reply=f"from {model}")
+        self.delay = delay
+        self.cancelled = False
+    
+    async def agenerate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.generate_response(prompt, temperature, max_tokens)
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_uses_faster_backup(monkeypatch):
+    """Test a slow primary is raced by the backup and cancelled when it loses,
+    and still billed for its prompt under its own model"""
+    from src.llm.token_counter import token_counter
+    
+    monkeypatch.setattr("src.config.settings.hedge_default_delay", 0.01)
+    primary = DelayedProvider("slow-model", delay=1.0)
+    backup = DelayedProvider("fast-model", delay=0.01)
+    request = ChatRequest(message="hedge me", hedge=True)
+    
+    result = await ChatService.generate_response(primary, request, hedge_provider=backup)
+    await asyncio.sleep(0)
+    
+    assert result["model"] == "fast-model"
+    assert result["response"] == "from fast-model"
+    assert primary.cancelled
+    
+    prompt_tokens = token_counter.count_messages(
+        primary.build_messages(request.message, [], ChatService.system_prompt(request)), primary.model
+    )
+    assert result["hedge_model"] == "slow-model"
+    assert result["hedge_tokens_used"] == prompt_tokens
+    assert result["cost"] == round(backup.calculate_cost(10) + primary.calculate_cost(prompt_tokens), 6)
+    
+    turn = ChatService.build_turn(1, "thread", request, result)
+    assert (turn.model, turn.tokens_used, turn.cost) == ("fast-model", 10, backup.calculate_cost(10))
+    assert (turn.hedge_model, turn.hedge_cost) == ("slow-model", primary.calculate_cost(prompt_tokens))
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_skips_backup_when_primary_is_fast(monkeypatch):
+    """Test the backup is never called when the primary answers within the delay"""
+    monkeypatch.setattr("src.config.settings.hedge_default_delay", 0.5)
+    primary = DelayedProvider("quick-model", delay=0.0)
+    backup = DelayedProvider("backup-model", delay=0.0)
+    request = ChatRequest(message="no hedge needed", hedge=True)
+    
+    result = await ChatService.generate_response(primary, request, hedge_provider=backup)
+    
+    assert result["model"] == "quick-model"
+    assert backup.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_is_not_coalesced_with_plain_one(monkeypatch):
+    """Test a hedged request does not join an identical unhedged call"""
+    monkeypatch.setattr("src.config.settings.hedge_default_delay", 0.5)
+    primary = DelayedProvider("primary-model", delay=0.01)
+    backup = DelayedProvider("backup-model", delay=0.0)
+    
+    await asyncio.gather(
+        ChatService.generate_response(primary, ChatRequest(message="same prompt")),
+        ChatService.generate_response(primary, ChatRequest(message="same prompt", hedge=True), hedge_provider=backup)
+    )
+    
+    assert primary.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_hedge_skipped_when_target_matches_provider(monkeypatch):
+    """Test a request is not hedged against the same provider and model"""
+    monkeypatch.setattr("src.config.settings.hedge_default_delay", 0.0)
+    primary = DelayedProvider("same-model", delay=0.01)
+    backup = DelayedProvider("same-model", delay=0.0)
+    request = ChatRequest(message="no self hedge", hedge=True)
+    
+    result = await ChatService.generate_response(primary, request, hedge_provider=backup)
+    
+    assert (primary.calls, backup.calls) == (1, 0)
+    assert result.get("hedge_model") is None
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Test the breaker opens on errors, half-opens after the cool-down and closes on success"""
+    from src.utils.circuit_breaker import CircuitBreaker, CircuitState
+    
+    now = [100.0]
+    monkeypatch.setattr("src.utils.circuit_breaker.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_rate_threshold=0.5, min_calls=4, open_seconds=10)
+    
+    for _ in range(2):
+        breaker.record_success(0.1)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+    
+    now[0] += 10
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_circuit_breaker_counts_slow_calls(monkeypatch):
+    """Test calls slower than the threshold trip the breaker"""
+    from src.utils.circuit_breaker import CircuitBreaker, CircuitState
+    
+    breaker = CircuitBreaker("test", slow_call_threshold=1.0, min_calls=3)
+    for _ in range(3):
+        breaker.record_success(5.0)
+    
+    assert breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_chat_service_falls_back_when_circuit_open():
+    """Test requests are rerouted to the fallback chain while the primary circuit is open"""
+    from src.api.services.chat_services import circuit_breakers
+    from src.utils.circuit_breaker import CircuitOpenError
+    
+    primary = FakeProvider(model="primary-model")
+    fallback = FakeProvider(model="fallback-model", reply="from fallback")
+    breaker = circuit_breakers.get("fake:primary-model")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    
+    result = await ChatService.generate_response(
+        primary, ChatRequest(message="reroute me"), fallback_providers=[fallback]
+    )
+    
+    assert result["model"] == "fallback-model"
+    assert primary.calls == 0
+    
+    with pytest.raises(CircuitOpenError):
+        await ChatService.generate_response(primary, ChatRequest(message="no fallback"))
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_queues_then_sheds():
+    """Test calls over the limit queue up to max_queue and the rest are shed"""
+    from src.utils.adaptive_limiter import AdaptiveConcurrencyLimiter, LoadShedError
+    
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_queue=1)
+    await limiter.acquire()
+    
+    queued = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 1
+    
+    with pytest.raises(LoadShedError):
+        await limiter.acquire()
+    
+    limiter.release(0.1)
+    await queued
+    assert limiter.in_flight == 1
+    assert limiter.queue_depth == 0
+
+
+def test_adaptive_limiter_aimd():
+    """Test the limit grows on fast successes and backs off on failures and latency spikes"""
+    from src.utils.adaptive_limiter import AdaptiveConcurrencyLimiter
+    
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=10, min_limit=2)
+    for _ in range(20):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    assert limiter.limit > 11
+    
+    grown = limiter.limit
+    limiter.in_flight += 1
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(grown * 0.9)
+    
+    for _ in range(50):
+        limiter.in_flight += 1
+        limiter.release(0.1, success=False)
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_queue_timeout():
+    """Test a call waiting longer than queue_timeout is shed"""
+    from src.utils.adaptive_limiter import AdaptiveConcurrencyLimiter, LoadShedError
+    
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, queue_timeout=0.01)
+    await limiter.acquire()
+    
+    with pytest.raises(LoadShedError):
+        await limiter.acquire()
+    assert limiter.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_prefers_interactive_and_rotates_users():
+    """Test queued interactive calls go first and batch users take turns"""
+    from src.utils.scheduler import FairScheduler
+    
+    scheduler = FairScheduler(max_concurrency=1, weights={"interactive": 2.0, "batch": 1.0})
+    await scheduler.acquire("holder", "batch")
+    
+    order = []
+    
+    async def call(user, priority):
+        await scheduler.acquire(user, priority)
+        order.append((user, priority))
+    
+    queued = [("a", "batch")] * 4 + [("b", "batch")] + [("c", "interactive")] * 2
+    tasks = [asyncio.ensure_future(call(user, priority)) for user, priority in queued]
+    await asyncio.sleep(0)
+    
+    snapshot = scheduler.snapshot()["classes"]
+    assert snapshot["batch"]["queued"] == 5 and snapshot["batch"]["queued_users"] == 2
+    assert snapshot["interactive"]["queued"] == 2
+    
+    priority = "batch"
+    for _ in queued:
+        scheduler.release(priority)
+        await asyncio.sleep(0)
+        priority = order[-1][1]
+    await asyncio.gather(*tasks)
+    
+    assert [user for user, _ in order] == ["c", "c", "a", "b", "a", "a", "a"]
+    assert scheduler.snapshot()["classes"]["interactive"]["wait_p95_ms"] is not None
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_follows_adaptive_limits():
+    """Test scheduler slots track the providers' current concurrency limits"""
+    from src.utils.adaptive_limiter import ConcurrencyLimiterRegistry
+    from src.utils.scheduler import FairScheduler
+    
+    limiters = ConcurrencyLimiterRegistry(initial_limit=2, max_limit=10)
+    scheduler = FairScheduler(max_concurrency=limiters.total_limit)
+    assert scheduler.snapshot()["max_concurrency"] == 2
+    
+    limiters.get("openai").limit = 3.0
+    limiters.get("anthropic")
+    for user in ("a", "b", "c", "d", "e"):
+        await asyncio.wait_for(scheduler.acquire(user), 0.1)
+    assert scheduler.snapshot()["max_concurrency"] == 5
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_does_not_wait_for_scheduler_slot(monkeypatch):
+    """Test a cached response is served while every generation slot is taken"""
+    from src.api.services.chat_services import chat_scheduler
+    
+    provider = FakeProvider()
+    request = ChatRequest(message="cached while busy", temperature=0)
+    await ChatService.generate_response(provider, request, user_id=1)
+    
+    monkeypatch.setattr(chat_scheduler, "max_concurrency", 1)
+    monkeypatch.setattr(chat_scheduler, "queue_timeout", 0.05)
+    await chat_scheduler.acquire("holder")
+    
+    result = await ChatService.generate_response(provider, request, user_id=2)
+    
+    assert result["cached"] is True
+    assert provider.calls == 1
+    assert chat_scheduler.snapshot()["classes"]["interactive"]["shed"] == 0
@@ -0,0 +1,109 @@
+"""
+Tests for multi-turn conversation context
+"""
+import pytest
+from src.api.database.db import SessionLocal
+from src.api.database.models import ThreadSummary
+from src.api.schemas.chat_schemas import ChatRequest
+from src.api.services.chat_services import ChatService
+from src.api.services.compaction_services import SUMMARY_PREFIX
+from src.llm.token_counter import token_counter, TokenLimitExceeded
+from src.utils.conversation import ConversationManager
+from tests.conftest import FakeProvider
+
+
+def _history(turns: int, tokens: int = 10) -> ConversationManager:
+    history = ConversationManager(tokens_per_message=3)
+    for i in range(turns):
+        history.add("user", f"question {i}", tokens)
+        history.add("assistant", f"answer {i}", tokens)
+    return history
+
+
+def test_trim_keeps_newest_whole_turns():
+    """Test trimming drops the oldest messages and never starts with a reply"""
+    history = _history(3)
+    assert history.tokens == 6 * 13
+    
+    # Room for three messages: the orphaned reply is dropped too
+    trimmed = history.trim(3 * 13)
+    assert [m["content"] for m in trimmed.messages()] == ["question 2", "answer 2"]
+    
+    assert len(history.trim(None)) == 6
+    assert len(history.trim(0)) == 0
+
+
+def test_trim_keeps_pinned_summary():
+    """Test a pinned summary survives trimming ahead of the newest turns"""
+    history = ConversationManager(tokens_per_message=3)
+    history.add("user", "summary", 10, pinned=True)
+    history.add("assistant", "ok", 10, pinned=True)
+    for message in _history(3).history:
+        history.add(message["role"], message["content"], message["tokens"])
+    assert history.unpinned_tokens == 6 * 13
+    
+    trimmed = history.trim(4 * 13)
+    assert [m["content"] for m in trimmed.messages()] == ["summary", "ok", "question 2", "answer 2"]
+    
+    # A summary that cannot fit is dropped rather than overflowing the budget
+    assert [m["content"] for m in history.trim(13).messages()] == []
+
+
+def test_preflight_fits_history_to_budget(monkeypatch):
+    """Test preflight trims history with cached counts and tokenizes only the new message"""
+    monkeypatch.setattr("src.config.settings.context_max_tokens", 30)
+    counted = []
+    monkeypatch.setattr(token_counter, "count", lambda text, model: counted.append(text) or 5)
+    
+    conversation = ChatService.preflight(FakeProvider(), ChatRequest(message="next"), _history(5))
+    
+    assert counted == ["next"]
+    assert [m["content"] for m in conversation.messages()] == ["question 4", "answer 4", "next"]
+
+
+def test_preflight_rejects_oversized_message(monkeypatch):
+    """Test a new message that cannot fit is rejected even with no history"""
+    monkeypatch.setattr(token_counter, "max_prompt_tokens", 10)
+    monkeypatch.setattr(token_counter, "count", lambda text, model: 50)
+    
+    with pytest.raises(TokenLimitExceeded):
+        ChatService.preflight(FakeProvider(), ChatRequest(message="long"))
+
+
+def test_long_thread_is_compacted_in_background(client, auth_headers, fake_provider, monkeypatch):
+    """Test older turns are folded into a summary that leads later prompts"""
+    monkeypatch.setattr("src.config.settings.compaction_threshold_tokens", 1)
+    monkeypatch.setattr("src.config.settings.compaction_keep_turns", 1)
+    fake_provider.reply = "Noted."
+    
+    thread_id = client.post("/chat/", json={"message": "My name is Ada"}, headers=auth_headers).json()["thread_id"]
+    for message in ["I like Python", "What is my name?"]:
+        response = client.post("/chat/", json={"message": message, "thread_id": thread_id}, headers=auth_headers)
+        assert response.status_code == 200
+    
+    # Earlier turns were replaced by the summary; the newest turn is sent verbatim
+    assert fake_provider.last_history[0]["content"] == SUMMARY_PREFIX + "Noted."
+    assert fake_provider.last_history[-2:] == [
+        {"role": "user", "content": "I like Python"},
+        {"role": "assistant", "content": "Noted."}
+    ]
+    
+    db = SessionLocal()
+    try:
+        summary = db.query(ThreadSummary).filter(ThreadSummary.thread_id == thread_id).one()
+        assert summary.covered_through_id > 0
+        assert summary.cost > 0
+    finally:
+        db.close()
+
+
+def test_unusable_compaction_provider_warns_once(monkeypatch, mocker):
+    """Test a missing compaction provider is logged once, not on every turn"""
+    from src.api.routes import chat
+    
+    monkeypatch.setattr("src.config.settings.compaction_provider", "no-such-provider")
+    monkeypatch.setattr(chat, "_compaction_errors", set())
+    warning = mocker.patch.object(chat.logger, "warning")
+    
+    assert [chat.get_compaction_provider() for _ in range(3)] == [None] * 3
+    assert warning.call_count == 1
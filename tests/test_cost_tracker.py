@@ -0,0 +1,76 @@
+"""
+Tests for usage counters and cost tracking
+"""
+import uuid
+import pytest
+from src.api.database.db import SessionLocal, create_tables
+from src.api.database.models import Conversation, UsageCounter
+from src.api.database.usage_counters import rebuild_usage_counters
+from src.utils.cost_tracker import CostTracker
+
+
+@pytest.fixture
+def db():
+    create_tables()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _conversation(user_id: int, provider: str = "openai", tokens: int = 10, cost: float = 0.01):
+    return Conversation(
+        user_id=user_id, message="Hi", response="Hello", provider=provider,
+        model=f"{provider}-model", tokens_used=tokens, cost=cost
+    )
+
+
+def test_counters_follow_conversation_writes(db):
+    """Test counters change in the same transaction as conversation inserts"""
+    user_id = uuid.uuid4().int % 10**9
+    db.add_all([_conversation(user_id), _conversation(user_id), _conversation(user_id, "anthropic", 20, 0.05)])
+    db.commit()
+    
+    # Rolled back inserts leave the counters untouched
+    db.add(_conversation(user_id, tokens=1000, cost=1.0))
+    db.flush()
+    db.rollback()
+    
+    stats = CostTracker.get_usage_stats(db, user_id)
+    assert stats["total_conversations"] == 3
+    assert stats["total_tokens"] == 40
+    assert stats["by_provider"]["openai"]["count"] == 2
+    assert CostTracker.get_total_cost(db, user_id) == 0.07
+    assert CostTracker.get_cost_by_provider(db, user_id) == {"openai": 0.02, "anthropic": 0.05}
+
+
+def test_rebuild_repairs_drift(db):
+    """Test the repair recomputes counters from the raw conversations"""
+    user_id = uuid.uuid4().int % 10**9
+    db.add_all([_conversation(user_id), _conversation(user_id)])
+    db.commit()
+    
+    counter = db.query(UsageCounter).filter(UsageCounter.user_id == user_id).one()
+    counter.conversations = 99
+    db.commit()
+    
+    assert rebuild_usage_counters(db, user_id) == {"counters": 1, "drifted": 1}
+    assert CostTracker.get_usage_stats(db, user_id)["total_conversations"] == 2
+    assert rebuild_usage_counters(db, user_id)["drifted"] == 0
+
+
+def test_hedged_spend_counts_against_its_own_provider(db):
+    """Test a losing hedged call's cost goes to its provider without adding a conversation"""
+    user_id = uuid.uuid4().int % 10**9
+    conversation = _conversation(user_id)
+    conversation.hedge_provider = "anthropic"
+    conversation.hedge_model = "anthropic-model"
+    conversation.hedge_tokens_used = 5
+    conversation.hedge_cost = 0.02
+    db.add(conversation)
+    db.commit()
+    
+    assert CostTracker.get_cost_by_provider(db, user_id) == {"openai": 0.01, "anthropic": 0.02}
+    assert CostTracker.get_usage_stats(db, user_id)["total_conversations"] == 1
+    assert rebuild_usage_counters(db, user_id) == {"counters": 2, "drifted": 0}
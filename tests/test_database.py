@@ -0,0 +1,27 @@
+"""
+Tests for database engines and sessions
+"""
+import pytest
+from sqlalchemy import text
+
+
+def test_async_database_url():
+    """Test the async engine URL swaps in the dialect's async driver"""
+    from src.api.database.db import async_database_url
+    
+    assert async_database_url("sqlite:///./ai_assistant.db") == "sqlite+aiosqlite:///./ai_assistant.db"
+    assert async_database_url("postgresql+psycopg2://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_connections_use_wal():
+    """Test both engines open SQLite in WAL mode with a busy timeout"""
+    from src.api.database.db import engine, async_engine, SQLITE_BUSY_TIMEOUT_MS
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    
+    async with async_engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == SQLITE_BUSY_TIMEOUT_MS
@@ -0,0 +1,299 @@
+"""
+Tests for LLM providers
+"""
+import pytest
+from types import SimpleNamespace
+from src.llm.openai_provider import OpenAIProvider
+from src.llm.anthropic_provider import AnthropicProvider
+
+
+def _openai_completion(content: str, prompt_tokens: int, completion_tokens: int):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+    )
+
+
+def _anthropic_message(content: str, input_tokens: int, output_tokens: int):
+    return SimpleNamespace(
+        content=[SimpleNamespace(text=content)],
+        usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens)
+    )
+
+
+@pytest.mark.asyncio
+async def test_openai_agenerate_response(mocker):
+    """Test async OpenAI generation uses the non-blocking API"""
+    acreate = mocker.patch(
+        "openai.ChatCompletion.acreate",
+        new=mocker.AsyncMock(return_value=_openai_completion("Hello!", 15, 5))
+    )
+    provider = OpenAIProvider(api_key="test-key")
+    
+    result = await provider.agenerate_response("Hi", temperature=0.0, max_tokens=50)
+    
+    assert result["response"] == "Hello!"
+    assert result["tokens_used"] == 20
+    assert (result["input_tokens"], result["output_tokens"]) == (15, 5)
+    assert result["cost"] == provider.calculate_cost(20, 15, 5)
+    acreate.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_anthropic_agenerate_response(mocker):
+    """Test async Anthropic generation uses the async client"""
+    provider = AnthropicProvider(api_key="test-key")
+    create = mocker.patch.object(
+        provider.async_client.messages,
+        "create",
+        new=mocker.AsyncMock(return_value=_anthropic_message("Hello!", 12, 8))
+    )
+    
+    result = await provider.agenerate_response("Hi")
+    
+    assert result["response"] == "Hello!"
+    assert result["tokens_used"] == 20
+    create.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_response_wraps_errors(mocker):
+    """Test provider errors are wrapped with the provider name"""
+    mocker.patch(
+        "openai.ChatCompletion.acreate",
+        new=mocker.AsyncMock(side_effect=RuntimeError("boom"))
+    )
+    provider = OpenAIProvider(api_key="test-key")
+    
+    with pytest.raises(Exception, match="OpenAI API error: boom"):
+        await provider.agenerate_response("Hi")
+
+
+@pytest.mark.asyncio
+async def test_openai_astream_response(mocker):
+    """Test OpenAI streaming yields deltas followed by usage counted on the full text"""
+    from openai.openai_object import OpenAIObject
+    from src.llm.token_counter import token_counter
+    
+    async def fake_stream():
+        for text in ["Hel", "lo", None]:
+            delta = {"content": text} if text else {}
+            yield OpenAIObject.construct_from({"choices": [{"delta": delta}]})
+    
+    mocker.patch(
+        "openai.ChatCompletion.acreate",
+        new=mocker.AsyncMock(return_value=fake_stream())
+    )
+    provider = OpenAIProvider(api_key="test-key")
+    mocker.patch("src.llm.openai_provider.token_counter.count_messages", return_value=3)
+    
+    events = [event async for event in provider.astream_response("Hi")]
+    
+    output_tokens = token_counter.count("Hello", provider.model)
+    assert [e["text"] for e in events if e["type"] == "delta"] == ["Hel", "lo"]
+    assert events[-1]["type"] == "usage"
+    assert events[-1]["tokens_used"] == 3 + output_tokens
+    assert (events[-1]["input_tokens"], events[-1]["output_tokens"]) == (3, output_tokens)
+
+
+@pytest.mark.asyncio
+async def test_client_registry_reuses_clients():
+    """Test the registry hands out one pooled client per provider and key"""
+    from src.llm.client_registry import ProviderClientRegistry
+    
+    registry = ProviderClientRegistry(max_connections=10)
+    first = registry.get_async_anthropic_client("key-a")
+    
+    assert registry.get_async_anthropic_client("key-a") is first
+    assert registry.get_async_anthropic_client("key-b") is not first
+    assert registry.get_openai_session("key-a") is registry.get_openai_session("key-a")
+    
+    session = registry.get_openai_session("key-a")
+    await registry.aclose()
+    assert session.closed
+    assert registry.get_async_anthropic_client("key-a") is not first
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_anthropic_marks_cache_breakpoints_and_records_cache_usage(mocker):
+    """Test the system prompt and history end are cache breakpoints and cached tokens are billed at cache rates"""
+    provider = AnthropicProvider(api_key="test-key")
+    message = _anthropic_message("Hello!", 10, 8)
+    message.usage.cache_read_input_tokens = 1000
+    message.usage.cache_creation_input_tokens = 200
+    create = mocker.patch.object(
+        provider.async_client.messages, "create", new=mocker.AsyncMock(return_value=message)
+    )
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    
+    result = await provider.agenerate_response("Again", history=history, system="Be brief.")
+    
+    kwargs = create.await_args.kwargs
+    assert kwargs["system"] == [{"type": "text", "text": "Be brief.", "cache_control": {"type": "ephemeral"}}]
+    assert kwargs["messages"][1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert kwargs["messages"][-1] == {"role": "user", "content": "Again"}
+    
+    assert (result["cache_read_tokens"], result["cache_write_tokens"]) == (1000, 200)
+    assert result["input_tokens"] == 1210
+    assert result["cost"] == provider.calculate_cost(1218, 1210, 8, 1000, 200)
+    assert result["cost"] < provider.calculate_cost(1218, 1210, 8)
+
+
+@pytest.mark.asyncio
+async def test_openai_sends_system_prompt_and_reads_cached_tokens(mocker):
+    """Test OpenAI requests lead with the system prompt and report prefix cache hits"""
+    completion = _openai_completion("Hello!", 1500, 5)
+    completion.usage.prompt_tokens_details = SimpleNamespace(cached_tokens=1024)
+    acreate = mocker.patch("openai.ChatCompletion.acreate", new=mocker.AsyncMock(return_value=completion))
+    provider = OpenAIProvider(api_key="test-key")
+    
+    result = await provider.agenerate_response("Hi", system="Be brief.")
+    
+    assert acreate.await_args.kwargs["messages"][0] == {"role": "system", "content": "Be brief."}
+    assert result["cache_read_tokens"] == 1024
+    assert result["cost"] < provider.calculate_cost(1505, 1500, 5)
+
+
+def test_calculate_cost_uses_reported_split():
+    """Test exact cost uses separate input and output prices"""
+    provider = AnthropicProvider(api_key="test-key")
+    
+    # claude-3-haiku: $0.25 / 1M input, $1.25 / 1M output
+    assert provider.calculate_cost(2_000_000, 1_000_000, 1_000_000) == 1.5
+    assert provider.calculate_cost(1000) == provider.calculate_cost(1000, 750, 250)
+
+
+def test_token_counter_caches_encoders(mocker):
+    """Test each encoding is loaded once and reused across calls"""
+    from src.llm.token_counter import TokenCounter
+    
+    encoding = mocker.Mock()
+    encoding.encode.side_effect = lambda text, **kwargs: text.split()
+    get_encoding = mocker.patch("src.llm.token_counter.tiktoken.get_encoding", return_value=encoding)
+    counter = TokenCounter()
+    
+    assert counter.count("one two three", "gpt-4") == 3
+    assert counter.count("four five", "gpt-3.5-turbo") == 2
+    get_encoding.assert_called_once_with("cl100k_base")
+
+
+def test_token_counter_estimates_when_encoding_unavailable(mocker):
+    """Test a failed encoder download falls back to an estimate and is not retried"""
+    from src.llm.token_counter import TokenCounter
+    
+    get_encoding = mocker.patch(
+        "src.llm.token_counter.tiktoken.get_encoding", side_effect=OSError("offline")
+    )
+    counter = TokenCounter()
+    
+    assert counter.count("x" * 40, "gpt-4") == 10
+    assert counter.count("x" * 8, "gpt-4") == 2
+    assert get_encoding.call_count == 1
+
+
+def test_token_counter_rejects_oversized_requests(mocker):
+    """Test requests over the prompt limit or context window are rejected locally"""
+    from src.llm.token_counter import TokenCounter, TokenLimitExceeded
+    
+    mocker.patch("src.llm.token_counter.tiktoken.get_encoding", side_effect=OSError("offline"))
+    counter = TokenCounter()
+    prompt_tokens = counter.count_messages([{"role": "user", "content": "x" * 400}], "gpt-4")
+    
+    assert counter.check_tokens(prompt_tokens, "gpt-4", max_tokens=100) == 106
+    with pytest.raises(TokenLimitExceeded):
+        TokenCounter(max_prompt_tokens=50).check_tokens(prompt_tokens, "gpt-4", max_tokens=100)
+    with pytest.raises(TokenLimitExceeded):
+        counter.check_tokens(prompt_tokens, "gpt-4", max_tokens=8100)
+
+
+def _mock_provider(**options):
+    from src.llm.mock_provider import MockProvider
+    defaults = {"latency_ms": 0, "latency_jitter_ms": 0, "tokens_per_second": 0}
+    return MockProvider(**{**defaults, **options})
+
+
+@pytest.mark.asyncio
+async def test_mock_provider_is_deterministic():
+    """Test the mock returns identical output and usage for identical requests"""
+    provider = _mock_provider()
+    
+    first = await provider.agenerate_response("Hello", temperature=0.0, max_tokens=20)
+    second = await provider.agenerate_response("Hello", temperature=0.0, max_tokens=20)
+    other = await provider.agenerate_response("Goodbye", temperature=0.0, max_tokens=20)
+    
+    assert first == second
+    assert first["response"] != other["response"]
+    assert first["output_tokens"] == 20
+    assert first["cost"] > 0
+
+
+@pytest.mark.asyncio
+async def test_mock_provider_streams_same_text():
+    """Test streamed deltas reassemble into the non-streamed response"""
+    provider = _mock_provider(response_tokens=8)
+    
+    events = [event async for event in provider.astream_response("Hello")]
+    result = await provider.agenerate_response("Hello")
+    
+    assert "".join(e["text"] for e in events if e["type"] == "delta") == result["response"]
+    assert events[-1]["output_tokens"] == 8
+
+
+@pytest.mark.asyncio
+async def test_mock_provider_injects_errors():
+    """Test the configured error rate makes calls fail"""
+    provider = _mock_provider(error_rate=1.0)
+    
+    with pytest.raises(Exception, match="injected failure"):
+        await provider.agenerate_response("Hello")
+
+
+def test_mock_provider_latency_distributions():
+    """Test every latency distribution yields non-negative, seed-reproducible samples"""
+    import random
+    from src.llm.mock_provider import LATENCY_DISTRIBUTIONS
+    
+    for distribution in LATENCY_DISTRIBUTIONS:
+        a = _mock_provider(latency_distribution=distribution, latency_ms=200, latency_jitter_ms=50, rng=random.Random(7))
+        b = _mock_provider(latency_distribution=distribution, latency_ms=200, latency_jitter_ms=50, rng=random.Random(7))
+        samples = [a.sample_latency() for _ in range(100)]
+        
+        assert samples == [b.sample_latency() for _ in range(100)]
+        assert all(sample >= 0 for sample in samples)
+        assert 0.1 < sum(samples) / len(samples) < 0.3
+
+
+def make_plugin_provider(model=None):
+    """Provider factory registered by test_provider_registry_plugins"""
+    return _mock_provider(model=model or "plugin-1")
+
+
+def test_provider_registry_plugins():
+    """Test providers register by config path, import lazily and report misconfiguration"""
+    from src.llm.registry import (
+        BUILTIN_PROVIDERS, ProviderRegistry, ProviderNotConfiguredError, ProviderNotFoundError
+    )
+    
+    registry = ProviderRegistry(BUILTIN_PROVIDERS, entry_point_group="ai_assistant.tests.none")
+    registry.register_from_config("plugin=tests.test_llm_providers:make_plugin_provider")
+    assert registry.loaded() == []
+    
+    provider = registry.create("plugin", "plugin-2")
+    assert provider.model == "plugin-2"
+    assert registry.loaded() == ["plugin"]
+    assert "plugin" in registry.names() and "openai" in registry.names()
+    
+    with pytest.raises(ProviderNotFoundError):
+        registry.create("missing")
+    with pytest.raises(ValueError):
+        registry.register_from_config("no-path")
+    
+    from src.config import settings
+    if not settings.anthropic_api_key:
+        with pytest.raises(ProviderNotConfiguredError):
+            registry.create("anthropic")
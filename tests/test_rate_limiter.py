@@ -0,0 +1,66 @@
+"""
+Tests for rate limiting
+"""
+import pytest
+from src.utils.rate_limiter import RateLimiter, MemoryBucketStore, SQLiteBucketStore
+
+
+def test_token_bucket_refills(monkeypatch):
+    """Test a bucket allows its burst, rejects, then refills over time"""
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.rate_limiter.time.time", lambda: now[0])
+    limiter = RateLimiter(MemoryBucketStore())
+    
+    assert all(limiter.acquire("k", 3)[0] for _ in range(3))
+    allowed, retry_after = limiter.acquire("k", 3)
+    assert not allowed
+    assert retry_after == pytest.approx(20.0)
+    
+    now[0] += 20
+    assert limiter.acquire("k", 3)[0]
+
+
+def test_sqlite_buckets_are_shared(tmp_path):
+    """Test separate limiter instances (as in separate workers) share one bucket"""
+    path = str(tmp_path / "limits.db")
+    worker_a = RateLimiter(SQLiteBucketStore(path))
+    worker_b = RateLimiter(SQLiteBucketStore(path))
+    
+    assert worker_a.acquire("user:1:chat", 2)[0]
+    assert worker_b.acquire("user:1:chat", 2)[0]
+    assert not worker_a.acquire("user:1:chat", 2)[0]
+    assert not worker_b.acquire("user:1:chat", 2)[0]
+    assert worker_b.acquire("user:2:chat", 2)[0]
+
+
+def test_history_rate_limited(client, auth_headers):
+    """Test requests over the per-route limit get 429 with Retry-After"""
+    from src.config import settings
+    limit = settings.rate_limit_history_per_minute
+    
+    statuses = [client.get("/chat/history", headers=auth_headers).status_code for _ in range(limit)]
+    assert statuses == [200] * limit
+    
+    response = client.get("/chat/history", headers=auth_headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_route_rejection_refunds_user_bucket(monkeypatch):
+    """Test a request rejected by its route bucket is not charged to the user bucket"""
+    from types import SimpleNamespace
+    from fastapi import HTTPException
+    from src.api.core.dependencies import enforce_rate_limit
+    
+    limiter = RateLimiter(MemoryBucketStore())
+    monkeypatch.setattr("src.api.core.dependencies.get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr("src.config.settings.rate_limit_user_per_minute", 3)
+    user = SimpleNamespace(id=1)
+    
+    enforce_rate_limit(user, "chat", 1)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc_info:
+            enforce_rate_limit(user, "chat", 1)
+        assert exc_info.value.status_code == 429
+    
+    assert [limiter.acquire("user:1", 3)[0] for _ in range(3)] == [True, True, False]
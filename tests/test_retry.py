@@ -0,0 +1,136 @@
+"""
+Tests for provider error classification and retries
+"""
+import openai
+import pytest
+from src.llm.errors import (
+    ProviderRateLimitError,
+    ProviderRequestError,
+    ProviderUnavailableError,
+    error_for_status,
+    parse_retry_after
+)
+from src.llm.openai_provider import OpenAIProvider
+from src.llm.retry import RetryBudget, RetryPolicy
+from tests.conftest import FakeProvider
+
+
+def _policy(**kwargs) -> RetryPolicy:
+    return RetryPolicy(base_delay=0.0, max_delay=0.0, **kwargs)
+
+
+def _flaky(failures):
+    """Async call raising each of failures in turn, then succeeding"""
+    calls = []
+    
+    async def call():
+        calls.append(1)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "ok"
+    return call, calls
+
+
+def test_error_for_status_and_retry_after():
+    """Test HTTP statuses map to retryable and permanent errors"""
+    assert isinstance(error_for_status(429, "slow"), ProviderRateLimitError)
+    assert isinstance(error_for_status(529, "overloaded"), ProviderUnavailableError)
+    assert error_for_status(503, "down").retryable
+    assert not error_for_status(400, "bad").retryable
+    assert not error_for_status(401, "key").retryable
+    
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert parse_retry_after({}) is None
+
+
+def test_openai_errors_are_classified():
+    """Test OpenAI client errors keep their status and retry-after"""
+    error = OpenAIProvider._error(
+        openai.error.RateLimitError("Rate limit reached", http_status=429, headers={"retry-after": "2"})
+    )
+    assert isinstance(error, ProviderRateLimitError)
+    assert error.retry_after == 2.0
+    assert str(error).startswith("OpenAI API error:")
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_retries_transient_errors_only():
+    """Test transient failures are retried and permanent ones are raised at once"""
+    call, calls = _flaky([ProviderUnavailableError("down"), ProviderRateLimitError("slow", retry_after=0.01)])
+    assert await _policy().run(call) == "ok"
+    assert len(calls) == 3
+    
+    call, calls = _flaky([ProviderRequestError("bad request")])
+    with pytest.raises(ProviderRequestError):
+        await _policy().run(call)
+    assert len(calls) == 1
+    
+    # A retry-after longer than we are willing to wait is surfaced instead
+    call, calls = _flaky([ProviderRateLimitError("slow", retry_after=60)])
+    with pytest.raises(ProviderRateLimitError):
+        await _policy(max_retry_after=10).run(call)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_limits_retries():
+    """Test an exhausted budget stops retries instead of amplifying load"""
+    policy = _policy(max_attempts=5, budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_balance=1.0))
+    
+    call, calls = _flaky([ProviderUnavailableError("down")] * 4)
+    with pytest.raises(ProviderUnavailableError):
+        await policy.run(call)
+    assert len(calls) == 2
+    assert policy.budget.balance < 1.0
+
+
+@pytest.mark.asyncio
+async def test_stream_is_not_retried_after_output():
+    """Test a stream is only retried if it failed before its first event"""
+    attempts = []
+    
+    async def open_stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ProviderUnavailableError("down")
+        yield "first"
+        raise ProviderUnavailableError("dropped")
+    
+    received = []
+    with pytest.raises(ProviderUnavailableError):
+        async for event in _policy().stream(open_stream):
+            received.append(event)
+    assert received == ["first"]
+    assert len(attempts) == 2
+
+
+class FlakyProvider(FakeProvider):
+    """Fails with a transient error before answering"""
+    
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+    
+    async def agenerate_response(self, prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ProviderUnavailableError("Fake API error: overloaded", status_code=529)
+        return self.generate_response(prompt, temperature, max_tokens, **kwargs)
+
+
+def test_chat_retries_transient_provider_errors(client, auth_headers, monkeypatch):
+    """Test chat recovers from a transient error and reports 503 once retries run out"""
+    monkeypatch.setattr("src.llm.retry.retry_policy.base_delay", 0.0)
+    monkeypatch.setattr("src.llm.retry.retry_policy.max_delay", 0.0)
+    provider = FlakyProvider(failures=1)
+    monkeypatch.setattr("src.api.routes.chat.get_llm_provider", lambda name, model=None: provider)
+    
+    response = client.post("/chat/", json={"message": "Hi"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert provider.calls == 1
+    
+    provider.failures = 10
+    response = client.post("/chat/", json={"message": "Hi again"}, headers=auth_headers)
+    assert response.status_code == 503
@@ -0,0 +1,303 @@
+"""
+Tests for API routes
+"""
+import json
+import pytest
+from sqlalchemy import select
+
+
+def _parse_sse(body: str):
+    """Parse an SSE body into (event, data) tuples"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat(client, auth_headers, fake_provider):
+    """Test chat returns the provider response and records history"""
+    response = client.post("/chat/", json={"message": "Hi"}, headers=auth_headers)
+    
+    assert response.status_code == 200
+    assert response.json()["response"] == "Hello there!"
+    
+    history = client.get("/chat/history?include_total=true", headers=auth_headers).json()
+    assert history["total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_chat_releases_connection_during_provider_call(fake_provider):
+    """Test no database connection is held while the provider generates"""
+    from fastapi import BackgroundTasks
+    from src.api.database.db import AsyncSessionLocal, create_tables
+    from src.api.database.models import User
+    from src.api.routes.chat import generate_chat
+    from src.api.schemas.chat_schemas import ChatRequest
+    
+    create_tables()
+    held = []
+    
+    async with AsyncSessionLocal() as session:
+        async def agenerate_response(prompt, temperature=0.7, max_tokens=1000, **kwargs):
+            held.append(session.in_transaction())
+            return fake_provider.generate_response(prompt, temperature, max_tokens, **kwargs)
+        
+        fake_provider.agenerate_response = agenerate_response
+        await session.scalar(select(User).limit(1))
+        await generate_chat(session, 1, "pool", ChatRequest(message="Hi"), BackgroundTasks(), "interactive")
+        await session.commit()
+    
+    assert held == [False]
+
+
+def test_chat_stream(client, auth_headers, fake_provider):
+    """Test streaming endpoint emits deltas then a done event and saves the conversation"""
+    response = client.post("/chat/stream", json={"message": "Hi"}, headers=auth_headers)
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = _parse_sse(response.text)
+    deltas = [data["text"] for event, data in events if event == "delta"]
+    assert "".join(deltas).strip() == "Hello there!"
+    
+    event, done = events[-1]
+    assert event == "done"
+    assert done["tokens_used"] == 10
+    assert done["time_to_first_token_ms"] is not None
+    
+    history = client.get("/chat/history?include_total=true", headers=auth_headers).json()
+    assert history["total"] == 1
+    assert history["conversations"][0]["response"].strip() == "Hello there!"
+
+
+def test_chat_stream_saves_partial_turn_on_failure(client, auth_headers, fake_provider):
+    """Test a stream failing after output started still stores the turn and its usage"""
+    async def failing_stream(prompt, temperature=0.7, max_tokens=1000, **kwargs):
+        yield {"type": "delta", "text": "Hello "}
+        raise RuntimeError("connection reset")
+    
+    fake_provider.astream_response = failing_stream
+    response = client.post("/chat/stream", json={"message": "Hi"}, headers=auth_headers)
+    
+    assert _parse_sse(response.text)[-1][0] == "error"
+    
+    history = client.get("/chat/history?include_total=true", headers=auth_headers).json()
+    assert history["total"] == 1
+    assert history["conversations"][0]["response"] == "Hello "
+    assert history["conversations"][0]["tokens_used"] > 0
+    assert history["conversations"][0]["cost"] > 0
+
+
+def test_chat_cache_hit(client, auth_headers, fake_provider):
+    """Test deterministic repeats are served from cache at zero cost"""
+    payload = {"message": "What is FastAPI?", "temperature": 0}
+    first = client.post("/chat/", json=payload, headers=auth_headers).json()
+    second = client.post("/chat/", json=payload, headers=auth_headers).json()
+    
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["cost"] == 0.0
+    assert second["response"] == first["response"]
+    assert fake_provider.calls == 1
+    
+    # Non-deterministic requests bypass the cache unless opted in
+    client.post("/chat/", json={**payload, "temperature": 0.7}, headers=auth_headers)
+    assert fake_provider.calls == 2
+
+
+def test_chat_batch(client, auth_headers, fake_provider):
+    """Test batch endpoint streams one NDJSON line per item and saves every conversation"""
+    from src.api.services.chat_services import chat_scheduler
+    
+    items = [{"message": f"Question {i}"} for i in range(3)]
+    response = client.post("/chat/batch", json={"items": items}, headers=auth_headers)
+    
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.strip().split("\n")]
+    
+    results = [line for line in lines if line["status"] == "ok"]
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    assert lines[-1] == {
+        "status": "done",
+        "completed": 3,
+        "failed": 0,
+        "total_cost": round(3 * fake_provider.calculate_cost(10), 6)
+    }
+    
+    history = client.get("/chat/history?include_total=true", headers=auth_headers).json()
+    assert history["total"] == 3
+    
+    # Bulk items are scheduled behind interactive traffic
+    classes = chat_scheduler.snapshot()["classes"]
+    assert classes["batch"]["dispatched"] == 3
+    assert classes["interactive"]["dispatched"] == 0
+
+
+def test_chat_priority_is_set_per_user(client, auth_headers, fake_provider):
+    """Test a batch user's calls run as batch whatever the request asks for"""
+    from src.api.database.db import SessionLocal
+    from src.api.database.models import User
+    from src.api.services.chat_services import chat_scheduler
+    
+    db = SessionLocal()
+    try:
+        user = db.query(User).order_by(User.id.desc()).first()
+        user.priority = "batch"
+        db.commit()
+    finally:
+        db.close()
+    
+    response = client.post("/chat/", json={"message": "Hi", "priority": "interactive"}, headers=auth_headers)
+    
+    assert response.status_code == 200
+    classes = chat_scheduler.snapshot()["classes"]
+    assert (classes["batch"]["dispatched"], classes["interactive"]["dispatched"]) == (1, 0)
+
+
+def test_chat_with_mock_provider(client, auth_headers, monkeypatch):
+    """Test the mock provider is selectable from the request when enabled"""
+    monkeypatch.setattr("src.config.settings.enable_mock_provider", True)
+    monkeypatch.setattr("src.config.settings.mock_latency_ms", 0)
+    monkeypatch.setattr("src.config.settings.mock_tokens_per_second", 0)
+    
+    response = client.post("/chat/", json={"message": "Hi", "provider": "mock"}, headers=auth_headers)
+    
+    assert response.status_code == 200
+    assert response.json()["provider"] == "mock"
+    assert response.json()["model"] == "mock-1"
+
+
+
+def test_chat_idempotency_key_replays_response(client, auth_headers, fake_provider):
+    """Test a retried Idempotency-Key gets the stored response without a new turn"""
+    headers = {**auth_headers, "Idempotency-Key": "retry-1"}
+    first = client.post("/chat/", json={"message": "Hi"}, headers=headers)
+    second = client.post("/chat/", json={"message": "Hi"}, headers=headers)
+    
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert fake_provider.calls == 1
+    assert client.get("/chat/history?include_total=true", headers=auth_headers).json()["total"] == 1
+    
+    # The key cannot be reused for a different request
+    mismatch = client.post("/chat/", json={"message": "Bye"}, headers=headers)
+    assert mismatch.status_code == 422
+
+def test_chat_thread_sends_earlier_turns(client, auth_headers, fake_provider):
+    """Test continuing a thread sends its earlier turns and caches their token counts"""
+    first = client.post("/chat/", json={"message": "Hi"}, headers=auth_headers).json()
+    assert first["context_messages"] == 0
+    assert fake_provider.last_history == []
+    
+    second = client.post(
+        "/chat/", json={"message": "And then?", "thread_id": first["thread_id"]}, headers=auth_headers
+    ).json()
+    assert second["thread_id"] == first["thread_id"]
+    assert second["context_messages"] == 2
+    assert fake_provider.last_history == [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello there!"}
+    ]
+    
+    # A different user cannot continue the thread
+    client.post("/auth/register", json={
+        "username": "thread_intruder", "email": "intruder@example.com", "password": "secret123"
+    })
+    token = client.post("/auth/login", json={"username": "thread_intruder", "password": "secret123"}).json()
+    third = client.post(
+        "/chat/", json={"message": "Hi", "thread_id": first["thread_id"]},
+        headers={"Authorization": f"Bearer {token['access_token']}"}
+    ).json()
+    assert third["context_messages"] == 0
+    
+    from src.api.database.db import SessionLocal
+    from src.api.database.models import Conversation
+    db = SessionLocal()
+    try:
+        turn = db.query(Conversation).filter(Conversation.thread_id == first["thread_id"]).first()
+        assert turn.message_tokens is not None and turn.response_tokens is not None
+    finally:
+        db.close()
+
+
+def test_chat_jobs_run_in_background(client, auth_headers, fake_provider):
+    """Test submitted jobs, and jobs orphaned by a dead worker, run to completion"""
+    import time
+    from datetime import datetime, timedelta
+    from src.api.database.db import SessionLocal
+    from src.api.database.models import ChatJob, User
+    from src.api.schemas.chat_schemas import ChatRequest
+    from src.api.services.chat_services import chat_scheduler
+    
+    db = SessionLocal()
+    try:
+        user = db.query(User).order_by(User.id.desc()).first()
+        orphan = ChatJob(
+            user_id=user.id,
+            status="running",
+            request=ChatRequest(message="Left behind").model_dump_json(),
+            attempts=1,
+            locked_until=datetime.utcnow() - timedelta(seconds=1)
+        )
+        db.add(orphan)
+        db.commit()
+        orphan_id = orphan.id
+    finally:
+        db.close()
+    
+    submitted = client.post("/chat/jobs", json={"message": "Hi"}, headers=auth_headers)
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+    
+    jobs = {}
+    for job_id in (orphan_id, submitted.json()["id"]):
+        for _ in range(100):
+            jobs[job_id] = client.get(f"/chat/jobs/{job_id}", headers=auth_headers).json()
+            if jobs[job_id]["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.02)
+    
+    assert jobs[orphan_id]["status"] == "succeeded" and jobs[orphan_id]["attempts"] == 2
+    assert jobs[submitted.json()["id"]]["result"]["response"] == "Hello there!"
+    assert client.get("/chat/history?include_total=true", headers=auth_headers).json()["total"] == 2
+    assert chat_scheduler.snapshot()["classes"]["batch"]["dispatched"] == 2
+    assert client.get("/chat/jobs/999999", headers=auth_headers).status_code == 404
+
+
+def test_history_keyset_pagination(client, auth_headers):
+    """Test history pages follow next_cursor without gaps, including created_at ties"""
+    from datetime import datetime
+    from src.api.database.db import SessionLocal
+    from src.api.database.models import Conversation, User
+    
+    db = SessionLocal()
+    try:
+        user = db.query(User).order_by(User.id.desc()).first()
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        db.add_all([
+            Conversation(
+                user_id=user.id, message=f"m{i}", response=f"r{i}", provider="fake", model="fake-model",
+                created_at=same_time if i < 3 else datetime(2024, 1, 2, i)
+            )
+            for i in range(5)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    
+    messages, cursor = [], None
+    for _ in range(5):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/chat/history", params=params, headers=auth_headers).json()
+        assert page["total"] is None
+        messages += [c["message"] for c in page["conversations"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert messages == ["m4", "m3", "m2", "m1", "m0"]
+    assert client.get("/chat/history?include_total=true", headers=auth_headers).json()["total"] == 5
+    assert client.get("/chat/history?cursor=not-a-cursor", headers=auth_headers).status_code == 400